@@ -0,0 +1,325 @@
+# Operator tool: find and clean up lobbies without waiting for DynamoDB TTL (which can lag by hours).
+#
+# Queries run a parallel segmented Scan of every lobby table (TABLE_NAME plus the SHARD_MAP tables),
+# reading only the projected attributes, and stream one NDJSON line per lobby to stdout:
+#   count      -> per-table/gameState counts of lobbies ('expired' = past its ttl, not yet deleted)
+#   stuck      -> lobbies whose active timerState deadline passed more than --grace-seconds ago
+#   abandoned  -> unfinished lobbies with no activity (creation or turn start) for --idle-hours
+#
+# Actions read those lines (stdin or --input) and apply one conditional write per lobby, batched into
+# TransactWriteItems. Each write only applies to the version that was listed (a lobby listed without
+# one, from before versioning, must still have none), so a lobby that changed since the scan is
+# reported as 'conflict' and left alone. Input lines that are not lobbies, like count lines, are
+# reported as 'skipped', as are repeated lobby codes:
+#   purge           -> deletes the lobby
+#   force-close     -> moves it to 'closed' with the timer stopped (not 'complete': statistics and the
+#                      archive only count full drafts as complete)
+#   reset           -> clears picks/bans/ready flags back to the ready check (or 'waiting' without both players)
+#
+# --read-units / --write-units cap the capacity used per second across all workers, so a sweep
+# does not starve live traffic on a provisioned table.
+#
+# Usage:
+#   TABLE_NAME=MyLobbies python adminLobbies.py count --workers 8
+#   python adminLobbies.py stuck --grace-seconds 120 > stuck.ndjson
+#   python adminLobbies.py force-close --input stuck.ndjson --write-units 50
+#   python adminLobbies.py abandoned --idle-hours 6 | python adminLobbies.py purge --dry-run
+
+import argparse
+import concurrent.futures
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from lobby_common import ( # Same shard layout and version conditions as the Lambda functions
+    decimal_to_int, deserializer, FINISHED_STATES, get_table_name, lobby_table_names, version_condition
+)
+
+dynamodb_client = boto3.client('dynamodb')
+serializer = TypeSerializer()
+
+MAX_TRANSACTION_ITEMS = 100 # TransactWriteItems limit
+MAX_BATCH_ATTEMPTS = 5
+BASE_BACKOFF_SECONDS = 0.05
+
+SCAN_ATTRIBUTES = {
+    'count': ['lobbyCode', 'gameState', 'ttl'],
+    'stuck': ['lobbyCode', 'version', 'gameState', 'timerState', 'player1', 'player2', 'organizerName'],
+    'abandoned': ['lobbyCode', 'version', 'gameState', 'createdAt', 'timerState', 'player1', 'player2', 'organizerName']
+}
+
+class CapacityThrottle:
+    """Shared budget of capacity units per second across threads (None or 0 = unlimited)."""
+
+    def __init__(self, units_per_second):
+        self.units_per_second = units_per_second
+        self.lock = threading.Lock()
+        self.next_free = time.monotonic()
+
+    def spend(self, units):
+        """Records units that were (or are about to be) consumed, sleeping once the budget is used up."""
+        if not self.units_per_second or units <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_free)
+            self.next_free = start + units / self.units_per_second
+        if start > now:
+            time.sleep(start - now)
+
+class NdjsonWriter:
+    """Writes one JSON object per line; safe to call from several worker threads."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, default=decimal_to_int, separators=(',', ':'))
+        with self.lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+# --- Queries (parallel segmented scan) ---
+
+def scan_segment(table_name, segment, total_segments, attributes, throttle, handle_page):
+    """Scans one segment of one table page by page, paying for each page's read capacity."""
+    names = {f'#a{i}': attribute for i, attribute in enumerate(attributes)}
+    scan_kwargs = {
+        'TableName': table_name,
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names,
+        'ReturnConsumedCapacity': 'TOTAL'
+    }
+    scanned = 0
+    while True:
+        response = dynamodb_client.scan(**scan_kwargs)
+        throttle.spend(response.get('ConsumedCapacity', {}).get('CapacityUnits', 0))
+        items = [{key: deserializer.deserialize(value) for key, value in item.items()} for item in response.get('Items', [])]
+        scanned += len(items)
+        handle_page(table_name, items)
+        if 'LastEvaluatedKey' not in response:
+            return scanned
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def parallel_scan(attributes, workers, throttle, handle_page):
+    """Runs `workers` segments per lobby table concurrently. Returns the number of items scanned."""
+    tasks = [(table_name, segment) for table_name in lobby_table_names() for segment in range(workers)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(scan_segment, table_name, segment, workers, attributes, throttle, handle_page)
+            for table_name, segment in tasks
+        ]
+        return sum(future.result() for future in futures)
+
+def last_activity_ms(item):
+    """Latest known activity: lobby creation or the start of the current turn."""
+    created_ms = int(item.get('createdAt', 0)) * 1000
+    started_ms = int((item.get('timerState') or {}).get('startTime') or 0)
+    return max(created_ms, started_ms)
+
+def is_stuck(item, now_ms, grace_ms):
+    timer_state = item.get('timerState') or {}
+    deadline = timer_state.get('deadline')
+    return bool(timer_state.get('isActive')) and deadline is not None and int(deadline) + grace_ms < now_ms
+
+def is_abandoned(item, now_ms, idle_ms):
+    return item.get('gameState') not in FINISHED_STATES and last_activity_ms(item) + idle_ms < now_ms
+
+def run_query(args, writer):
+    now_ms = int(time.time() * 1000)
+    throttle = CapacityThrottle(args.read_units)
+    counts = Counter()
+    counts_lock = threading.Lock()
+
+    def handle_page(table_name, items):
+        if args.command == 'count':
+            page_counts = Counter(
+                (table_name, 'expired' if int(item.get('ttl') or now_ms) * 1000 < now_ms else item.get('gameState', 'unknown'))
+                for item in items
+            )
+            with counts_lock:
+                counts.update(page_counts)
+            return
+        for item in items:
+            if args.command == 'stuck' and not is_stuck(item, now_ms, args.grace_seconds * 1000):
+                continue
+            if args.command == 'abandoned' and not is_abandoned(item, now_ms, args.idle_hours * 3600 * 1000):
+                continue
+            writer.write({'table': table_name, **item})
+            with counts_lock:
+                counts[(table_name, item.get('gameState', 'unknown'))] += 1
+
+    started = time.perf_counter()
+    scanned = parallel_scan(SCAN_ATTRIBUTES[args.command], args.workers, throttle, handle_page)
+    if args.command == 'count':
+        for (table_name, game_state), count in sorted(counts.items()):
+            writer.write({'table': table_name, 'gameState': game_state, 'count': count})
+        writer.write({'table': '*', 'gameState': '*', 'count': sum(counts.values())})
+    print(f"{args.command}: scanned {scanned} lobbies in {time.perf_counter() - started:.1f}s, "
+          f"{sum(counts.values())} matched", file=sys.stderr)
+
+# --- Actions (batched conditional writes) ---
+
+def build_write(action, lobby):
+    """
+    The TransactWriteItems entry for one listed lobby, conditioned on its listed version (or, for a
+    lobby created before versioning, on it still having none).
+    """
+    lobby_code = lobby['lobbyCode']
+    table_name = lobby.get('table') or get_table_name(lobby_code)
+    key = {'lobbyCode': {'S': lobby_code}}
+    condition, condition_values = version_condition(lobby)
+    condition_values = {name: serializer.serialize(Decimal(int(value))) for name, value in condition_values.items()}
+    if action == 'purge':
+        delete = {'TableName': table_name, 'Key': key, 'ConditionExpression': condition}
+        if condition_values: # DynamoDB rejects an empty ExpressionAttributeValues
+            delete['ExpressionAttributeValues'] = condition_values
+        return {'Delete': delete}
+
+    stopped_timer = {'startTime': None, 'duration': None, 'deadline': None, 'isActive': False}
+    if action == 'force-close':
+        update_expression = 'SET gameState = :state, timerState = :timer REMOVE turnDeadline, deadlineShard ADD version :one'
+        values = {':state': 'closed', ':timer': stopped_timer}
+    else: # reset, same result as pickban-resetLobby.py
+        both_players = bool(lobby.get('player1')) and bool(lobby.get('player2'))
+        update_expression = ('SET gameState = :state, player1Ready = :notReady, player2Ready = :notReady, '
+                             'picks = :emptyList, bans = :emptyList, timerState = :timer '
+                             'REMOVE turnDeadline, deadlineShard ADD version :one')
+        values = {':state': 'ready_check' if both_players else 'waiting', ':notReady': False, ':emptyList': [], ':timer': stopped_timer}
+    values[':one'] = 1
+    return {'Update': {
+        'TableName': table_name, 'Key': key,
+        'UpdateExpression': update_expression,
+        'ConditionExpression': condition,
+        'ExpressionAttributeValues': {**{name: serializer.serialize(value) for name, value in values.items()}, **condition_values}
+    }}
+
+def write_batch(action, lobbies, throttle):
+    """
+    Applies one batch in a transaction. Lobbies whose condition failed are dropped and the rest
+    retried, since one failed condition cancels the whole transaction. Any other error marks the
+    remaining lobbies 'error' instead of stopping the run. Returns [(lobby, result)].
+    """
+    results = []
+    pending = list(lobbies)
+    for attempt in range(MAX_BATCH_ATTEMPTS):
+        if not pending:
+            break
+        throttle.spend(2 * len(pending)) # Transactional writes cost two write units per item
+        try:
+            dynamodb_client.transact_write_items(TransactItems=[build_write(action, lobby) for lobby in pending])
+            results.extend((lobby, 'done') for lobby in pending)
+            return results
+        except dynamodb_client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get('CancellationReasons', [])
+            retry = []
+            for lobby, reason in zip(pending, reasons):
+                if reason.get('Code') == 'ConditionalCheckFailed':
+                    results.append((lobby, 'conflict')) # Changed (or deleted) since it was listed
+                else:
+                    retry.append(lobby) # Cancelled because of another item, or throttled
+            pending = retry
+        except (dynamodb_client.exceptions.ProvisionedThroughputExceededException,
+                dynamodb_client.exceptions.TransactionInProgressException):
+            pass
+        except ClientError as e: # e.g. ValidationException; retrying the same request cannot help
+            print(f"ERROR: batch of {len(pending)} lobbies failed: {e}", file=sys.stderr)
+            break
+        # Full jitter backoff before retrying the remaining lobbies
+        time.sleep(random.uniform(0, BASE_BACKOFF_SECONDS * (2 ** attempt)))
+    results.extend((lobby, 'error') for lobby in pending)
+    return results
+
+def iter_listed_lobbies(stream):
+    """
+    (line number, record, skip reason) for each non-empty line of a query's output. Lines that are
+    not lobbies (count lines, invalid JSON) come with a reason and are reported, not acted on.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, {}, 'invalid JSON'
+            continue
+        if not isinstance(record, dict) or not record.get('lobbyCode'):
+            yield line_number, {}, 'no lobbyCode'
+        else:
+            yield line_number, record, None
+
+def run_action(args, writer):
+    throttle = CapacityThrottle(args.write_units)
+    stream = open(args.input, encoding='utf-8') if args.input else sys.stdin
+    outcome = Counter()
+    seen_codes = set() # A transaction may not touch the same item twice
+
+    def report(batch_results):
+        for lobby, result in batch_results:
+            outcome[result] += 1
+            writer.write({'lobbyCode': lobby['lobbyCode'], 'action': args.command, 'result': result})
+
+    started = time.perf_counter()
+    with stream, concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = []
+        batch = []
+        for line_number, lobby, skip_reason in iter_listed_lobbies(stream):
+            if not skip_reason and lobby['lobbyCode'] in seen_codes:
+                skip_reason = 'duplicate lobbyCode'
+            if skip_reason:
+                outcome['skipped'] += 1
+                writer.write({'line': line_number, 'action': args.command, 'result': 'skipped', 'reason': skip_reason})
+                continue
+            seen_codes.add(lobby['lobbyCode'])
+            if args.dry_run:
+                report([(lobby, 'dry-run')])
+                continue
+            batch.append(lobby)
+            if len(batch) == args.batch_size:
+                futures.append(executor.submit(write_batch, args.command, batch, throttle))
+                batch = []
+            if len(futures) >= args.workers * 2: # Bounded memory on long inputs
+                report(futures.pop(0).result())
+        if batch:
+            futures.append(executor.submit(write_batch, args.command, batch, throttle))
+        for future in futures:
+            report(future.result())
+    print(f"{args.command}: {dict(outcome)} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find and clean up lobbies across all lobby tables.')
+    parser.add_argument('command', choices=['count', 'stuck', 'abandoned', 'purge', 'force-close', 'reset'])
+    parser.add_argument('--workers', type=int, default=4, help='Scan segments per table / concurrent write batches')
+    parser.add_argument('--read-units', type=float, default=0, help='Max read capacity units per second (0 = no limit)')
+    parser.add_argument('--write-units', type=float, default=0, help='Max write capacity units per second (0 = no limit)')
+    parser.add_argument('--grace-seconds', type=int, default=60, help='stuck: how long past its deadline a turn must be')
+    parser.add_argument('--idle-hours', type=float, default=2, help='abandoned: hours without activity')
+    parser.add_argument('--input', help='Actions: NDJSON file from a query (default: stdin)')
+    parser.add_argument('--batch-size', type=int, default=25, help=f'Actions: lobbies per transaction (max {MAX_TRANSACTION_ITEMS})')
+    parser.add_argument('--dry-run', action='store_true', help='Actions: list what would be written without writing')
+    args = parser.parse_args(argv)
+
+    if not lobby_table_names():
+        parser.error('TABLE_NAME (and optionally SHARD_MAP) must be set.')
+    if not 1 <= args.batch_size <= MAX_TRANSACTION_ITEMS:
+        parser.error(f'--batch-size must be between 1 and {MAX_TRANSACTION_ITEMS}.')
+
+    writer = NdjsonWriter(sys.stdout)
+    if args.command in SCAN_ATTRIBUTES:
+        run_query(args, writer)
+    else:
+        run_action(args, writer)
+
+if __name__ == '__main__':
+    main()
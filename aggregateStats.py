@@ -0,0 +1,106 @@
+# Lambda function triggered by the lobby table's DynamoDB Stream (NEW_AND_OLD_IMAGES)
+# Keeps live per-resonator pick/ban counters up to date as drafts reach 'complete' with every pick and
+# ban made (whether the last action came from makePick.py or handleTimeout.py), so statistics
+# never require scanning the lobby table.
+#
+# Stats table layout (STATS_TABLE_NAME, partition key 'scope' (S), sort key 'statKey' (S)):
+#   scope='global', statKey='totals'             -> drafts, picks, bans
+#   scope='global', statKey='resonator#<id>'     -> picks, bans
+#   scope='draft#<lobbyCode>#<version>', statKey='processed' -> de-duplication marker (with ttl)
+
+import json
+import boto3
+import os
+import time
+from collections import Counter
+from lobby_common import deserialize_image, is_full_draft
+
+dynamodb_client = boto3.client('dynamodb')
+stats_table_name = os.environ['STATS_TABLE_NAME']
+MARKER_TTL_SECONDS = 7 * 24 * 60 * 60 # Stream records are retained for 24h, keep markers well beyond that
+
+def get_newly_completed(record):
+    """
+    The lobby if this stream record is the write that moved it into 'complete' as a full draft, else None.
+    Drafts ended early (closed by an operator, or out of resonators) would skew the rates.
+    """
+    if record.get('eventName') != 'MODIFY':
+        return None
+    new_state = record['dynamodb'].get('NewImage', {}).get('gameState', {}).get('S')
+    old_state = record['dynamodb'].get('OldImage', {}).get('gameState', {}).get('S')
+    if new_state != 'complete' or old_state == 'complete':
+        return None
+    lobby = deserialize_image(record['dynamodb'].get('NewImage'))
+    return lobby if is_full_draft(lobby) else None
+
+def counter_update(stat_key, counts):
+    """Builds a low-level ADD update for one counter item."""
+    names = {f'#c{i}': name for i, name in enumerate(counts)}
+    values = {f':c{i}': {'N': str(amount)} for i, amount in enumerate(counts.values())}
+    return {
+        'Update': {
+            'TableName': stats_table_name,
+            'Key': {'scope': {'S': 'global'}, 'statKey': {'S': stat_key}},
+            'UpdateExpression': 'ADD ' + ', '.join(f'{name} {value}' for name, value in zip(names, values)),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values
+        }
+    }
+
+def record_draft(lobby):
+    """
+    Adds one completed draft to the counters in a single transaction together with a
+    de-duplication marker, so stream retries never double count a draft.
+    Returns False if the draft had already been counted.
+    """
+    picks = lobby.get('picks', [])
+    bans = lobby.get('bans', [])
+    per_resonator = {}
+    for resonator_id in picks:
+        per_resonator.setdefault(resonator_id, Counter())['picks'] += 1
+    for resonator_id in bans:
+        per_resonator.setdefault(resonator_id, Counter())['bans'] += 1
+
+    marker_scope = f"draft#{lobby['lobbyCode']}#{int(lobby.get('version', 0))}"
+    transact_items = [
+        {
+            'Put': {
+                'TableName': stats_table_name,
+                'Item': {
+                    'scope': {'S': marker_scope},
+                    'statKey': {'S': 'processed'},
+                    'ttl': {'N': str(int(time.time()) + MARKER_TTL_SECONDS)}
+                },
+                'ConditionExpression': 'attribute_not_exists(#scope)',
+                'ExpressionAttributeNames': {'#scope': 'scope'}
+            }
+        },
+        counter_update('totals', Counter({'drafts': 1, 'picks': len(picks), 'bans': len(bans)}))
+    ]
+    transact_items.extend(
+        counter_update(f'resonator#{resonator_id}', counts) for resonator_id, counts in per_resonator.items()
+    )
+
+    try:
+        dynamodb_client.transact_write_items(TransactItems=transact_items)
+        return True
+    except dynamodb_client.exceptions.TransactionCanceledException as e:
+        reasons = e.response.get('CancellationReasons', [])
+        if reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+            print(f"Draft {marker_scope} already counted, skipping.")
+            return False
+        raise
+
+def lambda_handler(event, context):
+    records = event.get('Records', [])
+    counted = 0
+    for record in records:
+        lobby = get_newly_completed(record)
+        if lobby is None:
+            continue
+        if record_draft(lobby):
+            counted += 1
+            print(f"Counted completed draft {lobby.get('lobbyCode')}: picks={lobby.get('picks')}, bans={lobby.get('bans')}")
+
+    # Any exception above propagates so Lambda retries the batch; markers keep retries idempotent
+    return {'statusCode': 200, 'body': json.dumps({'records': len(records), 'draftsCounted': counted})}
@@ -0,0 +1,175 @@
+# Lambda function triggered by the lobby table's DynamoDB Stream (NEW_AND_OLD_IMAGES)
+# Copies finished drafts to a cheap cold tier before the 24h TTL deletes them:
+#   - MODIFY into 'complete' with every pick/ban  -> archived with archiveReason 'complete'
+#   - MODIFY into any other finished state        -> archived with archiveReason 'closed'
+#     ('closed' by an operator, or a 'complete' that ran out of resonators before the last turn)
+#   - TTL REMOVE of a lobby that never finished   -> archived with archiveReason 'expired'
+# Each stream batch becomes one gzip-compressed NDJSON file per day:
+#   {ARCHIVE_PREFIX}dt=YYYY-MM-DD/{firstSequenceNumber}.ndjson.gz
+# The file name comes from the batch itself, so a retried batch overwrites its own file
+# instead of duplicating drafts. Files are written to S3 (ARCHIVE_BUCKET_NAME) or, for local
+# development, to a directory (ARCHIVE_DIR).
+#
+# iter_archived_lobbies() reads the archive back one lobby at a time (bounded memory).
+# It also works from the command line:
+#   python archiveLobbies.py s3://my-archive-bucket/archive/ --from 2026-10-01 --to 2026-10-07 > drafts.ndjson
+#   python archiveLobbies.py ./archive --reason complete --count
+
+import argparse
+import datetime
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+import boto3
+from lobby_common import decimal_to_int, deserialize_image, FINISHED_STATES, is_full_draft
+
+s3 = boto3.client('s3')
+archive_bucket_name = os.environ.get('ARCHIVE_BUCKET_NAME', '')
+archive_prefix = os.environ.get('ARCHIVE_PREFIX', 'archive/')
+archive_dir = os.environ.get('ARCHIVE_DIR', '')
+
+def is_ttl_removal(record):
+    """TTL deletions are REMOVE records made by the DynamoDB service itself."""
+    identity = record.get('userIdentity') or {}
+    return (record.get('eventName') == 'REMOVE'
+            and identity.get('type') == 'Service'
+            and identity.get('principalId') == 'dynamodb.amazonaws.com')
+
+def get_archive_entry(record):
+    """Returns (lobby, reason) if this stream record should be archived, else None."""
+    images = record.get('dynamodb', {})
+    new_state = (images.get('NewImage') or {}).get('gameState', {}).get('S')
+    old_state = (images.get('OldImage') or {}).get('gameState', {}).get('S')
+
+    if record.get('eventName') == 'MODIFY' and new_state in FINISHED_STATES and old_state not in FINISHED_STATES:
+        lobby = deserialize_image(images['NewImage'])
+        return lobby, 'complete' if is_full_draft(lobby) else 'closed'
+    if is_ttl_removal(record) and old_state not in FINISHED_STATES: # Finished lobbies were archived when they finished
+        return deserialize_image(images.get('OldImage')), 'expired'
+    return None
+
+def build_batch_files(records):
+    """Groups archivable records by day and returns {day: (first_sequence_number, [lines])}."""
+    batches = {}
+    for record in records:
+        entry = get_archive_entry(record)
+        if not entry:
+            continue
+        lobby, reason = entry
+        created_seconds = record.get('dynamodb', {}).get('ApproximateCreationDateTime', time.time())
+        day = datetime.datetime.fromtimestamp(float(created_seconds), tz=datetime.timezone.utc).strftime('%Y-%m-%d')
+        lobby['archiveReason'] = reason
+        lobby['archivedAt'] = int(float(created_seconds) * 1000)
+        sequence_number = record.get('dynamodb', {}).get('SequenceNumber', str(int(time.time() * 1000)))
+        first_sequence_number, lines = batches.setdefault(day, (sequence_number, []))
+        lines.append(json.dumps(lobby, default=decimal_to_int, separators=(',', ':')))
+    return batches
+
+def write_archive_file(day, first_sequence_number, lines):
+    """Writes one gzip NDJSON file for the day partition. Returns where it went."""
+    relative_key = f"{archive_prefix}dt={day}/{first_sequence_number}.ndjson.gz"
+    body = gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'))
+
+    if archive_dir:
+        file_path = os.path.join(archive_dir, relative_key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'wb') as archive_file:
+            archive_file.write(body)
+        os.replace(tmp_path, file_path) # Readers never see a half-written file
+        return file_path
+
+    s3.put_object(
+        Bucket=archive_bucket_name,
+        Key=relative_key,
+        Body=body,
+        ContentType='application/gzip' # Stored compressed as-is; readers decompress
+    )
+    return f"s3://{archive_bucket_name}/{relative_key}"
+
+# --- Bulk Reader ---
+
+def parse_source(source):
+    """Splits 's3://bucket/prefix' into (bucket, prefix); local paths return (None, path)."""
+    if source.startswith('s3://'):
+        bucket, _, prefix = source[len('s3://'):].partition('/')
+        return bucket, prefix
+    return None, source
+
+def day_in_range(day, from_day, to_day):
+    return (not from_day or day >= from_day) and (not to_day or day <= to_day)
+
+def day_from_path(path):
+    """Extracts YYYY-MM-DD from a '.../dt=YYYY-MM-DD/...' path, or None."""
+    for part in path.replace('\\', '/').split('/'):
+        if part.startswith('dt='):
+            return part[len('dt='):]
+    return None
+
+def iter_archive_files(source, from_day=None, to_day=None):
+    """Yields (name, binary file object) for every archive file in the day range, oldest day first."""
+    bucket, prefix = parse_source(source)
+    if bucket:
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                if key.endswith('.ndjson.gz') and day_in_range(day_from_path(key) or '', from_day, to_day):
+                    yield key, s3.get_object(Bucket=bucket, Key=key)['Body'] # Streamed, not loaded whole
+        return
+
+    for root, dirs, files in os.walk(prefix):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            if name.endswith('.ndjson.gz') and day_in_range(day_from_path(file_path) or '', from_day, to_day):
+                yield file_path, open(file_path, 'rb')
+
+def iter_archived_lobbies(source, from_day=None, to_day=None, reason=None):
+    """Yields archived lobbies one at a time; only one decompressed line is held in memory."""
+    for name, raw_file in iter_archive_files(source, from_day, to_day):
+        with gzip.GzipFile(fileobj=raw_file) as gzip_file:
+            for line in io.TextIOWrapper(gzip_file, encoding='utf-8'):
+                if not line.strip():
+                    continue
+                lobby = json.loads(line)
+                if reason is None or lobby.get('archiveReason') == reason:
+                    yield lobby
+        raw_file.close()
+
+# --- Main Handler ---
+
+def lambda_handler(event, context):
+    records = event.get('Records', [])
+    if not archive_bucket_name and not archive_dir:
+        raise ValueError("Set ARCHIVE_BUCKET_NAME (or ARCHIVE_DIR) to archive lobbies.")
+
+    archived = 0
+    for day, (first_sequence_number, lines) in build_batch_files(records).items():
+        location = write_archive_file(day, first_sequence_number, lines)
+        archived += len(lines)
+        print(f"Archived {len(lines)} lobbies to {location}")
+
+    # Errors propagate so Lambda retries the batch; the same file name is rewritten on retry
+    return {'statusCode': 200, 'body': json.dumps({'records': len(records), 'lobbiesArchived': archived})}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read archived lobbies as NDJSON.')
+    parser.add_argument('source', help="Archive location: a local directory or s3://bucket/prefix")
+    parser.add_argument('--from', dest='from_day', help='First day (YYYY-MM-DD), inclusive')
+    parser.add_argument('--to', dest='to_day', help='Last day (YYYY-MM-DD), inclusive')
+    parser.add_argument('--reason', choices=['complete', 'closed', 'expired'], help='Only lobbies archived for this reason')
+    parser.add_argument('--count', action='store_true', help='Print only the number of lobbies')
+    args = parser.parse_args()
+
+    total = 0
+    for archived_lobby in iter_archived_lobbies(args.source, args.from_day, args.to_day, args.reason):
+        total += 1
+        if not args.count:
+            sys.stdout.write(json.dumps(archived_lobby, separators=(',', ':')) + '\n')
+    if args.count:
+        print(total)
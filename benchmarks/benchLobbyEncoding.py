@@ -0,0 +1,94 @@
+# Benchmark: bytes per poll and serialization cost of the GET /lobbies/{lobbyCode} body.
+#
+# Compares the original encoding (json.dumps with default separators) with the current JSON and
+# compact formats, each uncompressed, gzip and (if the 'brotli' package is installed) brotli.
+# Uses the real encoders from getLobby.py on a mid-draft lobby shaped like a DynamoDB item.
+#
+# Usage (from the repository root; no AWS access needed):
+#   python benchmarks/benchLobbyEncoding.py
+#   python benchmarks/benchLobbyEncoding.py --iterations 20000
+
+import argparse
+import base64
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+os.environ.setdefault('TABLE_NAME', 'bench')          # getLobby.py reads these at import time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('S3_BUCKET_NAME', 'bench')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import getLobby
+
+def sample_lobby():
+    """A lobby in pick1 with every attribute a real item carries (numbers as Decimal, as boto3 returns them)."""
+    now_ms = 1792425908589
+    return {
+        'lobbyCode': 'a1b2-4821',
+        'organizerName': 'OrganizerName',
+        'eventId': 'spring-cup',
+        'createdAt': Decimal(1792425000),
+        'player1': 'PlayerOneName',
+        'player2': 'PlayerTwoName',
+        'player1Ready': True,
+        'player2Ready': True,
+        'picks': ['resonator_id_1', 'resonator_id_7', 'resonator_id_12'],
+        'bans': ['resonator_id_3', 'resonator_id_9'],
+        'gameState': 'pick1_p2_2',
+        'timerState': {'startTime': Decimal(now_ms), 'duration': Decimal(30000), 'deadline': Decimal(now_ms + 30000), 'isActive': True},
+        'turnDeadline': Decimal(now_ms + 30000),
+        'deadlineShard': '3',
+        'version': Decimal(14),
+        'ttl': Decimal(1792511400)
+    }
+
+def legacy_encode(item):
+    return json.dumps(item, default=getLobby.decimal_to_int) # Body before compact separators
+
+def body_bytes(body, is_base64):
+    return len(base64.b64decode(body)) if is_base64 else len(body.encode('utf-8'))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark lobby response encodings.')
+    parser.add_argument('--iterations', type=int, default=5000, help='Encodes timed per variant')
+    args = parser.parse_args(argv)
+
+    item = sample_lobby()
+    getLobby.COMPRESSION_MIN_BYTES = 0 # Measure compression even for this small body
+    encodings = ['identity', 'gzip'] + (['br'] if getLobby.brotli is not None else [])
+
+    rows = []
+    legacy = legacy_encode(item)
+    seconds = timeit.timeit(lambda: legacy_encode(item), number=args.iterations)
+    rows.append(('legacy json', 'identity', len(legacy.encode('utf-8')), seconds))
+
+    for wire_format in ('json', 'compact'):
+        for content_encoding in encodings:
+            def encode_once():
+                text = getLobby.encode_lobby(item, wire_format)
+                if content_encoding == 'identity':
+                    return text, False
+                return getLobby.compress_body(text, content_encoding), True
+            body, is_base64 = encode_once()
+            seconds = timeit.timeit(encode_once, number=args.iterations)
+            rows.append((wire_format, content_encoding, body_bytes(body, is_base64), seconds))
+
+    # Cache hit: the representation already exists, so a poll costs a dictionary lookup
+    cache = getLobby.LobbyResponseCache(8 * 1024 * 1024, 1000)
+    entry, _ = cache.store(item)
+    cache.render(entry, 'compact', 'gzip')
+    hit_seconds = timeit.timeit(lambda: cache.render(entry, 'compact', 'gzip'), number=args.iterations)
+
+    baseline = rows[0][2]
+    print(f"{'format':<12} {'encoding':<9} {'bytes':>6} {'vs legacy':>10} {'us/encode':>10}")
+    for wire_format, content_encoding, size, seconds in rows:
+        print(f"{wire_format:<12} {content_encoding:<9} {size:>6} {size / baseline:>9.0%} {seconds / args.iterations * 1e6:>10.1f}")
+    print(f"cached render (compact, gzip): {hit_seconds / args.iterations * 1e6:.2f} us")
+    if getLobby.brotli is None:
+        print("(brotli not installed: pip install brotli to include it)")
+
+if __name__ == '__main__':
+    main()
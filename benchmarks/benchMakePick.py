@@ -0,0 +1,165 @@
+# Benchmark: pick/ban latency of makePick.py with side effects run one after another vs concurrently.
+#
+# Runs the real lambda_handler against in-process stand-ins for DynamoDB, EventBridge Scheduler and
+# S3 that sleep for a random, log-normally distributed time (median/p99 per call below). Reports p50
+# and p99 handler latency for SIDE_EFFECT_WORKERS=0 (before) and the thread pool (after).
+#
+# Both of those still include the side effects: Lambda may freeze the container as soon as the handler
+# returns, so makePick.py waits for them before responding. The thread pool cuts their cost from the
+# sum of the calls to the slowest one. The third row is TIMER_MODE=outbox, where the schedule and
+# snapshot are recorded by the write itself and carried out by dispatchOutbox.py, so the response
+# only waits for the write and the event log append.
+#
+# Usage (from the repository root; no AWS access needed):
+#   python benchmarks/benchMakePick.py
+#   python benchmarks/benchMakePick.py --picks 500 --seed 7
+
+import argparse
+import contextlib
+import copy
+import io
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import types
+from decimal import Decimal
+
+os.environ.setdefault('TABLE_NAME', 'bench')              # makePick.py and lobby_common.py read these at import time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('RATE_LIMIT_BACKEND', 'off')
+os.environ.setdefault('HANDLE_TIMEOUT_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:000000000000:function:handleTimeout')
+os.environ.setdefault('LAMBDA_EXECUTION_ROLE_ARN', 'arn:aws:iam::000000000000:role/scheduler')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import lobby_common
+import makePick
+
+# Simulated service latency in ms: (median, p99)
+LATENCY_MS = {
+    'dynamodb_read': (4, 15),
+    'dynamodb_write': (7, 25),
+    'scheduler': (35, 120),
+    's3_head': (8, 30),
+    's3_put': (20, 80),
+    'events_put': (7, 25)
+}
+
+def simulated_call(kind, rng):
+    median, p99 = LATENCY_MS[kind]
+    sigma = math.log(p99 / median) / 2.326 # z-score of the 99th percentile
+    time.sleep(rng.lognormvariate(math.log(median), sigma) / 1000)
+
+class FakeTable:
+    def __init__(self, rng):
+        self.rng = rng
+        self.item = None
+
+    def get_item(self, **kwargs):
+        simulated_call('dynamodb_read', self.rng)
+        return {'Item': copy.deepcopy(self.item)}
+
+    def update_item(self, **kwargs):
+        simulated_call('dynamodb_write', self.rng)
+        values = kwargs['ExpressionAttributeValues']
+        updated = copy.deepcopy(self.item)
+        updated.update({'gameState': values[':state'], 'timerState': values[':timer'], 'version': updated['version'] + 1})
+        updated['bans' if ':b' in values else 'picks'] = values.get(':b', values.get(':p'))
+        return {'Attributes': updated}
+
+    def put_item(self, **kwargs): # Draft event log
+        simulated_call('events_put', self.rng)
+
+class FakeScheduler:
+    exceptions = types.SimpleNamespace(
+        ConflictException=type('ConflictException', (Exception,), {}),
+        ResourceNotFoundException=type('ResourceNotFoundException', (Exception,), {})
+    )
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def create_schedule(self, **kwargs):
+        simulated_call('scheduler', self.rng)
+
+    def delete_schedule(self, **kwargs):
+        simulated_call('scheduler', self.rng)
+
+class FakeS3:
+    def __init__(self, rng):
+        self.rng = rng
+
+    def head_object(self, **kwargs): # Version check before each snapshot put
+        simulated_call('s3_head', self.rng)
+        return {'Metadata': {'lobby-version': '0'}, 'ETag': '"bench"'}
+
+    def put_object(self, **kwargs):
+        simulated_call('s3_put', self.rng)
+
+def lobby_in_ban_phase():
+    return {
+        'lobbyCode': 'a1b2-4821', 'organizerName': 'Organizer', 'player1': 'Alice', 'player2': 'Bob',
+        'player1Ready': True, 'player2Ready': True, 'picks': [], 'bans': [], 'gameState': 'ban1_p1',
+        'timerState': {'startTime': Decimal(0), 'duration': Decimal(30000), 'deadline': Decimal(30000), 'isActive': True},
+        'version': Decimal(5)
+    }
+
+def pick_event():
+    return {
+        'httpMethod': 'POST',
+        'pathParameters': {'lobbyCode': 'a1b2-4821'},
+        'headers': {},
+        'requestContext': {'identity': {'sourceIp': '203.0.113.7'}},
+        'body': '{"player": "player1", "pick": "resonator_id_1"}'
+    }
+
+def measure(picks, executor, seed, timer_mode='scheduler'):
+    """Returns handler latencies in ms for `picks` ban1_p1 actions."""
+    rng = random.Random(seed)
+    table = FakeTable(rng)
+    lobby_common.shard_tables[lobby_common.default_table_name] = table # Unsharded lobby codes route here
+    lobby_common.events_table = table
+    lobby_common.scheduler = FakeScheduler(rng)
+    lobby_common.s3 = FakeS3(rng)
+    lobby_common.snapshot_bucket_name = 'bench'
+    makePick.TIMER_MODE = timer_mode
+    makePick.side_effect_executor = executor
+
+    latencies = []
+    for _ in range(picks):
+        table.item = lobby_in_ban_phase()
+        with contextlib.redirect_stdout(io.StringIO()): # The handler logs a lot
+            started = time.perf_counter()
+            response = makePick.lambda_handler(pick_event(), None)
+            latencies.append((time.perf_counter() - started) * 1000)
+        if response['statusCode'] != 200:
+            raise RuntimeError(f"Unexpected response: {response}")
+    return latencies
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark makePick.py side-effect concurrency.')
+    parser.add_argument('--picks', type=int, default=200, help='Picks per variant')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    workers = makePick.SIDE_EFFECT_WORKERS or 4
+    pool = makePick.side_effect_executor or makePick.concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    variants = [
+        ('sequential side effects (before)', None, 'scheduler'),
+        (f'thread pool x{workers} side effects (after)', pool, 'scheduler'),
+        ('TIMER_MODE=outbox, write + event log', pool, 'outbox')
+    ]
+    print(f"{'variant':<38} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for name, executor, timer_mode in variants:
+        latencies = measure(args.picks, executor, args.seed, timer_mode)
+        print(f"{name:<38} {percentile(latencies, 0.50):>8.1f} {percentile(latencies, 0.99):>8.1f} {statistics.mean(latencies):>8.1f}")
+    print("The first two rows include waiting for the schedule swap, snapshot and event log; see the note at the top.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# Benchmark: pick/ban throughput of makePick.py as lobbies are spread over more shards.
+#
+# Each shard is an in-memory lobby store that serves one request at a time and holds it for a fixed
+# service time, standing in for the write capacity of one table (or one hot partition). Lobbies get
+# codes on 1, 2, 4 ... shards through SHARD_MAP, and worker threads make picks through the real
+# lambda_handler, so routing goes through lobby_common.get_table exactly as in production.
+#
+# Usage (from the repository root; no AWS access needed):
+#   python benchmarks/benchSharding.py
+#   python benchmarks/benchSharding.py --shards 1 2 4 8 --seconds 3 --service-ms 2
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+
+os.environ.setdefault('TABLE_NAME', 'bench')              # makePick.py and lobby_common.py read these at import time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('RATE_LIMIT_BACKEND', 'off')
+os.environ.setdefault('TIMER_MODE', 'sweeper')              # No schedules: only the lobby store is measured
+os.environ.setdefault('SIDE_EFFECT_WORKERS', '0')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import lobby_common
+import makePick
+
+SHARD_IDS = 'ghijklmnopqrstuvwxyz'
+
+class InMemoryLobbyStore:
+    """One shard: a dict of lobby items behind a lock held for service_ms per request."""
+
+    def __init__(self, service_ms):
+        self.service_seconds = service_ms / 1000
+        self.items = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def serve(self):
+        with self.lock:
+            self.requests += 1
+            time.sleep(self.service_seconds)
+
+    def get_item(self, Key, **kwargs):
+        self.serve()
+        item = self.items.get(Key['lobbyCode'])
+        return {'Item': copy.deepcopy(item)} if item else {}
+
+    def update_item(self, Key, ExpressionAttributeValues, **kwargs):
+        self.serve()
+        values = ExpressionAttributeValues
+        item = self.items[Key['lobbyCode']]
+        if item['version'] != values[':expectedVersion']:
+            raise makePick.dynamodb.meta.client.exceptions.ConditionalCheckFailedException(
+                {'Error': {'Code': 'ConditionalCheckFailedException'}, 'Item': {}}, 'UpdateItem')
+        item.update({'gameState': values[':state'], 'timerState': values[':timer'], 'version': item['version'] + 1})
+        item['bans' if ':b' in values else 'picks'] = values.get(':b', values.get(':p'))
+        return {'Attributes': copy.deepcopy(item)}
+
+def lobby_in_ban_phase(lobby_code):
+    return {
+        'lobbyCode': lobby_code, 'organizerName': 'Organizer', 'player1': 'Alice', 'player2': 'Bob',
+        'player1Ready': True, 'player2Ready': True, 'picks': [], 'bans': [], 'gameState': 'ban1_p1',
+        'timerState': {'startTime': Decimal(0), 'duration': Decimal(30000), 'deadline': Decimal(30000), 'isActive': True},
+        'version': Decimal(1)
+    }
+
+def measure(shard_count, workers, seconds, service_ms):
+    """Picks per second with lobbies spread evenly over shard_count shards."""
+    shard_ids = SHARD_IDS[:shard_count]
+    stores = {shard_id: InMemoryLobbyStore(service_ms) for shard_id in shard_ids}
+    lobby_common.SHARD_MAP = {shard_id: f'lobbies-{shard_id}' for shard_id in shard_ids}
+    lobby_common.shard_tables = {f'lobbies-{shard_id}': store for shard_id, store in stores.items()}
+
+    stop_at = time.perf_counter() + seconds
+    completed = [0] * workers
+
+    def worker(index):
+        shard_id = shard_ids[index % shard_count]
+        lobby_code = f"{shard_id}{index:03x}-0000"
+        store = stores[shard_id]
+        while time.perf_counter() < stop_at:
+            store.items[lobby_code] = lobby_in_ban_phase(lobby_code) # Fresh turn, not a store request
+            event = {
+                'httpMethod': 'POST', 'pathParameters': {'lobbyCode': lobby_code}, 'headers': {},
+                'body': json.dumps({'player': 'player1', 'pick': 'resonator_id_1'})
+            }
+            response = makePick.lambda_handler(event, None)
+            if response['statusCode'] != 200:
+                raise RuntimeError(f"Unexpected response: {response}")
+            completed[index] += 1
+
+    with contextlib.redirect_stdout(io.StringIO()): # The handler logs a lot
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    return sum(completed) / elapsed, {shard_id: store.requests for shard_id, store in stores.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark makePick.py throughput across lobby shards.')
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--workers', type=int, default=32, help='Concurrent players (one lobby each)')
+    parser.add_argument('--seconds', type=float, default=2.0, help='Duration per shard count')
+    parser.add_argument('--service-ms', type=float, default=2.0, help='Time one store request holds its shard')
+    args = parser.parse_args(argv)
+
+    print(f"{'shards':>6} {'picks/s':>9} {'per shard':>10} {'speedup':>8}  store requests per shard")
+    baseline = None
+    for shard_count in args.shards:
+        picks_per_second, requests = measure(shard_count, args.workers, args.seconds, args.service_ms)
+        baseline = baseline or picks_per_second
+        print(f"{shard_count:>6} {picks_per_second:>9.0f} {picks_per_second / shard_count:>10.0f} {picks_per_second / baseline:>7.1f}x  "
+              + ' '.join(f"{shard_id}={count}" for shard_id, count in requests.items()))
+
+if __name__ == '__main__':
+    main()
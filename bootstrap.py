@@ -0,0 +1,115 @@
+# Lambda function for GET /bootstrap?catalogVersion=<v>&lobbyCode=<code>&playerName=<name>
+# Everything script.js needs on page load in one round trip:
+#   - catalogVersion: content hash of resonators.json (same hash sw.js uses for its caches)
+#   - catalog: the resonators list, only when the client's catalogVersion is missing or different
+#   - lobby: the saved lobby's current state (same shape as GET /lobbies/{lobbyCode}), or null
+#   - role: the caller's role in that lobby, resolved from playerName ('organizer', 'organizer_player',
+#     'player1', 'player2'), or null if the name no longer holds a place in it
+# All query parameters are optional; without a lobbyCode only the catalog part is answered.
+
+import json
+import boto3
+import hashlib
+import os
+import time
+from lobby_common import decimal_to_int, get_table, public_lobby
+
+s3 = boto3.client('s3')
+s3_bucket_name = os.environ.get('S3_BUCKET_NAME', 'pick-ban-test-2023-10-27') # Bucket for resonators.json
+s3_file_key = os.environ.get('S3_FILE_KEY', 'resonators.json')
+CATALOG_CACHE_SECONDS = int(os.environ.get('CATALOG_CACHE_SECONDS', '300')) # How long a container trusts its copy
+
+def get_headers():
+    return {
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET,OPTIONS',
+        'Access-Control-Expose-Headers': 'X-Server-Time',
+        'Cache-Control': 'no-store', # Depends on the caller's lobby and name
+        'Content-Type': 'application/json'
+    }
+
+# --- Catalog (resonators.json from S3, re-read at most every CATALOG_CACHE_SECONDS per container) ---
+catalog = {'version': None, 'json': None, 'loadedAt': 0}
+
+def catalog_version(text):
+    """First 8 bytes of the SHA-256 of the file, hex encoded - matches refreshCatalog() in sw.js."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+def get_catalog():
+    """Returns (version, resonators JSON text). A failed refresh keeps serving the copy already loaded."""
+    now = time.time()
+    if catalog['json'] is None or now - catalog['loadedAt'] > CATALOG_CACHE_SECONDS:
+        try:
+            response = s3.get_object(Bucket=s3_bucket_name, Key=s3_file_key)
+            text = response['Body'].read().decode('utf-8')
+            resonators = json.loads(text)
+            version = catalog_version(text)
+            if version != catalog['version']:
+                print(f"Loaded catalog version {version} ({len(resonators)} resonators) from S3.")
+            catalog.update({'version': version, 'json': json.dumps(resonators, separators=(',', ':')), 'loadedAt': now})
+        except Exception as e:
+            if catalog['json'] is None:
+                raise
+            print(f"ERROR refreshing resonators.json from S3, keeping version {catalog['version']}: {str(e)}")
+            catalog['loadedAt'] = now # Do not retry on every request
+    return catalog['version'], catalog['json']
+
+# --- Lobby and Role ---
+def load_lobby(lobby_code):
+    """Eventually consistent read; a missing lobby is read again strongly (it may have just been created)."""
+    item = get_table(lobby_code).get_item(Key={'lobbyCode': lobby_code}, ConsistentRead=False).get('Item')
+    if not item:
+        item = get_table(lobby_code).get_item(Key={'lobbyCode': lobby_code}, ConsistentRead=True).get('Item')
+    return item
+
+def resolve_role(item, player_name):
+    """The role script.js should restore for player_name, or None if the name has no place in the lobby."""
+    name = (player_name or '').strip()
+    if not name:
+        return None
+    in_slot = name in ((item.get('player1') or '').strip(), (item.get('player2') or '').strip())
+    if name == (item.get('organizerName') or '').strip():
+        return 'organizer_player' if in_slot else 'organizer'
+    if name == (item.get('player1') or '').strip():
+        return 'player1'
+    if name == (item.get('player2') or '').strip():
+        return 'player2'
+    return None
+
+def lambda_handler(event, context):
+    headers = get_headers()
+
+    if event.get('httpMethod') == 'OPTIONS':
+        return {'statusCode': 200, 'headers': headers, 'body': ''}
+
+    params = event.get('queryStringParameters') or {}
+    lobby_code = (params.get('lobbyCode') or '').strip()
+    player_name = params.get('playerName')
+    print(f"Bootstrap: lobby={lobby_code or '-'}, catalogVersion={params.get('catalogVersion') or '-'}")
+
+    try:
+        version, catalog_json = get_catalog()
+
+        lobby = None
+        role = None
+        if lobby_code:
+            lobby = load_lobby(lobby_code)
+            role = resolve_role(lobby, player_name) if lobby else None
+            print(f"Lobby {lobby_code}: {'found, version ' + str(lobby.get('version')) if lobby else 'not found'}, role {role}")
+
+        # The catalog is spliced in pre-encoded so it is serialized once per container, not per request
+        parts = [
+            f'"catalogVersion":{json.dumps(version)}',
+            f'"lobby":{json.dumps(public_lobby(lobby), default=decimal_to_int, separators=(",", ":"))}',
+            f'"role":{json.dumps(role)}'
+        ]
+        if params.get('catalogVersion') != version:
+            parts.append(f'"catalog":{catalog_json}')
+
+        headers['X-Server-Time'] = str(int(time.time() * 1000)) # Lets clients align countdowns with server deadlines
+        return {'statusCode': 200, 'headers': headers, 'body': '{' + ','.join(parts) + '}'}
+
+    except Exception as e:
+        print(f"Error in bootstrap: {e}")
+        return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'error': 'Could not load the page data.'})}
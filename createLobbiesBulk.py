@@ -0,0 +1,250 @@
+# Lambda function for POST /lobbies/bulk
+# Creates many lobbies for one event (e.g. a tournament bracket) in a single request.
+# INSECURE VERSION: Trusts organizer name sent in request body (same as createLobby.py).
+
+import json
+import boto3
+import uuid
+import os
+import time
+import random
+import zlib
+from boto3.dynamodb.types import TypeSerializer
+from lobby_common import get_table_name, NEW_LOBBY_SHARDS, parse_timer_durations
+
+dynamodb = boto3.resource('dynamodb')
+dynamodb_client = dynamodb.meta.client
+serializer = TypeSerializer()
+events_table_name = os.environ.get('EVENTS_TABLE_NAME', '') # Optional draft event log
+
+MAX_LOBBIES_PER_REQUEST = 128 # Enough for a 64-match bracket with room to spare
+BATCH_WRITE_CHUNK_SIZE = 25   # DynamoDB BatchWriteItem limit (event log)
+TRANSACTION_CHUNK_SIZE = 100  # DynamoDB TransactWriteItems limit (lobbies)
+MAX_BATCH_ATTEMPTS = 5        # Attempts per chunk before giving up on unprocessed items
+BASE_BACKOFF_SECONDS = 0.05
+
+def get_cors_headers():
+    return {
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'OPTIONS,POST'
+    }
+
+def get_event_shard(event_id):
+    """Shard for all lobbies of one event, so a tournament's load stays on (and is isolated to) one table."""
+    if not NEW_LOBBY_SHARDS:
+        return None
+    return NEW_LOBBY_SHARDS[zlib.crc32(event_id.encode('utf-8')) % len(NEW_LOBBY_SHARDS)]
+
+def generate_lobby_code(used_codes, shard_id=None):
+    """Generates a lobby code in the same format as createLobby.py, unique within this request."""
+    while True:
+        prefix = shard_id + uuid.uuid4().hex[:3] if shard_id else uuid.uuid4().hex[:4]
+        code = f"{prefix}-{int(time.time() * 1000) % 10000:04d}"
+        if code not in used_codes:
+            used_codes.add(code)
+            return code
+
+def parse_matches(body):
+    """Returns a list of (player1, player2) name tuples from the request body."""
+    matches = body.get('matches')
+    count = body.get('count')
+
+    if matches is None and count is None:
+        raise ValueError("Request body must contain 'matches' or 'count'.")
+
+    if matches is None:
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            raise ValueError("'count' must be a positive integer.")
+        matches = [{} for _ in range(count)]
+
+    if not isinstance(matches, list) or not matches:
+        raise ValueError("'matches' must be a non-empty list.")
+    if len(matches) > MAX_LOBBIES_PER_REQUEST:
+        raise ValueError(f"Cannot create more than {MAX_LOBBIES_PER_REQUEST} lobbies per request.")
+
+    parsed = []
+    for index, match in enumerate(matches):
+        if not isinstance(match, dict):
+            raise ValueError(f"Match {index} must be an object.")
+        player1 = (match.get('player1') or '').strip()
+        player2 = (match.get('player2') or '').strip()
+        if player1 and player1 == player2:
+            raise ValueError(f"Match {index} assigns the same player to both slots.")
+        parsed.append((player1, player2))
+    return parsed
+
+def write_lobbies(items, table_name, used_codes, shard_id):
+    """
+    Writes lobby items in transactions of up to 100, each put conditioned on attribute_not_exists(lobbyCode)
+    so an existing lobby is never overwritten. A code that is already taken (sharded codes have fewer random
+    hex digits) gets a new one and its chunk is retried. Returns the items that could not be written.
+    """
+    failed_items = []
+    for chunk_start in range(0, len(items), TRANSACTION_CHUNK_SIZE):
+        chunk = items[chunk_start:chunk_start + TRANSACTION_CHUNK_SIZE]
+
+        for attempt in range(MAX_BATCH_ATTEMPTS):
+            try:
+                dynamodb_client.transact_write_items(TransactItems=[
+                    {'Put': {
+                        'TableName': table_name,
+                        'Item': {key: serializer.serialize(value) for key, value in item.items()},
+                        'ConditionExpression': 'attribute_not_exists(lobbyCode)'
+                    }}
+                    for item in chunk
+                ])
+                break
+            except dynamodb_client.exceptions.TransactionCanceledException as e:
+                for item, reason in zip(chunk, e.response.get('CancellationReasons', [])):
+                    if reason.get('Code') == 'ConditionalCheckFailed':
+                        print(f"Lobby code {item['lobbyCode']} is taken, generating a new one.")
+                        item['lobbyCode'] = generate_lobby_code(used_codes, shard_id)
+            except (dynamodb_client.exceptions.ProvisionedThroughputExceededException,
+                    dynamodb_client.exceptions.TransactionInProgressException):
+                pass
+            # Full jitter backoff before retrying the chunk
+            backoff = random.uniform(0, BASE_BACKOFF_SECONDS * (2 ** attempt))
+            print(f"Retrying {len(chunk)} lobbies (attempt {attempt + 1}) after {backoff:.3f}s")
+            time.sleep(backoff)
+        else:
+            print(f"ERROR: {len(chunk)} lobbies still not written after {MAX_BATCH_ATTEMPTS} attempts.")
+            failed_items.extend(chunk)
+    return failed_items
+
+def batch_write_with_retry(put_requests, target_table_name):
+    """
+    Writes PutRequests in chunks of 25, retrying unprocessed items with exponential backoff.
+    Returns the list of items that could not be written after all attempts.
+    """
+    failed_items = []
+    for chunk_start in range(0, len(put_requests), BATCH_WRITE_CHUNK_SIZE):
+        pending = put_requests[chunk_start:chunk_start + BATCH_WRITE_CHUNK_SIZE]
+
+        for attempt in range(MAX_BATCH_ATTEMPTS):
+            response = dynamodb.batch_write_item(RequestItems={target_table_name: pending})
+            pending = response.get('UnprocessedItems', {}).get(target_table_name, [])
+            if not pending:
+                break
+            # Full jitter backoff before retrying throttled items
+            backoff = random.uniform(0, BASE_BACKOFF_SECONDS * (2 ** attempt))
+            print(f"Retrying {len(pending)} unprocessed items (attempt {attempt + 1}) after {backoff:.3f}s")
+            time.sleep(backoff)
+
+        if pending:
+            print(f"ERROR: {len(pending)} items still unprocessed after {MAX_BATCH_ATTEMPTS} attempts.")
+            failed_items.extend(request['PutRequest']['Item'] for request in pending)
+    return failed_items
+
+def lambda_handler(event, context):
+    headers = get_cors_headers()
+
+    if event.get('httpMethod') == 'OPTIONS':
+        return {'statusCode': 200, 'headers': headers, 'body': ''}
+
+    try:
+        # --- Step 1: Parse Request ---
+        try:
+            body = json.loads(event.get('body') or '{}')
+        except (json.JSONDecodeError, TypeError):
+            raise ValueError("Invalid request body format.")
+
+        organizer_name = (body.get('playerName') or '').strip()
+        if not organizer_name:
+            raise ValueError("Organizer name is missing or empty")
+
+        event_id = (body.get('eventId') or '').strip() or f"evt-{uuid.uuid4().hex[:8]}"
+        matches = parse_matches(body)
+        timer_durations = parse_timer_durations(body) # Same turn lengths for every lobby of the event
+        shard_id = get_event_shard(event_id)
+        lobby_table_name = get_table_name(shard_id)
+        print(f"Bulk creating {len(matches)} lobbies for event {event_id} (organizer: {organizer_name}) in {lobby_table_name}")
+
+        # --- Step 2: Build Lobby Items ---
+        # Codes are unique within this request; collisions with existing lobbies are caught by the write.
+        current_timestamp = int(time.time())
+        expiration_timestamp = current_timestamp + 24 * 60 * 60 # Same 24h TTL as createLobby.py
+        used_codes = set()
+        lobby_items = []
+        for player1, player2 in matches:
+            item = {
+                'lobbyCode': generate_lobby_code(used_codes, shard_id),
+                'organizerName': organizer_name,
+                'eventId': event_id,
+                'createdAt': current_timestamp,
+                'player1': player1,
+                'player2': player2,
+                'player1Ready': False,
+                'player2Ready': False,
+                'picks': [],
+                'bans': [],
+                'timerState': {'startTime': None, 'duration': None, 'deadline': None, 'isActive': False},
+                # With both players pre-assigned there is nobody left to join: go straight to the ready check
+                'gameState': 'ready_check' if player1 and player2 else 'waiting',
+                'version': 1,
+                'ttl': expiration_timestamp
+            }
+            if timer_durations:
+                item['timerDurations'] = timer_durations
+            lobby_items.append(item)
+
+        # --- Step 3: Write in Conditional Chunks ---
+        failed_items = write_lobbies(lobby_items, lobby_table_name, used_codes, shard_id)
+        failed_codes = {item['lobbyCode'] for item in failed_items}
+
+        lobbies = [
+            {'lobbyCode': item['lobbyCode'], 'player1': item['player1'], 'player2': item['player2'], 'gameState': item['gameState']}
+            for item in lobby_items
+            if item['lobbyCode'] not in failed_codes
+        ]
+
+        # --- Step 4: Record 'create' Events (seq 1) for the Event Log ---
+        if events_table_name and lobbies:
+            now_ms = int(time.time() * 1000)
+            event_requests = [
+                {'PutRequest': {'Item': {
+                    'lobbyCode': lobby['lobbyCode'], 'seq': 1, 'ts': now_ms, 'type': 'create', 'state': lobby['gameState'],
+                    'player1': lobby['player1'], 'player2': lobby['player2']
+                }}}
+                for lobby in lobbies
+            ]
+            failed_events = batch_write_with_retry(event_requests, events_table_name)
+            if failed_events:
+                print(f"ERROR: Could not record {len(failed_events)} create events.")
+
+        # --- Step 5: Return Codes ---
+        if failed_items:
+            return {
+                'statusCode': 500,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': f'Could not create {len(failed_items)} of {len(lobby_items)} lobbies. Please retry the failed matches.',
+                    'eventId': event_id,
+                    'organizerName': organizer_name,
+                    'lobbies': lobbies,
+                    'failedMatches': [
+                        {'player1': item['player1'], 'player2': item['player2']} for item in failed_items
+                    ]
+                })
+            }
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'eventId': event_id,
+                'organizerName': organizer_name,
+                'lobbies': lobbies
+            })
+        }
+
+    except ValueError as ve:
+        print(ve)
+        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': str(ve)})}
+    except Exception as e:
+        print(f"Error in createLobbiesBulk: {e}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': 'Could not create lobbies due to an internal error.'})
+        }
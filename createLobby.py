@@ -1,11 +1,18 @@
 import json
 import boto3
 import uuid
-import os
 import time
+import random
+from lobby_common import append_event, get_table, NEW_LOBBY_SHARDS, parse_timer_durations
 
 dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
+
+def generate_lobby_code():
+    """'<4 hex>-<4 digits>' without shards, '<shard id><3 hex>-<4 digits>' on a random new-lobby shard."""
+    suffix = f"-{int(time.time() * 1000) % 10000:04d}"
+    if NEW_LOBBY_SHARDS:
+        return random.choice(NEW_LOBBY_SHARDS) + uuid.uuid4().hex[:3] + suffix
+    return uuid.uuid4().hex[:4] + suffix
 
 # --- Helper function placeholder ---
 # You MUST replace this with the actual logic to get the username
@@ -39,10 +46,11 @@ def lambda_handler(event, context):
         # --- Step 1: Extract Organizer Name ---
         # This now calls the helper function defined above
         organizer_name = get_organizer_name_from_event(event)
+        timer_durations = parse_timer_durations(json.loads(event.get('body') or '{}'))
 
         # --- Step 2: Generate Lobby Code ---
-        # Generate a unique lobby code (using UUID and timestamp for extra uniqueness)
-        lobby_code = f"{uuid.uuid4().hex[:4]}-{int(time.time() * 1000) % 10000:04d}"
+        # Generate a unique lobby code (using UUID and timestamp for extra uniqueness); it also picks the shard
+        lobby_code = generate_lobby_code()
 
         # --- Step 3: Calculate TTL ---
         current_timestamp = int(time.time())
@@ -51,19 +59,29 @@ def lambda_handler(event, context):
         expiration_timestamp = current_timestamp + ttl_duration_seconds
 
         # --- Step 4: Store the lobby in DynamoDB, including organizerName and TTL ---
-        table.put_item(
-            Item={
-                'lobbyCode': lobby_code,
-                'organizerName': organizer_name,
-                'createdAt': current_timestamp,
-                'player1': '',
-                'player2': '',
-                'gameState': 'waiting',
-                'ttl': expiration_timestamp  # Add TTL attribute
-            },
+        lobby_item = {
+            'lobbyCode': lobby_code,
+            'organizerName': organizer_name,
+            'createdAt': current_timestamp,
+            'player1': '',
+            'player2': '',
+            'player1Ready': False,
+            'player2Ready': False,
+            'picks': [],
+            'bans': [],
+            'timerState': {'startTime': None, 'duration': None, 'deadline': None, 'isActive': False},
+            'gameState': 'waiting',
+            'version': 1,  # Incremented by every mutation (used for "changed since" checks)
+            'ttl': expiration_timestamp  # Add TTL attribute
+        }
+        if timer_durations:
+            lobby_item['timerDurations'] = timer_durations # Otherwise the per-phase defaults apply
+        get_table(lobby_code).put_item(
+            Item=lobby_item,
             # ConditionExpression to prevent overwriting an existing lobby (unlikely, but good practice)
             ConditionExpression='attribute_not_exists(lobbyCode)'
         )
+        append_event(lobby_item, 'create')
 
         # --- Step 5: Return Success Response ---
         return {
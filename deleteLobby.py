@@ -1,29 +1,13 @@
 import json
 import boto3
-import os
+from lobby_common import get_conflicting_item, get_table, publish_snapshot
 
 dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
 
 def lambda_handler(event, context):
     try:
         lobby_code = event['pathParameters']['lobbyCode']
 
-        # --- Authorization Check (Important!) ---
-        response = table.get_item(Key={'lobbyCode': lobby_code})
-        if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'OPTIONS,DELETE'
-                },
-                'body': json.dumps({'error': 'Lobby not found'})
-            }
-
-        item = response['Item']
-        
         # Get the organizer name from the request body
         try:
             body = json.loads(event.get('body', '{}'))
@@ -42,10 +26,30 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing player name in request'})
             }
 
-        # Check if the requesting player is the organizer
-        stored_organizer_name = item.get('organizerName')
-        if not stored_organizer_name or requesting_player_name != stored_organizer_name:
-            print(f"Auth fail: Input name '{requesting_player_name}' != Stored name '{stored_organizer_name}'")
+        # --- Delete the Item (Authorization Check folded into the write: one round trip) ---
+        # Deleting does not depend on the lobby's contents, so only the organizer is checked, not the version.
+        # On failure the item as it is (or None if it does not exist) tells 404 from 403.
+        try:
+            delete_response = get_table(lobby_code).delete_item(
+                Key={'lobbyCode': lobby_code},
+                ConditionExpression='organizerName = :requester',
+                ExpressionAttributeValues={':requester': requesting_player_name},
+                ReturnValues='ALL_OLD',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+            item = get_conflicting_item(e)
+            if item is None:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'OPTIONS,DELETE'
+                    },
+                    'body': json.dumps({'error': 'Lobby not found'})
+                }
+            print(f"Auth fail: Input name '{requesting_player_name}' != Stored name '{item.get('organizerName')}'")
             return {
                 'statusCode': 403,
                 'headers': {
@@ -55,9 +59,10 @@ def lambda_handler(event, context):
                 },
                 'body': json.dumps({'error': 'Only the organizer can delete the lobby'})
             }
-
-        # --- Delete the Item ---
-        table.delete_item(Key={'lobbyCode': lobby_code})
+        # Leave a tombstone so snapshot pollers learn the lobby is gone. It is one version past the
+        # deleted lobby, so a late publish of an older snapshot cannot bring the lobby back.
+        deleted_version = int(delete_response.get('Attributes', {}).get('version', 0)) + 1
+        publish_snapshot({'lobbyCode': lobby_code, 'gameState': 'deleted', 'version': deleted_version})
 
         return {
             'statusCode': 200,
@@ -0,0 +1,123 @@
+# Lambda function triggered by the lobby table's DynamoDB Stream (NEW_AND_OLD_IMAGES), used with TIMER_MODE=outbox
+# Carries out the side effects that makePick.py, getLobby.py and handleTimeout.py record in a lobby's
+# 'outbox' map in the same conditional write as the state change, so a failed schedule create is retried
+# instead of leaving a turn that never times out.
+#
+# Outbox entries (key '<version>-<type>', one per type per write):
+#   {'type': 'createSchedule', 'gameState': s, 'deadline': ms} -> EventBridge schedule timeout-<lobbyCode>-<s>
+#   {'type': 'deleteSchedule', 'gameState': s}                 -> removes that schedule
+#   {'type': 'publishSnapshot'}                                -> writes the spectator snapshot of the new image
+#
+# Every entry is idempotent (deterministic schedule names, snapshot overwrites), so stream retries are safe.
+# Done entries are removed from the item without bumping its version; a failure raises so Lambda retries
+# the batch, and entries that are still pending are also picked up again by the lobby's next stream record.
+
+import json
+import boto3
+import os
+import time
+import math
+import datetime
+from lobby_common import deserialize_image, get_table, publish_snapshot
+
+dynamodb = boto3.resource('dynamodb')
+
+scheduler = boto3.client('scheduler')
+lambda_client = boto3.client('lambda')
+handle_timeout_lambda_arn = os.environ.get('HANDLE_TIMEOUT_LAMBDA_ARN', '')
+lambda_role_arn = os.environ.get('LAMBDA_EXECUTION_ROLE_ARN', '')
+MIN_SCHEDULE_LEAD_MS = 1000 # Closer deadlines (e.g. after retries) invoke handleTimeout directly
+
+# --- Schedules ---
+def create_schedule(lobby_code, game_state, deadline_ms):
+    """Creates the timeout schedule, or invokes handleTimeout right away if the deadline is (nearly) past."""
+    schedule_name = f"timeout-{lobby_code}-{game_state}"
+    if not handle_timeout_lambda_arn or not lambda_role_arn:
+        raise ValueError("HANDLE_TIMEOUT_LAMBDA_ARN and LAMBDA_EXECUTION_ROLE_ARN must be set.")
+    payload = json.dumps({'lobbyCode': lobby_code, 'expectedGameState': game_state})
+
+    if deadline_ms - int(time.time() * 1000) < MIN_SCHEDULE_LEAD_MS:
+        # handleTimeout checks expectedGameState, so an extra invocation is harmless
+        lambda_client.invoke(FunctionName=handle_timeout_lambda_arn, InvocationType='Event', Payload=payload.encode('utf-8'))
+        print(f"Deadline for {schedule_name} already passed, invoked handleTimeout directly.")
+        return
+
+    # at() has one-second resolution: round up so the timeout never fires before the deadline
+    schedule_dt_utc = datetime.datetime.fromtimestamp(math.ceil(deadline_ms / 1000), tz=datetime.timezone.utc)
+    schedule_time_str = schedule_dt_utc.strftime('%Y-%m-%dT%H:%M:%S')
+    try:
+        scheduler.create_schedule(
+            Name=schedule_name,
+            GroupName='default',
+            ActionAfterCompletion='DELETE',
+            FlexibleTimeWindow={'Mode': 'OFF'},
+            ScheduleExpression=f'at({schedule_time_str})',
+            State='ENABLED',
+            Target={'Arn': handle_timeout_lambda_arn, 'RoleArn': lambda_role_arn, 'Input': payload}
+        )
+        print(f"Created schedule {schedule_name} for {schedule_time_str}")
+    except scheduler.exceptions.ConflictException:
+        print(f"Schedule {schedule_name} already exists (retried entry).")
+
+def delete_schedule(lobby_code, game_state):
+    schedule_name = f"timeout-{lobby_code}-{game_state}"
+    try:
+        scheduler.delete_schedule(Name=schedule_name, GroupName='default')
+        print(f"Deleted schedule {schedule_name}")
+    except scheduler.exceptions.ResourceNotFoundException:
+        print(f"Schedule {schedule_name} not found for deletion (already fired or deleted).")
+
+# --- Dispatch ---
+def dispatch_entries(lobby):
+    """Performs every pending entry of one lobby image. Returns the keys that are done."""
+    done = []
+    snapshot_published = False
+    # Keys start with the version that wrote them, so older entries run first
+    for key, entry in sorted(lobby['outbox'].items(), key=lambda pair: int(pair[0].split('-')[0])):
+        entry_type = entry.get('type')
+        if entry_type == 'deleteSchedule':
+            delete_schedule(lobby['lobbyCode'], entry['gameState'])
+        elif entry_type == 'createSchedule':
+            if entry['gameState'] != lobby.get('gameState'):
+                print(f"Skipping {key}: lobby {lobby['lobbyCode']} already left {entry['gameState']}.")
+            else:
+                create_schedule(lobby['lobbyCode'], entry['gameState'], int(entry['deadline']))
+        elif entry_type == 'publishSnapshot':
+            if not snapshot_published: # The image is the latest state, once is enough
+                publish_snapshot(lobby, raise_errors=True) # Raises so the batch is retried
+                snapshot_published = True
+        else:
+            print(f"WARNING: Unknown outbox entry {key} for {lobby['lobbyCode']}: {entry}")
+        done.append(key)
+    return done
+
+def clear_entries(lobby_code, keys):
+    """Removes dispatched entries without touching the lobby version (clients see no change)."""
+    names = {f'#k{i}': key for i, key in enumerate(keys)}
+    try:
+        get_table(lobby_code).update_item(
+            Key={'lobbyCode': lobby_code},
+            UpdateExpression='REMOVE ' + ', '.join(f'outbox.{name}' for name in names),
+            ConditionExpression='attribute_exists(outbox)',
+            ExpressionAttributeNames=names
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Lobby {lobby_code} was deleted before its outbox was cleared.")
+
+def lambda_handler(event, context):
+    records = event.get('Records', [])
+    dispatched = 0
+    for record in records:
+        if record.get('eventName') not in ('INSERT', 'MODIFY'):
+            continue
+        lobby = deserialize_image(record['dynamodb'].get('NewImage'))
+        if not lobby.get('outbox'):
+            continue
+        done = dispatch_entries(lobby)
+        if done:
+            clear_entries(lobby['lobbyCode'], done)
+            dispatched += len(done)
+            print(f"Dispatched {len(done)} outbox entries for {lobby['lobbyCode']} (version {lobby.get('version')}).")
+
+    # Any exception above propagates so Lambda retries the batch; entries are idempotent
+    return {'statusCode': 200, 'body': json.dumps({'records': len(records), 'entriesDispatched': dispatched})}
@@ -0,0 +1,134 @@
+# Lambda function for GET /lobbies/{lobbyCode}/replay
+# Rebuilds a lobby's draft from the append-only event log (EVENTS_TABLE_NAME).
+# Optional query string parameter 'seq' returns the state as it was right after that event.
+
+import json
+from boto3.dynamodb.conditions import Key
+from lobby_common import decimal_to_int, events_table
+
+if events_table is None:
+    raise ValueError("Missing required environment variable EVENTS_TABLE_NAME.")
+
+def get_cors_headers():
+    return {
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET,OPTIONS'
+    }
+
+def load_events(lobby_code, up_to_seq=None):
+    """Returns the lobby's events in sequence order, optionally stopping at up_to_seq."""
+    key_condition = Key('lobbyCode').eq(lobby_code)
+    if up_to_seq is not None:
+        key_condition = key_condition & Key('seq').lte(up_to_seq)
+
+    events = []
+    query_kwargs = {'KeyConditionExpression': key_condition, 'ScanIndexForward': True}
+    while True:
+        response = events_table.query(**query_kwargs)
+        events.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return events
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def get_latest_seq(lobby_code):
+    response = events_table.query(
+        KeyConditionExpression=Key('lobbyCode').eq(lobby_code),
+        ScanIndexForward=False,
+        Limit=1,
+        ProjectionExpression='seq'
+    )
+    items = response.get('Items', [])
+    return int(items[0]['seq']) if items else None
+
+def new_lobby_state():
+    return {
+        'gameState': 'waiting',
+        'player1': '',
+        'player2': '',
+        'player1Ready': False,
+        'player2Ready': False,
+        'picks': [],
+        'bans': []
+    }
+
+def apply_event(state, event):
+    """Folds one event into the replayed lobby state (mirrors what each handler writes)."""
+    event_type = event.get('type')
+    player = event.get('player')
+
+    if event_type == 'create':
+        state = new_lobby_state()
+        state['player1'] = event.get('player1', '')
+        state['player2'] = event.get('player2', '')
+    elif event_type == 'join' and player:
+        state[player] = event.get('name', '')
+    elif event_type == 'leave' and player:
+        state[player] = ''
+        state['picks'] = []
+        state['bans'] = []
+    elif event_type == 'ready' and player:
+        state[f'{player}Ready'] = bool(event.get('ready'))
+    elif event_type == 'reset':
+        state['player1Ready'] = False
+        state['player2Ready'] = False
+        state['picks'] = []
+        state['bans'] = []
+    elif event_type in ('pick', 'ban', 'timeout'):
+        action = event.get('action', event_type)
+        value = event.get('value')
+        if value:
+            state['picks' if action == 'pick' else 'bans'].append(value)
+
+    if event.get('state'):
+        state['gameState'] = event['state']
+    return state
+
+def lambda_handler(event, context):
+    headers = get_cors_headers()
+
+    if event.get('httpMethod') == 'OPTIONS':
+        return {'statusCode': 200, 'headers': headers, 'body': ''}
+
+    try:
+        lobby_code = (event.get('pathParameters') or {}).get('lobbyCode')
+        if not lobby_code:
+            return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': 'Missing lobbyCode'})}
+
+        params = event.get('queryStringParameters') or {}
+        up_to_seq = None
+        if params.get('seq'):
+            try:
+                up_to_seq = int(params['seq'])
+            except ValueError:
+                return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': "'seq' must be an integer"})}
+
+        events = load_events(lobby_code, up_to_seq)
+        if not events:
+            return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'No draft events found for this lobby'})}
+
+        state = new_lobby_state()
+        for draft_event in events:
+            state = apply_event(state, draft_event)
+
+        latest_seq = int(events[-1]['seq']) if up_to_seq is None else get_latest_seq(lobby_code)
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'lobbyCode': lobby_code,
+                'seq': int(events[-1]['seq']),
+                'latestSeq': latest_seq,
+                'state': state,
+                'events': events
+            }, default=decimal_to_int)
+        }
+
+    except Exception as e:
+        print(f"Error in getDraftReplay: {e}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': 'Could not replay draft due to an internal error.'})
+        }
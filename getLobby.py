@@ -1,67 +1,229 @@
 import json
 import boto3
+import base64
+import gzip
 import os
 import time
-import datetime # Added for schedule creation
-from decimal import Decimal
+import threading
+from collections import OrderedDict
+from lobby_common import (
+    append_event, begin_idempotent_request, build_outbox, check_rate_limit, create_schedule,
+    deadline_shard, decimal_to_int, finish_idempotent_request, get_conflicting_item,
+    get_idempotency_key, get_table, get_turn_duration, LobbyVersionConflict, MAX_WRITE_ATTEMPTS,
+    public_lobby, publish_snapshot, TIMER_MODE, version_condition
+)
+
+try:
+    import brotli # Optional: add the 'brotli' package to the deployment to offer br encoding
+except ImportError:
+    brotli = None
 
 dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
-scheduler = boto3.client('scheduler') # Added for schedule creation
-handle_timeout_lambda_arn = os.environ.get('HANDLE_TIMEOUT_LAMBDA_ARN', '') # Added for schedule creation
-lambda_role_arn = os.environ.get('LAMBDA_EXECUTION_ROLE_ARN', '') # Added for schedule creation
-
-def decimal_to_int(obj):
-    """Convert Decimal objects to integers for JSON serialization."""
-    if isinstance(obj, Decimal):
-        return int(obj)
-    raise TypeError
-
-def create_schedule(lobby_code, game_state, start_time_ms, duration_ms):
-    """Creates the EventBridge schedule for the next timeout."""
-    schedule_name = f"timeout-{lobby_code}-{game_state}"
-    if not handle_timeout_lambda_arn or not lambda_role_arn:
-         print("ERROR: Lambda ARN or Role ARN environment variables not set. Cannot create schedule.")
-         return None
-
-    expiration_time_seconds = (start_time_ms + duration_ms) / 1000
-    schedule_trigger_time_seconds = expiration_time_seconds # 2 REMOVED + 2 buffer
-
-    schedule_dt_utc = datetime.datetime.fromtimestamp(schedule_trigger_time_seconds, tz=datetime.timezone.utc)
-    schedule_time_str = schedule_dt_utc.strftime('%Y-%m-%dT%H:%M:%S')
 
-    try:
-        payload = json.dumps({
-            'lobbyCode': lobby_code,
-            'expectedGameState': game_state # The state that just started
-        })
-        print(f"Attempting to create schedule: {schedule_name} at {schedule_time_str} targeting {handle_timeout_lambda_arn}")
-
-        response = scheduler.create_schedule(
-            Name=schedule_name,
-            GroupName='default', # Use default group or create one if needed
-            ActionAfterCompletion='DELETE',
-            FlexibleTimeWindow={'Mode': 'OFF'},
-            ScheduleExpression=f'at({schedule_time_str})',
-            State='ENABLED',
-            Target={
-                'Arn': handle_timeout_lambda_arn, # ARN of handleTimeout Lambda
-                'RoleArn': lambda_role_arn,      # Execution role ARN passed to scheduler
-                'Input': payload
-            }
-        )
-        print(f"Successfully created schedule: {schedule_name} for time {schedule_time_str}")
-        return schedule_name
-    except scheduler.exceptions.ConflictException:
-         print(f"Schedule {schedule_name} already exists. Assuming it's okay.")
-         return schedule_name
-    except Exception as e:
-        print(f"ERROR creating schedule {schedule_name}: {str(e)}")
-        return None
+# --- Response Encoding (negotiated compression and an opt-in compact wire format) ---
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'false').lower() == 'true' # Needs binary media types on the API
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '200')) # Below this, gzip framing and the extra header eat the saving
+COMPACT_FORMAT_VERSION = 1
+
+def negotiate_encoding(event):
+    """Picks 'br', 'gzip' or 'identity' from the Accept-Encoding header (q=0 means refused)."""
+    if not COMPRESS_RESPONSES:
+        return 'identity'
+    accept_encoding = ''
+    for header_name, value in (event.get('headers') or {}).items():
+        if header_name.lower() == 'accept-encoding':
+            accept_encoding = value or ''
+    accepted = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return 'identity'
+
+def encode_compact(item):
+    """
+    Positional lobby state for clients that ask for ?format=compact (decoded by script.js):
+    [format version, lobbyCode, version, gameState, player1, player2, ready bits (1 = player1, 2 = player2),
+     picks, bans, [startTime, duration, deadline, isActive], organizerName, eventId]
+    """
+    timer_state = item.get('timerState') or {}
+    return json.dumps([
+        COMPACT_FORMAT_VERSION,
+        item.get('lobbyCode'),
+        item.get('version', 0),
+        item.get('gameState'),
+        item.get('player1', ''),
+        item.get('player2', ''),
+        (1 if item.get('player1Ready') else 0) | (2 if item.get('player2Ready') else 0),
+        item.get('picks', []),
+        item.get('bans', []),
+        [timer_state.get('startTime'), timer_state.get('duration'), timer_state.get('deadline'), 1 if timer_state.get('isActive') else 0],
+        item.get('organizerName', ''),
+        item.get('eventId')
+    ], default=decimal_to_int, separators=(',', ':'))
+
+def encode_lobby(item, wire_format):
+    if wire_format == 'compact':
+        return encode_compact(item)
+    return json.dumps(public_lobby(item), default=decimal_to_int, separators=(',', ':'))
+
+def compress_body(text, content_encoding):
+    """Returns the compressed body as base64 text, as API Gateway expects for binary responses."""
+    raw = text.encode('utf-8')
+    if content_encoding == 'br':
+        compressed = brotli.compress(raw, quality=5) # Close to gzip's speed, smaller output
+    else:
+        compressed = gzip.compress(raw, compresslevel=6)
+    return base64.b64encode(compressed).decode('ascii')
+
+# --- Encoded Response Cache (per container; bodies keyed by (lobbyCode, version) and representation) ---
+LOBBY_CACHE_MAX_BYTES = int(os.environ.get('LOBBY_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+LOBBY_CACHE_FRESH_MS = int(os.environ.get('LOBBY_CACHE_FRESH_MS', '1000')) # 0 = always read the store
+LOBBY_CACHE_METRICS_SECONDS = int(os.environ.get('LOBBY_CACHE_METRICS_SECONDS', '60'))
+
+class LobbyResponseCache:
+    """
+    Byte-bounded LRU of lobby versions and their encoded GET bodies. Each representation (JSON or
+    compact, compressed or not) of a version is built at most once and reused for as long as the
+    version is current; a lobby confirmed at a version within the last LOBBY_CACHE_FRESH_MS is served
+    without a store read at all, unless the client has already seen a newer version.
+    """
+    def __init__(self, max_bytes, fresh_ms):
+        self.max_bytes = max_bytes
+        self.fresh_ms = fresh_ms
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # (lobbyCode, version) -> {'item', 'size', 'bodies'}, least recently used first
+        self.latest = {}             # lobbyCode -> (newest version seen, when it was confirmed in ms)
+        self.size_bytes = 0
+        self.counters = {'Hits': 0, 'StoreReads': 0, 'Encodes': 0, 'Compressions': 0, 'Evictions': 0}
+        self.metrics_emitted_at = time.time()
+
+    def store(self, item):
+        """Caches this item's version. Returns (entry, was_already_cached)."""
+        key = (item['lobbyCode'], int(item.get('version', 0)))
+        now_ms = int(time.time() * 1000)
+        with self.lock:
+            entry = self.entries.get(key)
+            reused = entry is not None
+            if reused:
+                self.entries.move_to_end(key)
+            else:
+                entry = self.entries[key] = {'item': item, 'size': 0, 'bodies': {}}
+            latest_version, _ = self.latest.get(key[0], (-1, 0))
+            if key[1] >= latest_version:
+                self.latest[key[0]] = (key[1], now_ms)
+        return entry, reused
+
+    def render(self, entry, wire_format, content_encoding):
+        """Returns (body, Content-Encoding or None, is_base64) for the entry, encoding at most once per representation."""
+        variant = (wire_format, content_encoding)
+        with self.lock:
+            rendered = entry['bodies'].get(variant) or entry['bodies'].get((wire_format, 'identity'))
+        if rendered is not None and (rendered[1] or content_encoding == 'identity' or len(rendered[0]) < COMPRESSION_MIN_BYTES):
+            return rendered
+
+        if rendered is None: # Encoded outside the lock
+            rendered = (encode_lobby(entry['item'], wire_format), None, False)
+            self.add_body(entry, (wire_format, 'identity'), rendered, 'Encodes')
+        if content_encoding != 'identity' and len(rendered[0]) >= COMPRESSION_MIN_BYTES:
+            rendered = (compress_body(rendered[0], content_encoding), content_encoding, True)
+            self.add_body(entry, variant, rendered, 'Compressions')
+        return rendered
+
+    def add_body(self, entry, variant, rendered, counter):
+        with self.lock:
+            self.counters[counter] += 1
+            if variant in entry['bodies']:
+                return # Another thread encoded it first
+            entry['bodies'][variant] = rendered
+            entry['size'] += len(rendered[0])
+            if self.entries.get((entry['item']['lobbyCode'], int(entry['item'].get('version', 0)))) is entry:
+                self.size_bytes += len(rendered[0])
+                self.evict_locked()
+
+    def evict_locked(self):
+        while self.size_bytes > self.max_bytes and self.entries:
+            (lobby_code, version), entry = self.entries.popitem(last=False)
+            self.size_bytes -= entry['size']
+            self.counters['Evictions'] += 1
+            if self.latest.get(lobby_code, (None,))[0] == version:
+                del self.latest[lobby_code]
+
+    def fresh_entry(self, lobby_code, known_version):
+        """The newest cached entry if it was confirmed recently and is not older than what the client has seen."""
+        if self.fresh_ms <= 0:
+            return None
+        with self.lock:
+            version, confirmed_at = self.latest.get(lobby_code, (None, 0))
+            if version is None or version < known_version or int(time.time() * 1000) - confirmed_at > self.fresh_ms:
+                return None
+            entry = self.entries.get((lobby_code, version))
+            if entry is not None:
+                self.entries.move_to_end((lobby_code, version))
+                self.counters['Hits'] += 1
+            return entry
+
+    def get(self, lobby_code, known_version, load_item):
+        """Returns (entry or None if the lobby does not exist, X-Cache value)."""
+        # fresh_entry skips a cached version older than known_version, so such a client reads the store
+        entry = self.fresh_entry(lobby_code, known_version)
+        if entry is not None:
+            return entry, 'HIT'
+
+        item = load_item(lobby_code, known_version)
+        with self.lock:
+            self.counters['StoreReads'] += 1
+        if not item:
+            return None, 'MISS'
+        entry, reused = self.store(item)
+        return entry, 'STORE' if reused else 'MISS'
+
+    def emit_metrics(self, force=False):
+        """Prints counters in CloudWatch Embedded Metric Format every LOBBY_CACHE_METRICS_SECONDS."""
+        now = time.time()
+        if not force and now - self.metrics_emitted_at < LOBBY_CACHE_METRICS_SECONDS:
+            return
+        with self.lock:
+            counters, self.counters = self.counters, dict.fromkeys(self.counters, 0)
+            gauges = {'Entries': len(self.entries), 'SizeBytes': self.size_bytes}
+            self.metrics_emitted_at = now
+        requests = counters['Hits'] + counters['StoreReads']
+        gauges['HitRate'] = round(counters['Hits'] / requests, 4) if requests else 0.0
+        metric_names = list(counters) + list(gauges)
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': int(now * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': 'PickBan/LobbyCache',
+                    'Dimensions': [[]],
+                    'Metrics': [{'Name': name, 'Unit': 'Bytes' if name == 'SizeBytes' else 'None' if name == 'HitRate' else 'Count'} for name in metric_names]
+                }]
+            },
+            **counters,
+            **gauges
+        }))
+
+lobby_cache = LobbyResponseCache(LOBBY_CACHE_MAX_BYTES, LOBBY_CACHE_FRESH_MS)
+
+def load_lobby(lobby_code, known_version):
+    """
+    Eventually consistent read (half the read cost). If the client has already seen a newer version
+    than this replica returned (e.g. from its own action's response), or the lobby is missing (it may
+    have just been created), read again strongly.
+    """
+    item = get_table(lobby_code).get_item(Key={'lobbyCode': lobby_code}, ConsistentRead=False).get('Item')
+    if not item or int(item.get('version', 0)) < known_version:
+        print(f"DEBUG (GET): Lobby missing or older than known version {known_version}, using a strongly consistent read.")
+        item = get_table(lobby_code).get_item(Key={'lobbyCode': lobby_code}, ConsistentRead=True).get('Item')
+    return item
 
 def lambda_handler(event, context):
     headers = {
-        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,Idempotency-Key,X-Client-Id',
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
     }
@@ -72,6 +234,33 @@ def lambda_handler(event, context):
             'headers': headers
         }
 
+    limited_response = check_rate_limit(event, headers, 'action' if event['httpMethod'] == 'POST' else 'poll')
+    if limited_response:
+        return limited_response
+
+    if event['httpMethod'] == 'POST':
+        # A retried or double-clicked ready action replays the first result instead of acting twice
+        record_key = get_idempotency_key(event, 'ready')
+        duplicate_response = begin_idempotent_request(record_key, headers)
+        if duplicate_response:
+            return duplicate_response
+        return finish_idempotent_request(record_key, process_request_with_retries(event, headers))
+    return process_request(event, headers)
+
+def process_request_with_retries(event, headers):
+    """Runs a POST; on a version conflict it is re-evaluated against the lobby returned by the failed write."""
+    current_item = None
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        try:
+            return process_request(event, headers, current_item)
+        except LobbyVersionConflict as conflict:
+            if conflict.current_item is None:
+                return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'Lobby not found'})}
+            current_item = conflict.current_item
+            print(f"Version conflict on ready (attempt {attempt + 1}), re-evaluating against version {current_item.get('version')}.")
+    return {'statusCode': 409, 'headers': headers, 'body': json.dumps({'error': 'Lobby is changing too quickly, please try again'})}
+
+def process_request(event, headers, current_item=None):
     try:
         lobby_code = event['pathParameters']['lobbyCode']
         print(f"Processing request for lobby: {lobby_code}, method: {event['httpMethod']}")
@@ -88,17 +277,19 @@ def lambda_handler(event, context):
             print(f"Action: {action}, Player: {player}, Ready: {ready}")
 
             if action == 'ready':
-                # Get current lobby state first to determine roles
-                response = table.get_item(Key={'lobbyCode': lobby_code})
-                if 'Item' not in response:
-                    print(f"Lobby not found: {lobby_code}")
-                    return {
-                        'statusCode': 404,
-                        'headers': headers,
-                        'body': json.dumps({'error': 'Lobby not found'})
-                    }
-
-                item = response['Item']
+                # Get current lobby state first to determine roles (a retry after a conflict already has it)
+                if current_item is not None:
+                    item = current_item
+                else:
+                    response = get_table(lobby_code).get_item(Key={'lobbyCode': lobby_code})
+                    if 'Item' not in response:
+                        print(f"Lobby not found: {lobby_code}")
+                        return {
+                            'statusCode': 404,
+                            'headers': headers,
+                            'body': json.dumps({'error': 'Lobby not found'})
+                        }
+                    item = response['Item']
                 print(f"Current lobby state: {item}")
                 
                 # Handle organizer_player special case
@@ -162,66 +353,72 @@ def lambda_handler(event, context):
                 
                 # Update ready status for the player
                 player_ready_key = f"{actual_player}Ready"
+                other_player = 'player2' if actual_player == 'player1' else 'player1'
                 print(f"Setting {player_ready_key} to {ready}")
-                
-                # Update the ready status
-                update_response = table.update_item(
-                    Key={'lobbyCode': lobby_code},
-                    UpdateExpression=f'SET {player_ready_key} = :ready',
-                    ExpressionAttributeValues={':ready': ready},
-                    ReturnValues='ALL_NEW'
-                )
-                
+
+                # If the other player is already ready (in the version read above), this same write also
+                # starts the draft. The version condition means only one of two simultaneous readies can
+                # commit against that version; the loser retries on the newer lobby and sees the game started.
+                starts_game = bool(ready) and item.get('gameState') == 'ready_check' and bool(item.get(f'{other_player}Ready'))
+                update_expression = f'SET {player_ready_key} = :ready'
+                condition_expression, condition_values = version_condition(item)
+                expression_values = {':ready': ready, ':one': 1, **condition_values}
+                current_time = int(time.time() * 1000)
+                initial_duration = get_turn_duration(item, 'ban1_p1')
+                turn_deadline = current_time + initial_duration
+                if starts_game:
+                    print("Both players ready, starting the draft at ban1_p1 in the same write")
+                    update_expression += ', gameState = :state, timerState = :timer, turnDeadline = :deadline, deadlineShard = :shard'
+                    expression_values[':state'] = 'ban1_p1'
+                    expression_values[':deadline'] = turn_deadline
+                    expression_values[':shard'] = deadline_shard(lobby_code)
+                    expression_values[':timer'] = {
+                        'startTime': current_time,
+                        'duration': initial_duration,
+                        'deadline': turn_deadline,
+                        'isActive': True
+                    }
+                if TIMER_MODE == 'outbox': # Snapshot (and the first schedule) commit with the ready write
+                    outbox_entries = [{'type': 'publishSnapshot'}]
+                    if starts_game:
+                        outbox_entries.append({'type': 'createSchedule', 'gameState': 'ban1_p1', 'deadline': turn_deadline})
+                    update_expression += ', outbox = :outbox'
+                    expression_values[':outbox'] = build_outbox(item, outbox_entries)
+
+                try:
+                    update_response = get_table(lobby_code).update_item(
+                        Key={'lobbyCode': lobby_code},
+                        UpdateExpression=update_expression + ' ADD version :one',
+                        ConditionExpression=condition_expression,
+                        ExpressionAttributeValues=expression_values,
+                        ReturnValues='ALL_NEW',
+                        ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                    )
+                except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+                    raise LobbyVersionConflict(get_conflicting_item(e))
+
                 updated_item = update_response.get('Attributes', {})
                 print(f"Updated lobby state: {updated_item}")
-                
-                # Check if both players are ready
+                lobby_cache.store(updated_item) # The next poll in this container needs no store read
+                append_event(updated_item, 'ready', player=actual_player, ready=ready, started=True if starts_game else None)
+
                 player1_ready = updated_item.get('player1Ready', False)
                 player2_ready = updated_item.get('player2Ready', False)
-                print(f"Ready status check:")
-                print(f"  Player1 ready: {player1_ready}")
-                print(f"  Player2 ready: {player2_ready}")
-                
-                if ready and player1_ready and player2_ready:
-                    # Both players are ready, start the game
-                    print("Both players ready, updating game state to ban1_p1")
-                    current_time = int(time.time() * 1000)
-                    initial_duration = 30000  # 30 seconds
-                    try:
-                        table.update_item(
-                            Key={'lobbyCode': lobby_code},
-                            UpdateExpression='SET gameState = :state, timerState = :timer',
-                            ExpressionAttributeValues={
-                                ':state': 'ban1_p1',
-                                ':timer': {
-                                    'startTime': current_time,
-                                    'duration': initial_duration,
-                                    'isActive': True
-                                }
-                            }
-                        )
-                        print(f"Lobby {lobby_code} state updated to ban1_p1.")
+                print(f"Ready status check: Player1 ready: {player1_ready}, Player2 ready: {player2_ready}")
 
-                        # --- Schedule Creation Call ---
-                        start_time_int = int(current_time)  # Convert to int
-                        duration_int = int(initial_duration)  # Convert to int
-                        create_schedule(lobby_code, 'ban1_p1', start_time_int, duration_int)
-                        # --- End Schedule Creation Call ---
+                # --- Schedule Creation Call (only the request whose write started the game) ---
+                if starts_game and TIMER_MODE == 'scheduler':
+                    create_schedule(lobby_code, 'ban1_p1', turn_deadline)
+
+                if TIMER_MODE != 'outbox':
+                    publish_snapshot(updated_item)
 
-                    except Exception as update_error:
-                        print(f"ERROR updating lobby to start game: {update_error}")
-                        return {
-                            'statusCode': 500,
-                            'headers': headers,
-                            'body': json.dumps({'error': f'Failed to start game: {str(update_error)}'})
-                        }
-                
                 return {
                     'statusCode': 200,
                     'headers': headers,
                     'body': json.dumps({
                         'message': 'Ready status updated',
-                        'lobbyState': updated_item,
+                        'lobbyState': public_lobby(updated_item),
                         'debug': {
                             'actualPlayer': actual_player,
                             'originalRole': player,
@@ -239,84 +436,43 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': f'Invalid action: {action}'})
             }
 
-        # Handle GET request (fetch lobby state)
+        # Handle GET request (fetch lobby state). Strictly read-only: state transitions happen in the
+        # handlers that cause them, and lobbies are created with every attribute already present.
         try:
-            response = table.get_item(Key={'lobbyCode': lobby_code})
-            if 'Item' not in response:
+            params = event.get('queryStringParameters') or {}
+            try:
+                known_version = int(params.get('knownVersion', 0))
+            except ValueError:
+                known_version = 0
+
+            # Repeated polls of an unchanged lobby reuse the already-encoded body (see LobbyResponseCache)
+            entry, cache_status = lobby_cache.get(lobby_code, known_version, load_lobby)
+            lobby_cache.emit_metrics()
+
+            if entry is None:
                 return {
                     'statusCode': 404,
                     'headers': headers,
                     'body': json.dumps({'error': 'Lobby not found'})
                 }
 
-            item = response['Item']
-            print(f"Current lobby state for GET: {item}")
-
-            # Use strip() to handle potential whitespace in names stored in DB
-            player1_present = item.get('player1') and item.get('player1', '').strip() != ''
-            player2_present = item.get('player2') and item.get('player2', '').strip() != ''
-            current_state = item.get('gameState')
-
-            print(f"DEBUG (GET): Checking state transition conditions: P1 Present={player1_present}, P2 Present={player2_present}, State='{current_state}'")
-
-            # Check if state needs transition from 'waiting' to 'ready_check'
-            if player1_present and player2_present and current_state == 'waiting':
-                print("DEBUG (GET): Conditions met! Both players present and state is 'waiting'. Attempting state update to 'ready_check'.")
-                try:
-                    update_response = table.update_item(
-                        Key={'lobbyCode': lobby_code},
-                        UpdateExpression='SET gameState = :state',
-                        # Ensure we only update if the state is *still* 'waiting'
-                        ConditionExpression='gameState = :currentState',
-                        ExpressionAttributeValues={
-                            ':state': 'ready_check',
-                            ':currentState': 'waiting'
-                        },
-                        ReturnValues="ALL_NEW"  # Get the updated item directly
-                    )
-                    # Use the updated item from the response for the rest of the GET logic
-                    item = update_response.get('Attributes', item)
-                    print(f"DEBUG (GET): State successfully updated to 'ready_check'. New item state: {item}")
-                except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
-                    # This means the state was *not* 'waiting' when the update was attempted
-                    print("DEBUG (GET): ConditionalCheckFailed - State was not 'waiting' during update attempt. No action needed.")
-                except Exception as update_error:
-                    print(f"ERROR (GET): Failed to update gameState to ready_check: {update_error}. Returning current state.")
-
-            # Initialize picks and bans if they don't exist
-            if 'picks' not in item:
-                item['picks'] = []
-            if 'bans' not in item:
-                item['bans'] = []
-
-            # Initialize ready states if they don't exist
-            if 'player1Ready' not in item:
-                item['player1Ready'] = False
-            if 'player2Ready' not in item:
-                item['player2Ready'] = False
-
-            # Initialize timer state if it doesn't exist
-            if 'timerState' not in item:
-                item['timerState'] = {
-                    'startTime': None,
-                    'duration': None,
-                    'isActive': False
-                }
-
-            # Ensure player slots exist
-            if 'player1' not in item:
-                item['player1'] = ''
-            if 'player2' not in item:
-                item['player2'] = ''
-
-            # Ensure gameState exists
-            if 'gameState' not in item:
-                item['gameState'] = 'waiting'
-
+            wire_format = 'compact' if params.get('format') == 'compact' else 'json'
+            body, content_encoding, is_base64 = lobby_cache.render(entry, wire_format, negotiate_encoding(event))
+            response_headers = {
+                **headers,
+                'Content-Type': 'application/json',
+                'Vary': 'Accept-Encoding',
+                'X-Cache': cache_status,
+                'X-Server-Time': str(int(time.time() * 1000)), # Lets clients align countdowns with server deadlines
+                'Access-Control-Expose-Headers': 'X-Cache,X-Server-Time'
+            }
+            if content_encoding:
+                response_headers['Content-Encoding'] = content_encoding
             return {
                 'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps(item, default=decimal_to_int)
+                'headers': response_headers,
+                'body': body,
+                'isBase64Encoded': is_base64
             }
 
         except Exception as e:
@@ -327,6 +483,8 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': str(e)})
             }
 
+    except LobbyVersionConflict:
+        raise # Handled by process_request_with_retries
     except Exception as e:
         print(f"Error: {str(e)}")
         return {
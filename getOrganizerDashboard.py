@@ -0,0 +1,211 @@
+# Lambda function for GET /organizers/{organizerName}/lobbies
+# Returns compact summaries of all lobbies run by one organizer in a single request,
+# so an organizer dashboard can replace one getLobby poll per open match.
+# INSECURE VERSION: Trusts the organizer name in the path (same trust model as the other handlers).
+
+import json
+import boto3
+import os
+import base64
+from boto3.dynamodb.conditions import Key, Attr
+from lobby_common import decimal_to_int, get_table_name, lobby_table_names
+
+dynamodb = boto3.resource('dynamodb')
+# Lobby shards (SHARD_MAP, see lobby_common.py): the dashboard reads TABLE_NAME and every shard table
+lobby_tables = {name: dynamodb.Table(name) for name in lobby_table_names()}
+# GSI with partition key organizerName (S) and sort key createdAt (N)
+organizer_index_name = os.environ.get('ORGANIZER_INDEX_NAME', 'organizerName-createdAt-index')
+# GSI with partition key eventId (S) and sort key createdAt (N). Sparse: only bulk-created lobbies have eventId.
+event_index_name = os.environ.get('EVENT_INDEX_NAME', 'eventId-createdAt-index')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+MAX_BATCH_GET_KEYS = 100 # DynamoDB BatchGetItem limit
+
+# Only the attributes a dashboard needs. organizerName is required for the ownership check.
+SUMMARY_ATTRIBUTES = [
+    'lobbyCode', 'organizerName', 'eventId', 'createdAt', 'version', 'gameState',
+    'player1', 'player2', 'player1Ready', 'player2Ready', 'picks', 'bans', 'timerState'
+]
+
+def get_cors_headers():
+    return {
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET,OPTIONS'
+    }
+
+def get_projection():
+    """Builds a ProjectionExpression (with placeholders) for SUMMARY_ATTRIBUTES."""
+    names = {f'#a{i}': attribute for i, attribute in enumerate(SUMMARY_ATTRIBUTES)}
+    return ', '.join(names.keys()), names
+
+def encode_token(position):
+    if not position:
+        return None
+    raw = json.dumps(position, default=decimal_to_int).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_token(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid 'nextToken'.")
+
+def parse_known_versions(raw):
+    """Parses 'code1:3,code2:7' into {'code1': 3, 'code2': 7}."""
+    known = {}
+    if not raw:
+        return known
+    for entry in raw.split(','):
+        code, _, version = entry.strip().rpartition(':')
+        if not code:
+            continue
+        try:
+            known[code] = int(version)
+        except ValueError:
+            raise ValueError(f"Invalid version in 'knownVersions' entry: {entry}")
+    return known
+
+def summarize(item):
+    """Returns the compact dashboard summary for one lobby item."""
+    summary = {attribute: item[attribute] for attribute in SUMMARY_ATTRIBUTES if attribute in item}
+    summary.pop('organizerName', None)
+    return summary
+
+def query_lobbies(lobby_table_name, organizer_name, event_id, limit, start_key):
+    """Runs one Query against the organizer (or event) index of one lobby table. Returns (items, last_evaluated_key)."""
+    projection, names = get_projection()
+    query_kwargs = {
+        'ProjectionExpression': projection,
+        'ExpressionAttributeNames': names,
+        'Limit': limit,
+        'ScanIndexForward': False # Newest lobbies first
+    }
+    if start_key:
+        query_kwargs['ExclusiveStartKey'] = start_key
+
+    if event_id:
+        query_kwargs['IndexName'] = event_index_name
+        query_kwargs['KeyConditionExpression'] = Key('eventId').eq(event_id)
+        # Never expose another organizer's lobbies that happen to share an event id
+        query_kwargs['FilterExpression'] = Attr('organizerName').eq(organizer_name)
+    else:
+        query_kwargs['IndexName'] = organizer_index_name
+        query_kwargs['KeyConditionExpression'] = Key('organizerName').eq(organizer_name)
+
+    response = lobby_tables[lobby_table_name].query(**query_kwargs)
+    return response.get('Items', []), response.get('LastEvaluatedKey')
+
+def query_all_tables(organizer_name, event_id, limit, position):
+    """
+    Fills one page from the lobby tables in turn, newest first within each table. A table is only left
+    once it is exhausted; position is {'table': index, 'key': LastEvaluatedKey}. Returns (items, next position).
+    """
+    table_names = list(lobby_tables)
+    table_index, start_key = position.get('table', 0), position.get('key')
+    items = []
+    while table_index < len(table_names):
+        page, last_key = query_lobbies(table_names[table_index], organizer_name, event_id, limit - len(items), start_key)
+        items.extend(page)
+        if last_key:
+            return items, {'table': table_index, 'key': last_key}
+        table_index, start_key = table_index + 1, None
+        if len(items) >= limit:
+            break
+    if table_index >= len(table_names):
+        return items, None
+    return items, {'table': table_index, 'key': None}
+
+def batch_get_lobbies(organizer_name, lobby_codes):
+    """Fetches specific lobbies with one BatchGetItem across their shard tables (retrying unprocessed keys)."""
+    projection, names = get_projection()
+    request = {}
+    for code in lobby_codes:
+        code_table_name = get_table_name(code)
+        request.setdefault(code_table_name, {
+            'Keys': [],
+            'ProjectionExpression': projection,
+            'ExpressionAttributeNames': names
+        })['Keys'].append({'lobbyCode': code})
+    items = []
+    for _ in range(3):
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for table_items in response.get('Responses', {}).values():
+            items.extend(table_items)
+        request = response.get('UnprocessedKeys') or {}
+        if not request:
+            break
+    return [item for item in items if item.get('organizerName') == organizer_name]
+
+def lambda_handler(event, context):
+    headers = get_cors_headers()
+
+    if event.get('httpMethod') == 'OPTIONS':
+        return {'statusCode': 200, 'headers': headers, 'body': ''}
+
+    try:
+        # --- Step 1: Parse Request ---
+        organizer_name = ((event.get('pathParameters') or {}).get('organizerName') or '').strip()
+        if not organizer_name:
+            raise ValueError("Missing 'organizerName' in path parameters.")
+
+        params = event.get('queryStringParameters') or {}
+        event_id = (params.get('eventId') or '').strip()
+        known_versions = parse_known_versions(params.get('knownVersions'))
+        lobby_codes = [code.strip() for code in (params.get('lobbyCodes') or '').split(',') if code.strip()]
+
+        try:
+            limit = int(params.get('limit') or DEFAULT_PAGE_SIZE)
+        except ValueError:
+            raise ValueError("'limit' must be an integer.")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        position = decode_token(params['nextToken']) if params.get('nextToken') else {}
+        if position and 'table' not in position:
+            position = {'table': 0, 'key': position} # Token issued before sharding: a key of TABLE_NAME
+
+        # --- Step 2: Fetch Summaries (one Query per lobby table, or one BatchGetItem for explicit codes) ---
+        next_token = None
+        if lobby_codes:
+            if len(lobby_codes) > MAX_BATCH_GET_KEYS:
+                raise ValueError(f"Cannot request more than {MAX_BATCH_GET_KEYS} lobbyCodes at once.")
+            items = batch_get_lobbies(organizer_name, list(dict.fromkeys(lobby_codes)))
+        else:
+            items, next_position = query_all_tables(organizer_name, event_id, limit, position)
+            next_token = encode_token(next_position)
+
+        # --- Step 3: Drop Lobbies the Client Already Has ---
+        changed = []
+        unchanged = []
+        for item in items:
+            code = item['lobbyCode']
+            if code in known_versions and int(item.get('version', 0)) <= known_versions[code]:
+                unchanged.append(code)
+            else:
+                changed.append(summarize(item))
+
+        print(f"Dashboard for {organizer_name}: {len(changed)} changed, {len(unchanged)} unchanged, more={bool(next_token)}")
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'organizerName': organizer_name,
+                'eventId': event_id or None,
+                'lobbies': changed,
+                'unchanged': unchanged,
+                'nextToken': next_token
+            }, default=decimal_to_int)
+        }
+
+    except ValueError as ve:
+        print(ve)
+        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': str(ve)})}
+    except Exception as e:
+        print(f"Error in getOrganizerDashboard: {e}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': 'Could not load organizer dashboard due to an internal error.'})
+        }
@@ -0,0 +1,86 @@
+# Lambda function for GET /lobbies/{lobbyCode}/spectate
+# Read-only, CDN-cacheable snapshot of a lobby for spectators (e.g. streamed drafts).
+# Unlike getLobby.py, this never writes, never returns organizer details, and tells
+# CloudFront it may serve the response for ~1s, so any number of spectators cost at
+# most about one origin request per lobby per second.
+
+import json
+import os
+from lobby_common import decimal_to_int, get_table
+
+SNAPSHOT_MAX_AGE_SECONDS = int(os.environ.get('SNAPSHOT_MAX_AGE_SECONDS', '1'))
+SNAPSHOT_STALE_SECONDS = int(os.environ.get('SNAPSHOT_STALE_SECONDS', '5'))
+NOT_FOUND_MAX_AGE_SECONDS = 5 # Unknown codes are cached a little longer to absorb typo storms
+
+# Public lobby fields only (no organizerName, ttl, createdAt)
+SPECTATOR_ATTRIBUTES = [
+    'lobbyCode', 'eventId', 'version', 'gameState', 'player1', 'player2',
+    'player1Ready', 'player2Ready', 'picks', 'bans', 'timerState'
+]
+
+def get_headers(max_age, stale_seconds=0):
+    cache_control = f'public, max-age={max_age}, s-maxage={max_age}' if max_age else 'no-store'
+    if max_age and stale_seconds:
+        cache_control += f', stale-while-revalidate={stale_seconds}'
+    return {
+        'Access-Control-Allow-Headers': 'Content-Type,If-None-Match',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET,OPTIONS',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': cache_control,
+        'Content-Type': 'application/json'
+    }
+
+def get_request_header(event, name):
+    """Case-insensitive header lookup (API Gateway preserves the client's casing)."""
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def lambda_handler(event, context):
+    if event.get('httpMethod') == 'OPTIONS':
+        return {'statusCode': 200, 'headers': get_headers(0), 'body': ''}
+
+    try:
+        lobby_code = (event.get('pathParameters') or {}).get('lobbyCode')
+        if not lobby_code:
+            return {'statusCode': 400, 'headers': get_headers(0), 'body': json.dumps({'error': 'Missing lobbyCode'})}
+
+        # Eventually consistent read: spectators already accept ~1s of staleness from the CDN
+        projection_names = {f'#a{i}': attribute for i, attribute in enumerate(SPECTATOR_ATTRIBUTES)}
+        response = get_table(lobby_code).get_item(
+            Key={'lobbyCode': lobby_code},
+            ProjectionExpression=', '.join(projection_names.keys()),
+            ExpressionAttributeNames=projection_names,
+            ConsistentRead=False
+        )
+        item = response.get('Item')
+        if not item:
+            return {
+                'statusCode': 404,
+                'headers': get_headers(NOT_FOUND_MAX_AGE_SECONDS),
+                'body': json.dumps({'error': 'Lobby not found'})
+            }
+
+        headers = get_headers(SNAPSHOT_MAX_AGE_SECONDS, SNAPSHOT_STALE_SECONDS)
+        etag = f'"{lobby_code}-{int(item.get("version", 0))}"'
+        headers['ETag'] = etag
+
+        # Revalidation from CloudFront or the browser: nothing changed, send no body
+        if get_request_header(event, 'If-None-Match') == etag:
+            return {'statusCode': 304, 'headers': headers, 'body': ''}
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps(item, default=decimal_to_int, separators=(',', ':'))
+        }
+
+    except Exception as e:
+        print(f"Error in getSpectatorSnapshot: {e}")
+        return {
+            'statusCode': 500,
+            'headers': get_headers(0),
+            'body': json.dumps({'error': 'Could not load lobby snapshot.'})
+        }
@@ -0,0 +1,110 @@
+# Lambda function for GET /stats
+# Serves "most banned" and "pick rate by element" statistics from the counters kept by
+# aggregateStats.py (or rebuilt by recomputeStats.py). One Query per cache period, never a table scan.
+
+import json
+import os
+import time
+from boto3.dynamodb.conditions import Key
+from lobby_common import decimal_to_int, dynamodb, s3
+
+stats_table = dynamodb.Table(os.environ['STATS_TABLE_NAME'])
+s3_bucket_name = os.environ.get('S3_BUCKET_NAME', 'pick-ban-test-2023-10-27') # Bucket for resonators.json
+s3_file_key = os.environ.get('S3_FILE_KEY', 'resonators.json')
+STATS_CACHE_SECONDS = int(os.environ.get('STATS_CACHE_SECONDS', '60'))
+
+# --- Load Resonator Data from S3 (names and elements) ---
+resonators_data = []
+try:
+    response = s3.get_object(Bucket=s3_bucket_name, Key=s3_file_key)
+    resonators_data = json.loads(response['Body'].read().decode('utf-8'))
+    print(f"Loaded {len(resonators_data)} resonators from S3.")
+except Exception as e:
+    print(f"ERROR fetching or parsing resonators.json from S3: {str(e)}")
+
+# Per-container cache of the computed response body
+cached_body = None
+cached_at = 0
+
+def get_headers():
+    return {
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET,OPTIONS',
+        'Cache-Control': f'public, max-age={STATS_CACHE_SECONDS}, s-maxage={STATS_CACHE_SECONDS}',
+        'Content-Type': 'application/json'
+    }
+
+def load_counters():
+    """Reads every global counter item with one (paginated) Query."""
+    items = []
+    query_kwargs = {'KeyConditionExpression': Key('scope').eq('global')}
+    while True:
+        response = stats_table.query(**query_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def build_stats(counter_items):
+    """Turns raw counters into per-resonator and per-element rates."""
+    totals = {'drafts': 0, 'picks': 0, 'bans': 0}
+    per_resonator = {}
+    for item in counter_items:
+        if item['statKey'] == 'totals':
+            totals = {name: int(item.get(name, 0)) for name in totals}
+        elif item['statKey'].startswith('resonator#'):
+            per_resonator[item['statKey'][len('resonator#'):]] = (int(item.get('picks', 0)), int(item.get('bans', 0)))
+
+    drafts = totals['drafts']
+    resonators = []
+    element_picks = {}
+    element_bans = {}
+    for resonator in resonators_data:
+        picks, bans = per_resonator.get(resonator['id'], (0, 0))
+        resonators.append({
+            'id': resonator['id'],
+            'name': resonator['name'],
+            'picks': picks,
+            'bans': bans,
+            'pickRate': round(picks / drafts, 4) if drafts else 0.0, # Share of drafts it was picked in
+            'banRate': round(bans / drafts, 4) if drafts else 0.0
+        })
+        for element in resonator.get('element', []):
+            element_picks[element] = element_picks.get(element, 0) + picks
+            element_bans[element] = element_bans.get(element, 0) + bans
+
+    resonators.sort(key=lambda r: (-r['bans'], -r['picks'], r['name'])) # Most banned first
+    elements = [
+        {
+            'element': element,
+            'picks': element_picks[element],
+            'bans': element_bans[element],
+            'pickRate': round(element_picks[element] / totals['picks'], 4) if totals['picks'] else 0.0 # Share of all picks
+        }
+        for element in sorted(element_picks)
+    ]
+    return {'totals': totals, 'resonators': resonators, 'elements': elements}
+
+def lambda_handler(event, context):
+    global cached_body, cached_at
+    headers = get_headers()
+
+    if event.get('httpMethod') == 'OPTIONS':
+        return {'statusCode': 200, 'headers': headers, 'body': ''}
+
+    try:
+        now = time.time()
+        if cached_body is None or now - cached_at > STATS_CACHE_SECONDS:
+            stats = build_stats(load_counters())
+            stats['generatedAt'] = int(now * 1000)
+            cached_body = json.dumps(stats, default=decimal_to_int, separators=(',', ':'))
+            cached_at = now
+            print(f"Recomputed stats: {stats['totals']}")
+
+        return {'statusCode': 200, 'headers': headers, 'body': cached_body}
+
+    except Exception as e:
+        print(f"Error in getStats: {e}")
+        headers['Cache-Control'] = 'no-store'
+        return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'error': 'Could not load statistics.'})}
@@ -5,30 +5,43 @@ import boto3
 import os
 import time
 import random
-import datetime # Make sure this is imported
-from decimal import Decimal
+import concurrent.futures
+from boto3.dynamodb.conditions import Key
+from lobby_common import (
+    all_lobby_tables, append_event, build_outbox, create_schedule, deadline_shard, DEADLINE_SHARDS,
+    default_table_name, get_conflicting_item, get_table, get_turn_duration, handle_timeout_lambda_arn,
+    lambda_role_arn, MAX_WRITE_ATTEMPTS, publish_snapshot, TIMER_MODE, version_condition
+)
 
 # --- Initialize AWS Clients ---
 # Ensure region_name is set if not using default region in environment
 dynamodb = boto3.resource('dynamodb')
 s3 = boto3.client('s3') # S3 Client
-scheduler = boto3.client('scheduler') # EventBridge Scheduler Client
 
 # --- Get Config from Environment Variables ---
-table_name = os.environ.get('TABLE_NAME', '')
-handle_timeout_lambda_arn = os.environ.get('HANDLE_TIMEOUT_LAMBDA_ARN', '')
-lambda_role_arn = os.environ.get('LAMBDA_EXECUTION_ROLE_ARN', '')
 s3_bucket_name = os.environ.get('S3_BUCKET_NAME', 'pick-ban-test-2023-10-27') # Bucket for resonators.json
 s3_file_key = os.environ.get('S3_FILE_KEY', 'resonators.json') # Path/Key for resonators.json in bucket
 
+# --- Turn Timer Mode ---
+# 'scheduler': one EventBridge schedule per turn (default).
+# 'sweeper':  no schedules; a per-minute rule invokes this function, which repeatedly queries the
+#             sparse deadline index (deadlineShard, turnDeadline) for turns that already ran out.
+# 'outbox':   the next schedule is recorded in the lobby's outbox by the write below and created by
+#             dispatchOutbox.py, so a failed create is retried instead of leaving the turn without a timeout.
+# TIMER_MODE and DEADLINE_SHARDS (the index partition key spread) are read by lobby_common.py.
+deadline_index_name = os.environ.get('DEADLINE_INDEX_NAME', 'deadlineShard-turnDeadline-index')
+SWEEP_INTERVAL_MS = int(os.environ.get('SWEEP_INTERVAL_MS', '1000'))
+SWEEP_BATCH_SIZE = int(os.environ.get('SWEEP_BATCH_SIZE', '100')) # Expired turns per shard per sweep
+SWEEP_WORKERS = int(os.environ.get('SWEEP_WORKERS', '8'))
+DEADLINE_SKEW_MS = int(os.environ.get('DEADLINE_SKEW_MS', '1000')) # A turn counts as expired this close to its deadline
+
 # --- Validate Env Vars ---
-if not all([table_name, handle_timeout_lambda_arn, lambda_role_arn, s3_bucket_name, s3_file_key]):
+schedule_arns_set = TIMER_MODE == 'sweeper' or (handle_timeout_lambda_arn and lambda_role_arn) # Sweeper mode creates no schedules
+if not all([default_table_name, schedule_arns_set, s3_bucket_name, s3_file_key]):
      print("ERROR: One or more environment variables are missing (TABLE_NAME, HANDLE_TIMEOUT_LAMBDA_ARN, LAMBDA_EXECUTION_ROLE_ARN, S3_BUCKET_NAME, S3_FILE_KEY)")
      # This will likely cause subsequent operations to fail, raise an exception or handle early
      raise ValueError("Missing required environment variables.")
 
-table = dynamodb.Table(table_name)
-
 # --- Load Resonator Data from S3 ---
 resonators_data = []
 try:
@@ -41,7 +54,7 @@ except Exception as e:
     # Depending on requirements, either raise error or continue with empty list
     # raise e # Option: Fail the function if resonators can't load
 
-# --- Helper Functions (get_next_state_and_player, get_action_type, create_schedule - Keep as before) ---
+# --- Helper Functions (get_next_state_and_player, get_action_type - Keep as before) ---
 
 def get_next_state_and_player(current_state):
     """Determines the next state and player based on the state that timed out."""
@@ -67,65 +80,13 @@ def get_action_type(game_state):
     print(f"WARNING: Could not determine action type for state: {game_state}")
     return None
 
-def create_schedule(lobby_code, game_state, start_time_ms, duration_ms):
-    """Creates the EventBridge schedule for the next timeout."""
-    schedule_name = f"timeout-{lobby_code}-{game_state}" # Needs to be unique
-    if not handle_timeout_lambda_arn or not lambda_role_arn:
-         print("ERROR: Lambda ARN or Role ARN environment variables not set. Cannot create schedule.")
-         return None
-
-    expiration_time_seconds = (start_time_ms + duration_ms) / 1000
-    schedule_trigger_time_seconds = expiration_time_seconds + 2 # 2 sec buffer
-
-    schedule_dt_utc = datetime.datetime.fromtimestamp(schedule_trigger_time_seconds, tz=datetime.timezone.utc)
-    schedule_time_str = schedule_dt_utc.strftime('%Y-%m-%dT%H:%M:%S')
-
-    try:
-        payload = json.dumps({
-            'lobbyCode': lobby_code,
-            'expectedGameState': game_state
-        })
-        print(f"Attempting to create schedule: {schedule_name} at {schedule_time_str} targeting {handle_timeout_lambda_arn}")
-
-        response = scheduler.create_schedule(
-            Name=schedule_name,
-            GroupName='default',
-            ActionAfterCompletion='DELETE',
-            FlexibleTimeWindow={'Mode': 'OFF'},
-            ScheduleExpression=f'at({schedule_time_str})',
-            State='ENABLED',
-            Target={
-                'Arn': handle_timeout_lambda_arn,
-                'RoleArn': lambda_role_arn,
-                'Input': payload
-            }
-        )
-        print(f"Successfully created schedule: {schedule_name} for time {schedule_time_str}")
-        return schedule_name
-    except scheduler.exceptions.ConflictException:
-         print(f"Schedule {schedule_name} already exists. Assuming it's okay (idempotency).")
-         return schedule_name
-    except Exception as e:
-        print(f"ERROR creating schedule {schedule_name}: {str(e)}")
-        return None
-
-# --- Main Handler ---
-def lambda_handler(event, context):
-    print("Received event:", json.dumps(event))
-
-    try:
-        # --- 1. Extract payload ---
-        payload = event
-        lobby_code = payload.get('lobbyCode')
-        expected_game_state = payload.get('expectedGameState')
-
-        if not lobby_code or not expected_game_state:
-            print("ERROR: Missing lobbyCode or expectedGameState in payload.")
-            return {'statusCode': 400, 'body': 'Invalid payload'}
-
-        # --- 2. Fetch Current Lobby State ---
+# --- Timeout Logic (shared by scheduled single timeouts and the deadline sweeper) ---
+def apply_timeout(lobby_code, expected_game_state, item=None):
+    """Performs the random pick/ban for a turn that ran out, if the lobby is still in that turn."""
+    # --- 2. Fetch Current Lobby State (the sweeper already has it from the deadline index) ---
+    if item is None:
         try:
-            response = table.get_item(Key={'lobbyCode': lobby_code})
+            response = get_table(lobby_code).get_item(Key={'lobbyCode': lobby_code})
         except Exception as db_error:
              print(f"ERROR: Failed to get item from DynamoDB: {db_error}")
              return {'statusCode': 500, 'body': 'Database error'}
@@ -134,14 +95,24 @@ def lambda_handler(event, context):
             print(f"Lobby {lobby_code} not found. Expired schedule for deleted lobby?")
             return {'statusCode': 200, 'body': 'Lobby not found, ignoring timeout.'}
         item = response['Item']
-        current_game_state_db = item.get('gameState')
-        print(f"Current DB state: {current_game_state_db}, Expected state from schedule: {expected_game_state}")
+    current_game_state_db = item.get('gameState')
+    print(f"Current DB state: {current_game_state_db}, Expected state from schedule: {expected_game_state}")
 
+    # Steps 3-5 are redone if a player's pick lands between the read and the write
+    for attempt in range(MAX_WRITE_ATTEMPTS):
         # --- 3. Validate Timeout ---
         if current_game_state_db != expected_game_state:
             print(f"State mismatch ({current_game_state_db} != {expected_game_state}). Player likely acted already. Ignoring timeout.")
             return {'statusCode': 200, 'body': 'State already advanced, ignoring timeout.'}
 
+        # A stale index entry or a leftover schedule from before a reset can name a turn that was
+        # restarted since: same state, fresh deadline. Only a turn whose own deadline passed times out.
+        turn_deadline = (item.get('timerState') or {}).get('deadline')
+        now_ms = int(time.time() * 1000)
+        if turn_deadline is not None and int(turn_deadline) > now_ms + DEADLINE_SKEW_MS:
+            print(f"Turn {expected_game_state} of {lobby_code} runs until {turn_deadline} (now {now_ms}). Ignoring timeout.")
+            return {'statusCode': 200, 'body': 'Turn has not expired yet, ignoring timeout.'}
+
         # --- 4. Timeout is Valid - Perform Random Action ---
         print(f"Timeout validated for lobby {lobby_code} in state {expected_game_state}.")
         action_type = get_action_type(expected_game_state)
@@ -189,43 +160,173 @@ def lambda_handler(event, context):
 
         next_timer_state = {}
         new_start_time = int(time.time() * 1000)
-        new_duration = 30000 # Default duration
+        new_duration = get_turn_duration(item, next_state) if next_state != 'complete' else None
+        new_deadline = new_start_time + new_duration if new_duration else None
 
+        remove_clause = ''
         if next_state != 'complete':
-            next_timer_state = {'startTime': new_start_time, 'duration': new_duration, 'isActive': True}
+            next_timer_state = {'startTime': new_start_time, 'duration': new_duration, 'deadline': new_deadline, 'isActive': True}
             update_expression_parts.append('timerState = :timer')
             expression_values[':timer'] = next_timer_state
+            # Deadline index entry for the sweeper (kept in every timer mode, it costs nothing extra)
+            update_expression_parts.append('turnDeadline = :deadline, deadlineShard = :shard')
+            expression_values[':deadline'] = new_deadline
+            expression_values[':shard'] = deadline_shard(lobby_code)
         else:
-            next_timer_state = {'startTime': None, 'duration': None, 'isActive': False}
+            next_timer_state = {'startTime': None, 'duration': None, 'deadline': None, 'isActive': False}
             update_expression_parts.append('timerState = :timer')
             expression_values[':timer'] = next_timer_state
+            remove_clause = " REMOVE turnDeadline, deadlineShard" # Drops the lobby from the sparse index
+
+        if TIMER_MODE == 'outbox': # The expired schedule deletes itself, only the next one is needed
+            outbox_entries = [{'type': 'publishSnapshot'}]
+            if next_state != 'complete':
+                outbox_entries.append({'type': 'createSchedule', 'gameState': next_state, 'deadline': new_deadline})
+            update_expression_parts.append('outbox = :outbox')
+            expression_values[':outbox'] = build_outbox(item, outbox_entries)
 
-        update_expression = "SET " + ", ".join(update_expression_parts)
+        update_expression = "SET " + ", ".join(update_expression_parts) + remove_clause + " ADD version :one"
+        expression_values[':one'] = 1
         print(f"Updating DynamoDB. Next state: {next_state}. Update expression: {update_expression}. Values: {json.dumps(expression_values, default=str)}")
 
+        # Only applies if no player action landed since the read; otherwise re-validate
+        condition_expression, condition_values = version_condition(item)
+        expression_values.update(condition_values)
         try:
-            table.update_item(
+            update_result = get_table(lobby_code).update_item(
                 Key={'lobbyCode': lobby_code},
                 UpdateExpression=update_expression,
-                ExpressionAttributeValues=expression_values
+                ExpressionAttributeValues=expression_values,
+                ConditionExpression=condition_expression,
+                ReturnValues='ALL_NEW',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
             print("DynamoDB updated successfully by timeout handler.")
+            break
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+            item = get_conflicting_item(e)
+            print(f"Version conflict in timeout for {lobby_code} (attempt {attempt + 1}), re-validating.")
+            if item is None:
+                return {'statusCode': 200, 'body': 'Lobby deleted, ignoring timeout.'}
+            current_game_state_db = item.get('gameState')
         except Exception as db_error:
              print(f"ERROR: Failed to update DynamoDB: {db_error}")
              return {'statusCode': 500, 'body': 'Database update error'}
+    else:
+        print(f"Giving up on timeout for {lobby_code} after {MAX_WRITE_ATTEMPTS} conflicting writes.")
+        return {'statusCode': 200, 'body': 'Lobby kept changing, ignoring timeout.'}
+
+    if TIMER_MODE != 'outbox':
+        publish_snapshot(update_result.get('Attributes'))
+    # Auto-picks are recorded as 'timeout' so they stay distinguishable from deliberate picks
+    append_event(
+        update_result.get('Attributes'), 'timeout',
+        player='player1' if '_p1' in expected_game_state else 'player2',
+        action=action_type, value=random_choice
+    )
+
+    # --- 6. Schedule Next Timeout (if needed; the sweeper finds it through turnDeadline instead) ---
+    if next_state != 'complete' and TIMER_MODE == 'scheduler':
+         print(f"Scheduling next timeout for state: {next_state}")
+         create_schedule(lobby_code, next_state, new_deadline)
+    elif next_state == 'complete':
+         print("Game complete, not scheduling further timeouts.")
+
+    action_info = f"action: {action_type}, choice: {random_choice}" if random_choice else "action: forced complete (no choices)"
+    return {'statusCode': 200, 'body': f'Timeout handled for {lobby_code}, {action_info}'}
+
+# --- Deadline Sweeper ---
+def query_expired_turns(lobby_table, shard, now_ms):
+    """One batch of lobbies in this deadline shard of lobby_table whose turn deadline has passed, oldest first."""
+    response = lobby_table.query(
+        IndexName=deadline_index_name,
+        KeyConditionExpression=Key('deadlineShard').eq(shard) & Key('turnDeadline').lte(now_ms),
+        Limit=SWEEP_BATCH_SIZE
+    )
+    return response.get('Items', [])
+
+def clear_stale_deadline(index_item):
+    """
+    Removes the deadline attributes of a lobby that is not in a turn, so the sweeper stops finding it.
+    Only applies while the lobby is still in the state the index showed; a turn that started since then
+    has written its own deadline.
+    """
+    lobby_code = index_item['lobbyCode']
+    game_state = index_item.get('gameState')
+    condition_kwargs = {'ConditionExpression': 'attribute_exists(lobbyCode) AND attribute_not_exists(gameState)'}
+    if game_state is not None:
+        condition_kwargs = {'ConditionExpression': 'gameState = :state', 'ExpressionAttributeValues': {':state': game_state}}
+    try:
+        get_table(lobby_code).update_item(
+            Key={'lobbyCode': lobby_code},
+            UpdateExpression='REMOVE turnDeadline, deadlineShard', # Not a state change, the version stays
+            **condition_kwargs
+        )
+        print(f"Cleared stale deadline of {lobby_code} in state {game_state}.")
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Lobby {lobby_code} left state {game_state}, keeping its deadline.")
+    except Exception as e:
+        print(f"ERROR clearing stale deadline of {lobby_code}: {e}")
+
+def sweep_expired_turns():
+    """Applies every expired turn once. Returns how many timeouts were applied."""
+    now_ms = int(time.time() * 1000)
+    expired = []
+    for lobby_table in all_lobby_tables():
+        for shard in range(DEADLINE_SHARDS):
+            expired.extend(query_expired_turns(lobby_table, str(shard), now_ms))
+    if not expired:
+        return 0
+
+    def apply_one(index_item):
+        if not get_action_type(index_item.get('gameState')):
+            clear_stale_deadline(index_item) # Not a turn state; otherwise every sweep would find it again
+            return False
+        # A full projection lets apply_timeout use the index copy directly: if it is stale,
+        # the version-conditioned write fails and the current item comes back with the error.
+        has_full_item = 'version' in index_item and 'picks' in index_item
+        result = apply_timeout(index_item['lobbyCode'], index_item.get('gameState'), index_item if has_full_item else None)
+        return result.get('statusCode') == 200 and result.get('body', '').startswith('Timeout handled')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SWEEP_WORKERS) as executor:
+        applied = sum(1 for handled in executor.map(apply_one, expired) if handled)
+    print(f"Sweep at {now_ms}: {len(expired)} expired turns found, {applied} timeouts applied.")
+    return applied
+
+def run_sweeper(context):
+    """Sweeps every SWEEP_INTERVAL_MS until the invocation is about to end (one invocation per minute)."""
+    total = 0
+    while True:
+        started = time.time()
+        total += sweep_expired_turns()
+        remaining_ms = context.get_remaining_time_in_millis() if context else 0
+        if remaining_ms < SWEEP_INTERVAL_MS + 5000: # Leave room for one more sweep's work
+            break
+        time.sleep(max(0, SWEEP_INTERVAL_MS / 1000 - (time.time() - started)))
+    return {'statusCode': 200, 'body': f'Sweeper applied {total} timeouts.'}
 
-        # --- 6. Schedule Next Timeout (if needed) ---
-        if next_state != 'complete':
-             print(f"Scheduling next timeout for state: {next_state}")
-             create_schedule(lobby_code, next_state, new_start_time, new_duration)
-        else:
-             print("Game complete, not scheduling further timeouts.")
+# --- Main Handler ---
+def lambda_handler(event, context):
+    print("Received event:", json.dumps(event))
+
+    try:
+        # Scheduled rule (e.g. rate(1 minute)) in sweeper mode
+        if event.get('sweep') or event.get('detail-type') == 'Scheduled Event':
+            return run_sweeper(context)
+
+        # --- 1. Extract payload ---
+        payload = event
+        lobby_code = payload.get('lobbyCode')
+        expected_game_state = payload.get('expectedGameState')
+
+        if not lobby_code or not expected_game_state:
+            print("ERROR: Missing lobbyCode or expectedGameState in payload.")
+            return {'statusCode': 400, 'body': 'Invalid payload'}
 
-        action_info = f"action: {action_type}, choice: {random_choice}" if random_choice else "action: forced complete (no choices)"
-        return {'statusCode': 200, 'body': f'Timeout handled for {lobby_code}, {action_info}'}
+        return apply_timeout(lobby_code, expected_game_state)
 
     except Exception as e:
         print(f"FATAL ERROR in handleTimeout: {str(e)}")
         import traceback
         traceback.print_exc()
-        return {'statusCode': 500, 'body': f'Internal server error handling timeout: {str(e)}'}
\ No newline at end of file
+        return {'statusCode': 500, 'body': f'Internal server error handling timeout: {str(e)}'}
@@ -1,16 +1,11 @@
 import json
 import boto3
-import os
-from decimal import Decimal
+from lobby_common import (
+    append_event, decimal_to_int, get_conflicting_item, get_table, MAX_WRITE_ATTEMPTS,
+    public_lobby, publish_snapshot, version_condition
+)
 
 dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
-
-def decimal_to_int(obj):
-    """Convert Decimal objects to integers for JSON serialization."""
-    if isinstance(obj, Decimal):
-        return int(obj)
-    raise TypeError
 
 def lambda_handler(event, context):
     try:
@@ -46,7 +41,7 @@ def lambda_handler(event, context):
         player_name = player_name.strip() # Remove leading/trailing spaces
 
         # Get the lobby from DynamoDB
-        response = table.get_item(Key={'lobbyCode': lobby_code})
+        response = get_table(lobby_code).get_item(Key={'lobbyCode': lobby_code})
 
         if 'Item' not in response:
             return {
@@ -61,62 +56,116 @@ def lambda_handler(event, context):
 
         item = response['Item']
 
-        # Check if player is already in the lobby
-        if item.get('player1') == player_name or item.get('player2') == player_name:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'POST,OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
-                },
-                'body': json.dumps({'error': 'Player is already in this lobby'})
-            }
+        # Two players joining at the same moment would both see the same empty slot, so the
+        # write only succeeds if the lobby is still at the version the decision was based on.
+        # On a conflict, the slot choice is redone against the lobby returned by the failed write.
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            # Lobbies provisioned in bulk (createLobbiesBulk.py) have player names pre-assigned.
+            # A player whose name is already in a slot of such a lobby simply claims that slot.
+            if item.get('eventId') and player_name in (item.get('player1'), item.get('player2')):
+                role = 'player1' if item.get('player1') == player_name else 'player2'
+                item.pop("organizer", None)
+                item.pop("organizerName", None)
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST,OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
+                    },
+                    'body': json.dumps({
+                        'message': 'Joined pre-assigned lobby slot successfully',
+                        'role': role,
+                        'lobbyData': public_lobby(item)
+                    }, default=decimal_to_int)
+                }
 
-        # Check if there's an empty player slot and assign the name
-        if item.get('player1', '') == '':
-            item['player1'] = player_name
-            role = "player1"
-        elif item.get('player2', '') == '':
-            item['player2'] = player_name
-            role = "player2"
-        else:
-            return {
-                'statusCode': 409,  # Conflict - Lobby is full
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'POST,OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
-                },
-                'body': json.dumps({'error': 'Lobby is full'})
-            }
+            # Check if player is already in the lobby
+            if item.get('player1') == player_name or item.get('player2') == player_name:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST,OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
+                    },
+                    'body': json.dumps({'error': 'Player is already in this lobby'})
+                }
 
-        # --- Update DynamoDB ---
-        update_expression = "SET player1 = :p1, player2 = :p2"
-        expression_attribute_values = {
-            ':p1': item['player1'],
-            ':p2': item['player2']
-        }
+            # Check if there's an empty player slot
+            if item.get('player1', '') == '':
+                role = "player1"
+            elif item.get('player2', '') == '':
+                role = "player2"
+            else:
+                return {
+                    'statusCode': 409,  # Conflict - Lobby is full
+                    'headers': {
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST,OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
+                    },
+                    'body': json.dumps({'error': 'Lobby is full'})
+                }
 
-        try:
-            table.update_item(
-                Key={'lobbyCode': lobby_code},
-                UpdateExpression=update_expression,
-                ExpressionAttributeValues=expression_attribute_values,
-                ReturnValues="UPDATED_NEW"
-            )
-        except Exception as e:
-            print(f"Error updating DynamoDB: {str(e)}")
+            # --- Update DynamoDB (only the chosen slot, only if nothing changed since the read) ---
+            update_expression = f"SET {role} = :name"
+            expression_attribute_values = {':name': player_name, ':one': 1}
+            other_slot = 'player2' if role == 'player1' else 'player1'
+            if item.get(other_slot, '') != '' and item.get('gameState') == 'waiting':
+                # This join fills the lobby: move to the ready check in the same write
+                update_expression += ", gameState = :readyCheck"
+                expression_attribute_values[':readyCheck'] = 'ready_check'
+            condition_expression, condition_values = version_condition(item)
+            try:
+                update_response = get_table(lobby_code).update_item(
+                    Key={'lobbyCode': lobby_code},
+                    UpdateExpression=update_expression + " ADD version :one",
+                    ConditionExpression=condition_expression,
+                    ExpressionAttributeValues={**expression_attribute_values, **condition_values},
+                    ReturnValues="ALL_NEW",
+                    ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                )
+                item = update_response.get('Attributes', item)
+                break
+            except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+                item = get_conflicting_item(e)
+                print(f"Version conflict joining {lobby_code} (attempt {attempt + 1}), re-evaluating.")
+                if item is None:
+                    return {
+                        'statusCode': 404,
+                        'headers': {
+                            'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Allow-Methods': 'POST,OPTIONS',
+                            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
+                        },
+                        'body': json.dumps({'error': 'Lobby not found'})
+                    }
+            except Exception as e:
+                print(f"Error updating DynamoDB: {str(e)}")
+                return {
+                    'statusCode': 500,
+                    'headers': {
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST,OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
+                    },
+                    'body': json.dumps({'error': 'Failed to update lobby state'})
+                }
+        else:
             return {
-                'statusCode': 500,
+                'statusCode': 409,
                 'headers': {
                     'Access-Control-Allow-Origin': '*',
                     'Access-Control-Allow-Methods': 'POST,OPTIONS',
                     'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
                 },
-                'body': json.dumps({'error': 'Failed to update lobby state'})
+                'body': json.dumps({'error': 'Lobby is changing too quickly, please try again'})
             }
 
+        publish_snapshot(item)
+        append_event(item, 'join', player=role, name=player_name)
+
         # Remove sensitive/unsupported fields before returning
         item.pop("organizer", None)  # Remove old field if it exists
         item.pop("organizerName", None)  # Remove organizer name for security
@@ -131,7 +180,7 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'message': 'Joined lobby successfully',
                 'role': role,
-                'lobbyData': item
+                'lobbyData': public_lobby(item)
             }, default=decimal_to_int)
         }
 
@@ -0,0 +1,537 @@
+# Helpers shared by the lobby Lambda functions. Deploy this file next to each handler in its
+# package (or as a Lambda layer under python/), so every function runs the same copy.
+# Settings are read from the same environment variables the handlers document.
+
+import json
+import boto3
+import os
+import time
+import math
+import datetime
+import threading
+import zlib
+from collections import OrderedDict
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+dynamodb = boto3.resource('dynamodb')
+s3 = boto3.client('s3')
+scheduler = boto3.client('scheduler')
+
+# --- Lobby Shards (SHARD_MAP: JSON {"<shard id>": "<table name>"}, shard ids are the letters g-z) ---
+# A lobby code starts with its shard id, so adding a shard never moves existing lobbies. Codes that
+# start with a hex digit (created before sharding, or with no SHARD_MAP) live in TABLE_NAME.
+default_table_name = os.environ.get('TABLE_NAME', '')
+SHARD_MAP = json.loads(os.environ.get('SHARD_MAP') or '{}')
+if any(len(shard_id) != 1 or shard_id not in 'ghijklmnopqrstuvwxyz' for shard_id in SHARD_MAP):
+    raise ValueError("SHARD_MAP keys must be single letters g-z (hex digits mark unsharded lobby codes).")
+# Shards that receive new lobbies (default: all). Repeat an id to weight it, drop one to drain it.
+NEW_LOBBY_SHARDS = [shard_id.strip() for shard_id in os.environ.get('NEW_LOBBY_SHARDS', ','.join(SHARD_MAP)).split(',') if shard_id.strip()]
+if any(shard_id not in SHARD_MAP for shard_id in NEW_LOBBY_SHARDS):
+    raise ValueError("NEW_LOBBY_SHARDS may only name shards listed in SHARD_MAP.")
+shard_tables = {}
+
+def get_table_name(lobby_code):
+    return SHARD_MAP.get((lobby_code or '')[:1], default_table_name)
+
+def get_table(lobby_code):
+    """The table holding lobby_code (one Table resource per table name and container)."""
+    table_name = get_table_name(lobby_code)
+    if table_name not in shard_tables:
+        shard_tables[table_name] = dynamodb.Table(table_name)
+    return shard_tables[table_name]
+
+def lobby_table_names():
+    """TABLE_NAME plus each shard's table, for work that spans all lobbies."""
+    return list(dict.fromkeys(name for name in [default_table_name, *SHARD_MAP.values()] if name))
+
+def all_lobby_tables():
+    return [shard_tables.setdefault(name, dynamodb.Table(name)) for name in lobby_table_names()]
+
+# --- JSON and Stream Images ---
+deserializer = TypeDeserializer()
+
+def decimal_to_int(obj):
+    """Convert Decimal objects to integers for JSON serialization."""
+    if isinstance(obj, Decimal):
+        return int(obj)
+    raise TypeError
+
+def deserialize_image(image):
+    """A DynamoDB Stream image (or a raw item in the low-level format) as plain Python values."""
+    return {key: deserializer.deserialize(value) for key, value in (image or {}).items()}
+
+# --- Turn Timer Mode ('scheduler': one EventBridge schedule per turn, 'sweeper': handleTimeout sweeps the
+#     deadline index, 'outbox': schedules are created by dispatchOutbox.py from the outbox, see below) ---
+TIMER_MODE = os.environ.get('TIMER_MODE', 'scheduler')
+DEADLINE_SHARDS = int(os.environ.get('DEADLINE_SHARDS', '4')) # Spreads the deadline index partition key
+
+def deadline_shard(lobby_code):
+    """Stable shard ('0'..DEADLINE_SHARDS-1) for the lobby's entry in the deadline index."""
+    return str(zlib.crc32(lobby_code.encode('utf-8')) % DEADLINE_SHARDS)
+
+# --- Turn Durations (per draft phase; a lobby created with timerDurations overrides these) ---
+DEFAULT_TURN_DURATIONS_MS = {
+    'ban1': int(os.environ.get('BAN1_DURATION_MS', '30000')),
+    'pick1': int(os.environ.get('PICK1_DURATION_MS', '30000')),
+    'ban2': int(os.environ.get('BAN2_DURATION_MS', '30000')),
+    'pick2': int(os.environ.get('PICK2_DURATION_MS', '30000'))
+}
+
+def get_turn_duration(item, game_state):
+    """Turn length in ms for the phase game_state belongs to (e.g. 'pick1_p2_2' -> 'pick1')."""
+    phase = game_state.split('_')[0]
+    lobby_durations = item.get('timerDurations') or {}
+    return int(lobby_durations.get(phase, DEFAULT_TURN_DURATIONS_MS[phase]))
+
+# --- Turn Duration Overrides (validated when a lobby is created, in milliseconds) ---
+TIMER_PHASES = ('ban1', 'pick1', 'ban2', 'pick2')
+MIN_TURN_DURATION_MS = 5000
+MAX_TURN_DURATION_MS = 300000
+
+def parse_timer_durations(body):
+    """Validates e.g. {"ban1": 10000, "pick1": 20000}. Returns {} when the request sets none."""
+    durations = body.get('timerDurations') or {}
+    if not isinstance(durations, dict):
+        raise ValueError("'timerDurations' must be an object of phase -> milliseconds.")
+    for phase, duration in durations.items():
+        if phase not in TIMER_PHASES:
+            raise ValueError(f"Unknown timer phase '{phase}' (expected one of {', '.join(TIMER_PHASES)}).")
+        if not isinstance(duration, int) or isinstance(duration, bool) or not MIN_TURN_DURATION_MS <= duration <= MAX_TURN_DURATION_MS:
+            raise ValueError(f"Timer for '{phase}' must be between {MIN_TURN_DURATION_MS} and {MAX_TURN_DURATION_MS} ms.")
+    return durations
+
+# --- Timeout Schedules (EventBridge Scheduler one-time schedules that invoke handleTimeout) ---
+handle_timeout_lambda_arn = os.environ.get('HANDLE_TIMEOUT_LAMBDA_ARN', '')
+lambda_role_arn = os.environ.get('LAMBDA_EXECUTION_ROLE_ARN', '')
+
+def create_schedule(lobby_code, game_state, deadline_ms):
+    """Creates the EventBridge schedule for the next timeout."""
+    schedule_name = f"timeout-{lobby_code}-{game_state}"
+    if not handle_timeout_lambda_arn or not lambda_role_arn:
+         print("ERROR: Lambda ARN or Role ARN environment variables not set. Cannot create schedule.")
+         return None
+
+    # at() has one-second resolution: round up so the timeout never fires before the deadline
+    schedule_trigger_time_seconds = math.ceil(deadline_ms / 1000)
+
+    schedule_dt_utc = datetime.datetime.fromtimestamp(schedule_trigger_time_seconds, tz=datetime.timezone.utc)
+    schedule_time_str = schedule_dt_utc.strftime('%Y-%m-%dT%H:%M:%S')
+
+    try:
+        payload = json.dumps({
+            'lobbyCode': lobby_code,
+            'expectedGameState': game_state # The state that just started
+        })
+        print(f"Attempting to create schedule: {schedule_name} at {schedule_time_str} targeting {handle_timeout_lambda_arn}")
+
+        response = scheduler.create_schedule(
+            Name=schedule_name,
+            GroupName='default', # Use default group or create one if needed
+            ActionAfterCompletion='DELETE',
+            FlexibleTimeWindow={'Mode': 'OFF'},
+            ScheduleExpression=f'at({schedule_time_str})',
+            State='ENABLED',
+            Target={
+                'Arn': handle_timeout_lambda_arn, # ARN of handleTimeout Lambda
+                'RoleArn': lambda_role_arn,      # Execution role ARN passed to scheduler
+                'Input': payload
+            }
+        )
+        print(f"Successfully created schedule: {schedule_name} for time {schedule_time_str}")
+        return schedule_name
+    except scheduler.exceptions.ConflictException:
+         print(f"Schedule {schedule_name} already exists. Assuming it's okay.")
+         return schedule_name
+    except Exception as e:
+        print(f"ERROR creating schedule {schedule_name}: {str(e)}")
+        return None
+
+def delete_schedule(lobby_code, game_state):
+    schedule_name = f"timeout-{lobby_code}-{game_state}"
+    try:
+        print(f"Attempting to delete schedule: {schedule_name}")
+        scheduler.delete_schedule(Name=schedule_name, GroupName='default') # Specify GroupName if not default
+        print(f"Successfully deleted schedule: {schedule_name}")
+    except scheduler.exceptions.ResourceNotFoundException:
+        print(f"Schedule {schedule_name} not found for deletion (normal).")
+    except Exception as e:
+        print(f"ERROR deleting schedule {schedule_name}: {str(e)}")
+
+# --- Outbox (TIMER_MODE='outbox': the schedule and snapshot work a write causes is stored on the lobby
+#     item by that same conditional write, and dispatchOutbox.py carries it out from the table's stream) ---
+def build_outbox(item, entries):
+    """
+    The outbox map to write together with the update that moves item to its next version.
+    Pending schedule deletions are kept; any other pending entry is superseded by the new ones.
+    """
+    next_version = int(item.get('version', 0)) + 1
+    outbox = {key: entry for key, entry in (item.get('outbox') or {}).items() if entry.get('type') == 'deleteSchedule'}
+    for entry in entries:
+        outbox[f"{next_version}-{entry['type']}"] = entry # Unique per write, so stream retries dedupe on the key
+    return outbox
+
+# --- Lobby Snapshot Publishing (static copy served to spectators/dashboards via CloudFront) ---
+# Snapshots are published by the request that made the change and, in TIMER_MODE=outbox, by
+# dispatchOutbox.py from the table's stream, so puts can arrive out of order. Each object carries
+# its lobby version in its metadata and is only replaced by a newer version, through a put
+# conditioned on the ETag that was checked.
+snapshot_bucket_name = os.environ.get('SNAPSHOT_BUCKET_NAME', '')
+snapshot_dir = os.environ.get('SNAPSHOT_DIR', '') # Local filesystem stand-in for S3 (dev/tests)
+snapshot_prefix = os.environ.get('SNAPSHOT_PREFIX', 'snapshots/')
+SNAPSHOT_ATTRIBUTES = [
+    'lobbyCode', 'eventId', 'version', 'gameState', 'player1', 'player2',
+    'player1Ready', 'player2Ready', 'picks', 'bans', 'timerState'
+]
+PUBLIC_LOBBY_ATTRIBUTES = SNAPSHOT_ATTRIBUTES + ['organizerName'] # What lobby responses return to clients
+MAX_SNAPSHOT_ATTEMPTS = 3 # Another writer replaced the object between our check and our put
+
+def public_lobby(item):
+    """The client-facing part of a lobby item, without the outbox, deadline index keys or timer overrides."""
+    return {key: item[key] for key in PUBLIC_LOBBY_ATTRIBUTES if key in item} if item else item
+
+def stored_snapshot_version(object_key):
+    """(version, ETag) of the published snapshot; version is -1 if there is none or it predates versioning."""
+    try:
+        head = s3.head_object(Bucket=snapshot_bucket_name, Key=object_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return -1, None
+        raise
+    return int(head.get('Metadata', {}).get('lobby-version', -1)), head['ETag']
+
+def write_snapshot_file(object_key, body, version):
+    path = os.path.join(snapshot_dir, object_key)
+    try:
+        with open(path) as snapshot_file:
+            stored_version = json.load(snapshot_file).get('version', -1)
+    except (OSError, ValueError):
+        stored_version = -1
+    if stored_version >= version:
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as snapshot_file:
+        snapshot_file.write(body)
+    os.replace(path + '.tmp', path) # Atomic swap so readers never see a partial file
+    return True
+
+def write_snapshot_object(object_key, body, version):
+    for attempt in range(MAX_SNAPSHOT_ATTEMPTS):
+        stored_version, etag = stored_snapshot_version(object_key)
+        if stored_version >= version:
+            return False
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+        try:
+            s3.put_object(
+                Bucket=snapshot_bucket_name,
+                Key=object_key,
+                Body=body.encode('utf-8'),
+                ContentType='application/json',
+                CacheControl='public, max-age=1, s-maxage=1, stale-while-revalidate=5',
+                Metadata={'lobby-version': str(version)},
+                **condition
+            )
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise
+            print(f"Snapshot {object_key} changed while publishing version {version} (attempt {attempt + 1}), checking again.")
+    raise RuntimeError(f"Snapshot {object_key} kept changing, version {version} not published")
+
+def publish_snapshot(item, raise_errors=False):
+    """
+    Writes the public, versioned lobby snapshot to S3 (or SNAPSHOT_DIR) unless a snapshot of the same
+    or a newer version is already there. Errors are logged, or raised with raise_errors=True
+    (dispatchOutbox.py, so the stream batch is retried).
+    """
+    if not item or not (snapshot_bucket_name or snapshot_dir):
+        return
+    snapshot = {key: item[key] for key in SNAPSHOT_ATTRIBUTES if key in item}
+    body = json.dumps(snapshot, default=decimal_to_int, separators=(',', ':'))
+    object_key = f"{snapshot_prefix}{item['lobbyCode']}.json"
+    version = int(snapshot.get('version', 0))
+    try:
+        if snapshot_dir:
+            published = write_snapshot_file(object_key, body, version)
+        else:
+            published = write_snapshot_object(object_key, body, version)
+        if published:
+            print(f"Published snapshot {object_key} (version {version})")
+        else:
+            print(f"Skipped snapshot {object_key} version {version}: a newer one is already published")
+    except Exception as e:
+        print(f"ERROR publishing snapshot {object_key}: {e}")
+        if raise_errors:
+            raise
+
+# --- Draft Event Log (append-only, one small item per action in EVENTS_TABLE_NAME) ---
+events_table_name = os.environ.get('EVENTS_TABLE_NAME', '')
+events_table = dynamodb.Table(events_table_name) if events_table_name else None
+
+def append_event(updated_item, event_type, **fields):
+    """
+    Appends one event. The lobby version written by the action is its sequence number, so an event
+    that is already recorded (a retried write reporting the same version) is never overwritten.
+    """
+    if events_table is None or not updated_item or 'version' not in updated_item:
+        return
+    event_item = {
+        'lobbyCode': updated_item['lobbyCode'],
+        'seq': int(updated_item['version']),
+        'ts': int(time.time() * 1000),
+        'type': event_type,
+        'state': updated_item.get('gameState')
+    }
+    event_item.update({key: value for key, value in fields.items() if value is not None})
+    try:
+        events_table.put_item(Item=event_item, ConditionExpression='attribute_not_exists(seq)')
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Event #{event_item['seq']} for {event_item['lobbyCode']} is already recorded, keeping the first one.")
+    except Exception as e:
+        print(f"ERROR appending {event_type} event #{event_item['seq']} for {event_item['lobbyCode']}: {e}")
+
+# --- Finished Drafts ---
+DRAFT_PICKS = 6 # pick1 x4 + pick2 x2
+DRAFT_BANS = 4  # ban1 x2 + ban2 x2
+FINISHED_STATES = ('complete', 'closed') # 'closed': ended early by an operator (adminLobbies.py force-close)
+
+def is_full_draft(lobby):
+    """True for a 'complete' lobby with every pick and ban made; only these count in statistics."""
+    return (lobby.get('gameState') == 'complete'
+            and len(lobby.get('picks') or []) == DRAFT_PICKS
+            and len(lobby.get('bans') or []) == DRAFT_BANS)
+
+# --- Optimistic Concurrency (every write is conditioned on the lobby version it was computed from) ---
+MAX_WRITE_ATTEMPTS = 3 # Re-evaluate against the latest lobby this many times before giving up
+
+def version_condition(item):
+    """Returns (ConditionExpression, values) asserting the lobby is still at the version that was read."""
+    if 'version' in item:
+        return 'version = :expectedVersion', {':expectedVersion': item['version']}
+    return 'attribute_exists(lobbyCode) AND attribute_not_exists(version)', {} # Lobby created before versioning
+
+def get_conflicting_item(error):
+    """The lobby as it is now, taken from a failed write made with ReturnValuesOnConditionCheckFailure='ALL_OLD'."""
+    raw_item = error.response.get('Item')
+    if not raw_item:
+        return None # The lobby no longer exists
+    return deserialize_image(raw_item)
+
+class LobbyVersionConflict(Exception):
+    """Raised when a lobby write lost a race; carries the lobby as it is now (None if deleted)."""
+    def __init__(self, current_item):
+        super().__init__('Lobby version changed during the update')
+        self.current_item = current_item
+
+# --- Idempotency Keys (IDEMPOTENCY_TABLE_NAME, partition key 'idempotencyKey', TTL on 'ttl') ---
+idempotency_table_name = os.environ.get('IDEMPOTENCY_TABLE_NAME', '')
+idempotency_table = dynamodb.Table(idempotency_table_name) if idempotency_table_name else None
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '600'))
+# A pending key older than this belongs to an invocation that died before finishing (timeout, crash),
+# so a retry may take it over. Keep it above the function timeout; API Gateway gives up after 29s.
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '35'))
+
+def get_idempotency_key(event, scope):
+    """Reads the client's Idempotency-Key header, namespaced by lobby and action. None if absent."""
+    for header_name, value in (event.get('headers') or {}).items():
+        if header_name.lower() == 'idempotency-key' and value and len(value) <= 200:
+            lobby_code = (event.get('pathParameters') or {}).get('lobbyCode', '')
+            return f"{lobby_code}#{scope}#{value}"
+    return None
+
+def begin_idempotent_request(record_key, headers):
+    """
+    Reserves the key, or takes over a pending one whose lease ran out. Returns None if the request
+    should run, else the response for the duplicate.
+    """
+    if idempotency_table is None or not record_key:
+        return None
+    now = int(time.time())
+    try:
+        idempotency_table.put_item(
+            Item={
+                'idempotencyKey': record_key,
+                'status': 'pending',
+                'leaseUntil': now + IDEMPOTENCY_LEASE_SECONDS,
+                'ttl': now + IDEMPOTENCY_TTL_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(idempotencyKey) OR (#status = :pending AND leaseUntil < :now)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':pending': 'pending', ':now': now}
+        )
+        return None
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        pass # Seen before: replay it below
+    except Exception as e:
+        print(f"ERROR reserving idempotency key {record_key}: {e}. Processing without it.")
+        return None
+
+    try:
+        existing = idempotency_table.get_item(Key={'idempotencyKey': record_key}, ConsistentRead=True).get('Item')
+    except Exception as e:
+        print(f"ERROR reading idempotency key {record_key}: {e}. Processing without it.")
+        return None
+
+    if existing and existing.get('status') == 'done':
+        print(f"Replaying stored response for idempotency key {record_key}")
+        return {
+            'statusCode': int(existing['statusCode']),
+            'headers': {**headers, 'Idempotent-Replayed': 'true'},
+            'body': existing['body']
+        }
+    print(f"Idempotency key {record_key} is still in progress.")
+    return {
+        'statusCode': 409,
+        'headers': headers,
+        'body': json.dumps({'error': 'This request is already being processed. Refresh the lobby state.'})
+    }
+
+def finish_idempotent_request(record_key, response):
+    """Stores a successful response for replay; releases the key otherwise so the client may retry."""
+    if idempotency_table is None or not record_key:
+        return response
+    try:
+        if 200 <= response['statusCode'] < 300:
+            idempotency_table.put_item(Item={
+                'idempotencyKey': record_key,
+                'status': 'done',
+                'statusCode': response['statusCode'],
+                'body': response.get('body', ''),
+                'ttl': int(time.time()) + IDEMPOTENCY_TTL_SECONDS
+            })
+        else:
+            idempotency_table.delete_item(Key={'idempotencyKey': record_key})
+    except Exception as e:
+        print(f"ERROR storing result for idempotency key {record_key}: {e}")
+    return response
+
+# --- Rate Limiting (token buckets per client and per lobby, checked before any lobby read) ---
+# Each bucket is stored as the time at which it will be full again ("theoretical arrival time"):
+# a request is allowed while that time is at most `burst` intervals in the future, and moves it
+# one interval further. One number per bucket, so the shared backend needs one conditional write.
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory') # 'memory' (per container), 'dynamodb' (shared) or 'off'
+rate_limit_table_name = os.environ.get('RATE_LIMIT_TABLE_NAME', '') # Partition key 'bucketKey', TTL on 'ttl'
+rate_limit_table = dynamodb.Table(rate_limit_table_name) if rate_limit_table_name else None
+# Polls (GET): per client (browser tab), per source IP (everyone behind one NAT) and per lobby
+CLIENT_RATE_PER_SECOND = float(os.environ.get('RATE_LIMIT_CLIENT_PER_SECOND', '2'))
+CLIENT_BURST = int(os.environ.get('RATE_LIMIT_CLIENT_BURST', '10'))
+IP_RATE_PER_SECOND = float(os.environ.get('RATE_LIMIT_IP_PER_SECOND', '30'))
+IP_BURST = int(os.environ.get('RATE_LIMIT_IP_BURST', '100'))
+LOBBY_RATE_PER_SECOND = float(os.environ.get('RATE_LIMIT_LOBBY_PER_SECOND', '10'))
+LOBBY_BURST = int(os.environ.get('RATE_LIMIT_LOBBY_BURST', '30'))
+# Actions (pick/ban, ready): separate buckets, so polling (or spectators) never uses up a player's turn
+ACTION_CLIENT_RATE_PER_SECOND = float(os.environ.get('RATE_LIMIT_ACTION_CLIENT_PER_SECOND', '1'))
+ACTION_CLIENT_BURST = int(os.environ.get('RATE_LIMIT_ACTION_CLIENT_BURST', '5'))
+ACTION_LOBBY_RATE_PER_SECOND = float(os.environ.get('RATE_LIMIT_ACTION_LOBBY_PER_SECOND', '5'))
+ACTION_LOBBY_BURST = int(os.environ.get('RATE_LIMIT_ACTION_LOBBY_BURST', '10'))
+RATE_LIMIT_MAX_BUCKETS = 10000 # Memory backend: least recently used buckets are dropped beyond this
+
+class TokenBucketLimiter:
+    def __init__(self, backend, store_table=None, max_buckets=RATE_LIMIT_MAX_BUCKETS):
+        self.backend = backend
+        self.store_table = store_table
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict() # bucket key -> full-again time (ms)
+        self.lock = threading.Lock()
+
+    def take(self, bucket_key, rate_per_second, burst):
+        """Takes one token. Returns 0 if allowed, else the seconds until a token is available."""
+        interval_ms = 1000.0 / rate_per_second
+        now_ms = time.time() * 1000
+        # Latest full-again time that still leaves a token (1 ms of slack, so rounding never costs the last token of a burst)
+        limit_ms = now_ms + interval_ms * (burst - 1) + 1
+        if self.backend == 'dynamodb' and self.store_table is not None:
+            return self.take_shared(bucket_key, interval_ms, now_ms, limit_ms)
+        with self.lock:
+            full_at = max(self.buckets.pop(bucket_key, now_ms), now_ms)
+            if full_at > limit_ms:
+                self.buckets[bucket_key] = full_at
+                return (full_at - limit_ms) / 1000
+            self.buckets[bucket_key] = full_at + interval_ms
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+            return 0
+
+    def take_shared(self, bucket_key, interval_ms, now_ms, limit_ms):
+        """Same algorithm on RATE_LIMIT_TABLE_NAME. Fails open: a limiter error never blocks players."""
+        ttl = int(now_ms / 1000) + 3600
+        try:
+            # Common case, an idle (full) bucket: a single write
+            self.store_table.update_item(
+                Key={'bucketKey': bucket_key},
+                UpdateExpression='SET fullAt = :next, #ttl = :ttl',
+                ConditionExpression='attribute_not_exists(fullAt) OR fullAt < :now',
+                ExpressionAttributeNames={'#ttl': 'ttl'},
+                ExpressionAttributeValues={':next': Decimal(int(now_ms + interval_ms)), ':now': Decimal(int(now_ms)), ':ttl': ttl},
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return 0
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+            full_at = float(get_conflicting_item(e)['fullAt'])
+        except Exception as e:
+            print(f"ERROR checking rate limit bucket {bucket_key}: {e}. Allowing request.")
+            return 0
+
+        if full_at > limit_ms:
+            return (full_at - limit_ms) / 1000
+        try:
+            self.store_table.update_item(
+                Key={'bucketKey': bucket_key},
+                UpdateExpression='SET fullAt = :next, #ttl = :ttl',
+                ConditionExpression='fullAt = :seen', # Lost to a concurrent request: allow rather than loop
+                ExpressionAttributeNames={'#ttl': 'ttl'},
+                ExpressionAttributeValues={':next': Decimal(int(full_at + interval_ms)), ':seen': Decimal(int(full_at)), ':ttl': ttl}
+            )
+        except Exception as e:
+            print(f"Rate limit bucket {bucket_key} changed concurrently ({e}). Allowing request.")
+        return 0
+
+rate_limiter = TokenBucketLimiter(RATE_LIMIT_BACKEND, rate_limit_table)
+
+def get_client_id(event):
+    """The per-tab id script.js sends as X-Client-Id, or None."""
+    for header_name, value in (event.get('headers') or {}).items():
+        if header_name.lower() == 'x-client-id' and value and len(value) <= 64:
+            return value
+    return None
+
+def check_rate_limit(event, headers, kind='poll'):
+    """Returns a 429 response if the client or the lobby is over its budget for kind ('poll' or 'action'), else None."""
+    if RATE_LIMIT_BACKEND == 'off':
+        return None
+    client_ip = ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp') or 'unknown'
+    client_id = get_client_id(event)
+    client_key = f"{client_ip}#{client_id}" if client_id else client_ip
+    lobby_code = (event.get('pathParameters') or {}).get('lobbyCode') or ''
+    if kind == 'action':
+        buckets = [(f"action#client#{client_key}", ACTION_CLIENT_RATE_PER_SECOND, ACTION_CLIENT_BURST)]
+        if lobby_code:
+            buckets.append((f"action#lobby#{lobby_code}", ACTION_LOBBY_RATE_PER_SECOND, ACTION_LOBBY_BURST))
+    else:
+        # The client bucket stops one tab (or a pile of restored tabs) polling too fast, and the IP
+        # bucket caps clients that invent ids; the lobby bucket caps a hot lobby so it cannot use up
+        # the read capacity every other lobby shares.
+        buckets = [(f"client#{client_key}", CLIENT_RATE_PER_SECOND, CLIENT_BURST)]
+        if client_id:
+            buckets.append((f"ip#{client_ip}", IP_RATE_PER_SECOND, IP_BURST))
+        if lobby_code:
+            buckets.append((f"lobby#{lobby_code}", LOBBY_RATE_PER_SECOND, LOBBY_BURST))
+    retry_after = 0
+    for bucket_key, rate_per_second, burst in buckets:
+        retry_after = rate_limiter.take(bucket_key, rate_per_second, burst)
+        if retry_after:
+            break
+    if not retry_after:
+        return None
+    retry_after_seconds = max(1, math.ceil(retry_after))
+    print(f"Rate limited {kind} from {client_key} on lobby {lobby_code or '-'} ({bucket_key}); retry after {retry_after_seconds}s")
+    return {
+        'statusCode': 429,
+        'headers': {
+            **headers,
+            'Retry-After': str(retry_after_seconds),
+            'Access-Control-Expose-Headers': ','.join(filter(None, [headers.get('Access-Control-Expose-Headers'), 'Retry-After']))
+        },
+        'body': json.dumps({'error': f'Too many requests, please retry in {retry_after_seconds}s', 'retryAfter': retry_after_seconds})
+    }
@@ -4,81 +4,62 @@ import json
 import boto3
 import os
 import time
-import datetime # Added for schedule creation
-from decimal import Decimal
+import concurrent.futures
+from lobby_common import (
+    append_event, begin_idempotent_request, build_outbox, check_rate_limit, create_schedule,
+    deadline_shard, decimal_to_int, delete_schedule, finish_idempotent_request, get_conflicting_item,
+    get_idempotency_key, get_table, get_turn_duration, LobbyVersionConflict, MAX_WRITE_ATTEMPTS,
+    public_lobby, publish_snapshot, TIMER_MODE, version_condition
+)
 
 dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('TABLE_NAME', 'YourTableNameDefault'))
-scheduler = boto3.client('scheduler') # Added for schedule creation
-handle_timeout_lambda_arn = os.environ.get('HANDLE_TIMEOUT_LAMBDA_ARN', '') # Added for schedule creation
-lambda_role_arn = os.environ.get('LAMBDA_EXECUTION_ROLE_ARN', '') # Added for schedule creation
 
-def create_schedule(lobby_code, game_state, start_time_ms, duration_ms):
-    """Creates the EventBridge schedule for the next timeout."""
-    schedule_name = f"timeout-{lobby_code}-{game_state}"
-    if not handle_timeout_lambda_arn or not lambda_role_arn:
-         print("ERROR: Lambda ARN or Role ARN environment variables not set. Cannot create schedule.")
-         return None
-
-    expiration_time_seconds = (start_time_ms + duration_ms) / 1000
-    schedule_trigger_time_seconds = expiration_time_seconds # 2 REMOVED + 2 buffer
-
-    schedule_dt_utc = datetime.datetime.fromtimestamp(schedule_trigger_time_seconds, tz=datetime.timezone.utc)
-    schedule_time_str = schedule_dt_utc.strftime('%Y-%m-%dT%H:%M:%S')
-
-    try:
-        payload = json.dumps({
-            'lobbyCode': lobby_code,
-            'expectedGameState': game_state # The state that just started
-        })
-        print(f"Attempting to create schedule: {schedule_name} at {schedule_time_str} targeting {handle_timeout_lambda_arn}")
-
-        response = scheduler.create_schedule(
-            Name=schedule_name,
-            GroupName='default', # Use default group or create one if needed
-            ActionAfterCompletion='DELETE',
-            FlexibleTimeWindow={'Mode': 'OFF'},
-            ScheduleExpression=f'at({schedule_time_str})',
-            State='ENABLED',
-            Target={
-                'Arn': handle_timeout_lambda_arn, # ARN of handleTimeout Lambda
-                'RoleArn': lambda_role_arn,      # Execution role ARN passed to scheduler
-                'Input': payload
-            }
-        )
-        print(f"Successfully created schedule: {schedule_name} for time {schedule_time_str}")
-        return schedule_name
-    except scheduler.exceptions.ConflictException:
-         print(f"Schedule {schedule_name} already exists. Assuming it's okay.")
-         return schedule_name
-    except Exception as e:
-        print(f"ERROR creating schedule {schedule_name}: {str(e)}")
-        return None
-
-def delete_schedule(lobby_code, game_state):
-    schedule_name = f"timeout-{lobby_code}-{game_state}"
-    try:
-        print(f"Attempting to delete schedule: {schedule_name}")
-        scheduler.delete_schedule(Name=schedule_name, GroupName='default') # Specify GroupName if not default
-        print(f"Successfully deleted schedule: {schedule_name}")
-    except scheduler.exceptions.ResourceNotFoundException:
-        print(f"Schedule {schedule_name} not found for deletion (normal).")
-    except Exception as e:
-        print(f"ERROR deleting schedule {schedule_name}: {str(e)}")
-
-def decimal_to_int(obj):
-    """Helper to convert Decimal for JSON."""
-    if isinstance(obj, Decimal):
-        return int(obj)
-    raise TypeError
+# --- Side Effects (independent calls after the write, issued concurrently on one reused pool) ---
+# The response waits for the slowest of them rather than their sum. Returning right after the write
+# would let Lambda freeze the container with calls in flight; TIMER_MODE=outbox is the way to take
+# the schedule and snapshot off the request path entirely.
+SIDE_EFFECT_WORKERS = int(os.environ.get('SIDE_EFFECT_WORKERS', '4')) # 0 = run them one after another
+SIDE_EFFECT_TIMEOUT_SECONDS = 5
+side_effect_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SIDE_EFFECT_WORKERS) if SIDE_EFFECT_WORKERS > 0 else None
+
+def run_side_effects(calls):
+    """
+    Runs [(name, function, *args)] concurrently and waits for all of them, since Lambda may freeze
+    the container as soon as the handler returns. Failures are logged per call. Returns {name: result}.
+    """
+    results = {}
+    if side_effect_executor is None:
+        for name, function, *args in calls:
+            try:
+                results[name] = function(*args)
+            except Exception as e:
+                print(f"ERROR in side effect {name}: {e}")
+        return results
+
+    futures = {side_effect_executor.submit(function, *args): name for name, function, *args in calls}
+    done, not_done = concurrent.futures.wait(futures, timeout=SIDE_EFFECT_TIMEOUT_SECONDS)
+    for future in done:
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            print(f"ERROR in side effect {futures[future]}: {e}")
+    for future in not_done:
+        print(f"ERROR: side effect {futures[future]} did not finish within {SIDE_EFFECT_TIMEOUT_SECONDS}s")
+    return results
 
 def get_cors_headers():
      return {
-        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,Idempotency-Key,X-Client-Id',
         'Access-Control-Allow-Origin': '*', # Adjust in production
-        'Access-Control-Allow-Methods': 'POST,OPTIONS'
+        'Access-Control-Allow-Methods': 'POST,OPTIONS',
+        'Access-Control-Expose-Headers': 'X-Server-Time'
     }
 
+def stamp_server_time(response):
+    """Adds the server clock (ms) as late as possible, so clients can align countdowns with turn deadlines."""
+    response['headers'] = {**response.get('headers', {}), 'X-Server-Time': str(int(time.time() * 1000))}
+    return response
+
 def lambda_handler(event, context):
     headers = get_cors_headers()
 
@@ -86,6 +67,31 @@ def lambda_handler(event, context):
         print("Responding to OPTIONS request")
         return {'statusCode': 200, 'headers': headers, 'body': ''}
 
+    limited_response = check_rate_limit(event, headers, 'action')
+    if limited_response:
+        return stamp_server_time(limited_response)
+
+    # A retried or double-clicked action replays the first result instead of acting twice
+    record_key = get_idempotency_key(event, 'action')
+    duplicate_response = begin_idempotent_request(record_key, headers)
+    if duplicate_response:
+        return stamp_server_time(duplicate_response)
+    return stamp_server_time(finish_idempotent_request(record_key, process_pick_with_retries(event, headers)))
+
+def process_pick_with_retries(event, headers):
+    """Runs the pick/ban; on a version conflict it is re-validated against the lobby returned by the failed write."""
+    current_item = None
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        try:
+            return process_pick(event, headers, current_item)
+        except LobbyVersionConflict as conflict:
+            if conflict.current_item is None:
+                return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'Lobby not found'})}
+            current_item = conflict.current_item
+            print(f"Version conflict on pick/ban (attempt {attempt + 1}), re-validating against version {current_item.get('version')}.")
+    return {'statusCode': 409, 'headers': headers, 'body': json.dumps({'error': 'Lobby is changing too quickly, please try again'})}
+
+def process_pick(event, headers, current_item=None):
     try:
         lobby_code = event.get('pathParameters', {}).get('lobbyCode')
         if not lobby_code:
@@ -107,13 +113,16 @@ def lambda_handler(event, context):
 
         print(f"Processing PICK/BAN for lobby {lobby_code}. Requester Role: {player_role_from_request}, Value: {pick_or_ban_value}")
 
-        # --- Get current lobby state ---
+        # --- Get current lobby state (a retry after a version conflict already has it) ---
         try:
-            response = table.get_item(Key={'lobbyCode': lobby_code})
-            if 'Item' not in response:
-                print(f"ERROR: Lobby not found: {lobby_code}")
-                return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'Lobby not found'})}
-            item = response['Item']
+            if current_item is not None:
+                item = current_item
+            else:
+                response = get_table(lobby_code).get_item(Key={'lobbyCode': lobby_code})
+                if 'Item' not in response:
+                    print(f"ERROR: Lobby not found: {lobby_code}")
+                    return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'Lobby not found'})}
+                item = response['Item']
             print(f"Current lobby state for PICK/BAN: {item}")
         except Exception as e:
              print(f"ERROR: Failed to get lobby item: {e}")
@@ -170,7 +179,6 @@ def lambda_handler(event, context):
         # --- New State Machine Logic ---
         next_state = None
         next_player_turn_for_timer = None # Tracks whose turn starts next for timer purposes
-        timer_duration = 30000 # Default duration, adjust as needed per phase
         action_type = None # 'pick' or 'ban'
 
         print(f"DEBUG: New State Machine - State='{current_state}', Resolved Player='{actual_player_slot}'")
@@ -249,64 +257,95 @@ def lambda_handler(event, context):
         if next_state == 'complete':
             # Handle 'complete' state FIRST
             update_expression += ', timerState = :timer'
-            expression_values[':timer'] = {'startTime': None, 'duration': None, 'isActive': False}
+            remove_clause = ' REMOVE turnDeadline, deadlineShard' # Leaves the deadline index
+            expression_values[':timer'] = {'startTime': None, 'duration': None, 'deadline': None, 'isActive': False}
             print("Game complete. Deactivating timer.")
         else:
             # Handle all other active states (where next_state is NOT 'complete')
+            remove_clause = ''
             current_time_ms = int(time.time() * 1000)
+            timer_duration = get_turn_duration(item, next_state) # Length of the phase the next turn belongs to
+            turn_deadline = current_time_ms + timer_duration
             update_expression += ', timerState = :timer'
-            # Ensure timer_duration is defined before this block (it should be)
             expression_values[':timer'] = {
-                'startTime': current_time_ms, 'duration': timer_duration, 'isActive': True
+                'startTime': current_time_ms, 'duration': timer_duration, 'deadline': turn_deadline, 'isActive': True
             }
+            update_expression += ', turnDeadline = :deadline, deadlineShard = :shard'
+            expression_values[':deadline'] = turn_deadline
+            expression_values[':shard'] = deadline_shard(lobby_code)
             print(f"Updating timer for next state '{next_state}'. Start: {current_time_ms}, Duration: {timer_duration}")
         # --- End Restructured Logic ---
 
-        # --- Schedule Deletion Call ---
-        # Delete the schedule for the state that just finished
-        delete_schedule(lobby_code, current_state) # current_state holds the state before this action
-        # --- End Schedule Deletion Call ---
+        # In outbox mode the schedule swap and snapshot commit atomically with the pick
+        if TIMER_MODE == 'outbox':
+            outbox_entries = [{'type': 'deleteSchedule', 'gameState': current_state}, {'type': 'publishSnapshot'}]
+            if next_state != 'complete':
+                outbox_entries.append({'type': 'createSchedule', 'gameState': next_state, 'deadline': turn_deadline})
+            update_expression += ', outbox = :outbox'
+            expression_values[':outbox'] = build_outbox(item, outbox_entries)
+
+        # Every mutation bumps the lobby version, and only applies to the version validated above
+        update_expression += remove_clause + ' ADD version :one'
+        expression_values[':one'] = 1
+        condition_expression, condition_values = version_condition(item)
+        expression_values.update(condition_values)
 
         # Add debug logging for final values
-        print(f"DEBUG: Final values before update for state {next_state}: {json.dumps(expression_values)}")
+        print(f"DEBUG: Final values before update for state {next_state}: {json.dumps(expression_values, default=decimal_to_int)}")
 
         # --- Update DynamoDB ---
         try:
-            update_result = table.update_item(
+            update_result = get_table(lobby_code).update_item(
                 Key={'lobbyCode': lobby_code},
                 UpdateExpression=update_expression,
                 ExpressionAttributeValues=expression_values,
-                ReturnValues='ALL_NEW'
+                ConditionExpression=condition_expression,
+                ReturnValues='ALL_NEW',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
             updated_item = update_result.get('Attributes', {})
             print(f"DynamoDB update successful. New state: {updated_item.get('gameState')}")
 
+            # Everything below depends only on the committed item, not on each other, so it runs
+            # concurrently. It must wait for the commit: deleting the old schedule before a write that
+            # then loses its version check would leave the current turn without a timeout.
+            side_effects = [
+                ('event', lambda: append_event(updated_item, action_type, player=actual_player_slot, value=pick_or_ban_value))
+            ]
+            if TIMER_MODE != 'outbox': # Otherwise published by dispatchOutbox.py
+                side_effects.append(('snapshot', publish_snapshot, updated_item))
+
+            # --- Schedule Deletion Call ---
+            # Delete the schedule for the state that just finished. Safe after the write: a timeout
+            # firing in between fails its own version check and is ignored.
+            if TIMER_MODE == 'scheduler': # The sweeper needs no cleanup, turnDeadline was moved by this write
+                side_effects.append(('delete_schedule', delete_schedule, lobby_code, current_state)) # current_state holds the state before this action
+            # --- End Schedule Deletion Call ---
+
             # --- Schedule Creation Call (if needed) ---
             new_game_state = updated_item.get('gameState')
             new_timer_state = updated_item.get('timerState')
 
             # Check if next state is not complete AND timer is active before scheduling
-            if new_game_state != 'complete' and new_timer_state and new_timer_state.get('isActive'):
-                # Ensure values needed for create_schedule exist AND convert to int
-                start_time = new_timer_state.get('startTime')
-                duration = new_timer_state.get('duration')
-                if start_time is not None and duration is not None:  # Check for None before converting
-                    start_time_int = int(start_time)  # Convert Decimal to int
-                    duration_int = int(duration)   # Convert Decimal to int
+            if TIMER_MODE != 'scheduler':
+                print(f"Timer mode '{TIMER_MODE}': next timeout tracked through {'the outbox' if TIMER_MODE == 'outbox' else 'turnDeadline'}.")
+            elif new_game_state != 'complete' and new_timer_state and new_timer_state.get('isActive'):
+                # Scheduled at the deadline stored in timerState, the same instant clients count down to
+                deadline = new_timer_state.get('deadline')
+                if deadline is not None:
                     print(f"Scheduling next timeout for state: {new_game_state}")
-                    create_schedule(
-                        lobby_code,
-                        new_game_state,
-                        start_time_int,
-                        duration_int
-                    )
+                    side_effects.append(('create_schedule', create_schedule, lobby_code, new_game_state, int(deadline))) # int() converts the Decimal
                 else:
-                    print(f"WARNING: Missing startTime or duration in new timer state for {new_game_state}. Cannot create schedule.")
+                    print(f"WARNING: Missing deadline in new timer state for {new_game_state}. Cannot create schedule.")
 
             elif new_game_state == 'complete':
                 print("Game complete, not scheduling further timeouts.")
             # --- End Schedule Creation Call ---
 
+            side_effect_results = run_side_effects(side_effects)
+            if any(name == 'create_schedule' for name, *_ in side_effects) and not side_effect_results.get('create_schedule'):
+                print(f"ERROR: No timeout schedule for {lobby_code} in {new_game_state}; the turn will not time out.")
+
             return {
                 'statusCode': 200,
                 'headers': headers,
@@ -314,13 +353,17 @@ def lambda_handler(event, context):
                     'message': f'{action_type.capitalize()} successful.',
                     'nextState': next_state,
                     'nextPlayer': next_player_turn_for_timer,
-                    'lobbyState': updated_item
+                    'lobbyState': public_lobby(updated_item)
                 }, default=decimal_to_int)
             }
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+            raise LobbyVersionConflict(get_conflicting_item(e))
         except Exception as e:
             print(f"ERROR: Failed to update lobby state after pick/ban: {e}")
             return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'error': f'Failed to save pick/ban: {str(e)}'})}
 
+    except LobbyVersionConflict:
+        raise # Handled by process_pick_with_retries
     except Exception as e:
         print(f"FATAL ERROR in makePick handler: {str(e)}")
         # (Keep existing fatal error return)
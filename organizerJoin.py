@@ -3,11 +3,12 @@
 
 import json
 import boto3
-import os
-# import time # Needed if you add TTL or timestamps
+from lobby_common import (
+    append_event, decimal_to_int, get_conflicting_item, get_table, MAX_WRITE_ATTEMPTS,
+    public_lobby, publish_snapshot, version_condition
+)
 
 dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['TABLE_NAME']) # Assumes TABLE_NAME env var is set
 
 def lambda_handler(event, context):
     # Standard headers for CORS and JSON
@@ -36,65 +37,100 @@ def lambda_handler(event, context):
             raise ValueError("Invalid or missing request body/playerName.")
         # --- End of insecure name extraction ---
 
-        # --- Step 2: Fetch Lobby Data ---
-        response = table.get_item(Key={'lobbyCode': lobby_code})
-        item = response.get('Item')
+        # --- Step 2: Claim a Slot without a Separate Read ---
+        # The first write assumes the organizer is joining an empty lobby and checks that together with
+        # the organizer name, so the common case is a single round trip. If any part of the condition
+        # fails, the lobby returned by the failed write drives steps 3-6 and a version-conditioned retry.
+        item = None
+        for attempt in range(MAX_WRITE_ATTEMPTS + 1):
+            if item is None:
+                assigned_slot = 'player1'
+                update_expression = 'SET player1 = :playerName'
+                expression_attribute_values = {':playerName': requesting_player_name, ':one': 1, ':empty': ''}
+                condition_expression = 'organizerName = :playerName AND player1 = :empty AND player2 = :empty'
+                condition_values = {}
+            else:
+                # --- Step 3: Authorize - Check if name from BODY matches stored organizerName ---
+                stored_organizer_name = item.get('organizerName')
+                # Note: This check relies on trusting the requesting_player_name from the body
+                if not stored_organizer_name or requesting_player_name != stored_organizer_name:
+                    # Although insecure, we still perform the check based on the (untrusted) input
+                    print(f"Auth fail: Input name '{requesting_player_name}' != Stored name '{stored_organizer_name}'")
+                    return {
+                        'statusCode': 403, # Forbidden (based on untrusted input)
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Provided player name does not match organizer.'})
+                    }
 
-        if not item:
-            return {
-                'statusCode': 404,
-                'headers': headers,
-                'body': json.dumps({'error': 'Lobby not found.'})
-            }
-
-        # --- Step 3: Authorize - Check if name from BODY matches stored organizerName ---
-        stored_organizer_name = item.get('organizerName')
-        # Note: This check relies on trusting the requesting_player_name from the body
-        if not stored_organizer_name or requesting_player_name != stored_organizer_name:
-            # Although insecure, we still perform the check based on the (untrusted) input
-            print(f"Auth fail: Input name '{requesting_player_name}' != Stored name '{stored_organizer_name}'")
-            return {
-                'statusCode': 403, # Forbidden (based on untrusted input)
-                'headers': headers,
-                'body': json.dumps({'error': 'Provided player name does not match organizer.'})
-            }
+                # --- Step 4: Check Player Slots ---
+                player1 = item.get('player1', '') # Default to empty string if attribute missing
+                player2 = item.get('player2', '')
 
-        # --- Step 4: Check Player Slots ---
-        player1 = item.get('player1', '') # Default to empty string if attribute missing
-        player2 = item.get('player2', '')
+                assigned_slot = None
+                # Check if player1 slot is free
+                if not player1:
+                    assigned_slot = 'player1'
+                # Else check if player2 slot is free AND organizer isn't already player1
+                elif not player2 and player1 != requesting_player_name:
+                    assigned_slot = 'player2'
+                # Else check edge cases: organizer is already player1 or player2
+                elif player1 == requesting_player_name or player2 == requesting_player_name:
+                     return {
+                         'statusCode': 400, # Bad Request
+                         'headers': headers,
+                         'body': json.dumps({'error': 'Organizer is already in a player slot.'})
+                     }
 
-        assigned_slot = None
-        # Check if player1 slot is free
-        if not player1:
-            assigned_slot = 'player1'
-        # Else check if player2 slot is free AND organizer isn't already player1
-        elif not player2 and player1 != requesting_player_name:
-            assigned_slot = 'player2'
-        # Else check edge cases: organizer is already player1 or player2
-        elif player1 == requesting_player_name or player2 == requesting_player_name:
-             return {
-                 'statusCode': 400, # Bad Request
-                 'headers': headers,
-                 'body': json.dumps({'error': 'Organizer is already in a player slot.'})
-             }
+                # --- Step 5: Handle Full Lobby ---
+                if assigned_slot is None:
+                    # This means both slots were filled and neither was the organizer themselves
+                    return {
+                        'statusCode': 409, # Conflict - Lobby is full
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Lobby is full'})
+                    }
 
-        # --- Step 5: Handle Full Lobby ---
-        if assigned_slot is None:
-            # This means both slots were filled and neither was the organizer themselves
+                # --- Step 6: Update Lobby Item (only if it is still at the version returned) ---
+                update_expression = f'SET {assigned_slot} = :playerName'
+                expression_attribute_values = {
+                    ':playerName': requesting_player_name, # Use the name from the body
+                    ':one': 1
+                }
+                other_slot = 'player2' if assigned_slot == 'player1' else 'player1'
+                if item.get(other_slot, '') and item.get('gameState') == 'waiting':
+                    # The organizer fills the lobby: move to the ready check in the same write
+                    update_expression += ', gameState = :readyCheck'
+                    expression_attribute_values[':readyCheck'] = 'ready_check'
+                condition_expression, condition_values = version_condition(item)
+            try:
+                update_response = get_table(lobby_code).update_item(
+                    Key={'lobbyCode': lobby_code},
+                    UpdateExpression=update_expression + ' ADD version :one',
+                    ConditionExpression=condition_expression,
+                    ExpressionAttributeValues={**expression_attribute_values, **condition_values},
+                    ReturnValues='ALL_NEW',
+                    ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                )
+                break
+            except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+                item = get_conflicting_item(e)
+                print(f"Conditional write failed on organizer join for {lobby_code} (attempt {attempt + 1}), re-evaluating.")
+                if item is None:
+                    return {
+                        'statusCode': 404,
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Lobby not found.'})
+                    }
+        else:
             return {
-                'statusCode': 409, # Conflict - Lobby is full
+                'statusCode': 409,
                 'headers': headers,
-                'body': json.dumps({'error': 'Lobby is full'})
+                'body': json.dumps({'error': 'Lobby is changing too quickly, please try again.'})
             }
 
-        # --- Step 6: Update Lobby Item ---
-        table.update_item(
-            Key={'lobbyCode': lobby_code},
-            UpdateExpression=f'SET {assigned_slot} = :playerName',
-            ExpressionAttributeValues={
-                ':playerName': requesting_player_name # Use the name from the body
-            }
-        )
+        updated_item = update_response.get('Attributes')
+        publish_snapshot(updated_item)
+        append_event(updated_item, 'join', player=assigned_slot, name=requesting_player_name, organizer=True)
 
         # --- Step 7: Return Success ---
         return {
@@ -103,8 +139,9 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'message': f'Organizer joined successfully as {assigned_slot}',
                 'assignedSlot': assigned_slot,
-                'newRole': 'organizer_player' # Critical: Tell frontend the new role
-            })
+                'newRole': 'organizer_player', # Critical: Tell frontend the new role
+                'lobbyState': public_lobby(updated_item) # Rendered right away, no follow-up GET needed
+            }, default=decimal_to_int)
         }
 
     except ValueError as ve: # Catch errors from input validation or body parsing
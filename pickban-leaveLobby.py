@@ -1,10 +1,8 @@
 import json
 import boto3
-import os
-from decimal import Decimal
+from lobby_common import append_event, decimal_to_int, get_conflicting_item, get_table, public_lobby, publish_snapshot
 
 dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
 
 def get_cors_headers():
     return {
@@ -13,12 +11,6 @@ def get_cors_headers():
         'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
     }
 
-def decimal_to_int(obj):
-    """Convert Decimal objects to integers for JSON serialization."""
-    if isinstance(obj, Decimal):
-        return int(obj)
-    raise TypeError
-
 def lambda_handler(event, context):
     if event.get('httpMethod') == 'OPTIONS':
         return {
@@ -42,42 +34,38 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Invalid or missing player role in request body'})
             }
 
-        # First get the current lobby state
-        response = table.get_item(Key={'lobbyCode': lobby_code})
-        if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': get_cors_headers(),
-                'body': json.dumps({'error': 'Lobby not found'})
-            }
-
-        item = response['Item']
-        
-        # Check if the player is actually in the lobby
-        if item.get(player_role) == '':
-            return {
-                'statusCode': 400,
-                'headers': get_cors_headers(),
-                'body': json.dumps({'error': f'Player {player_role} is not in the lobby'})
-            }
-
-        # --- Update DynamoDB ---
-        # Simply clear the leaving player's slot
-        update_expression = f"SET {player_role} = :empty, picks = :empty_list, bans = :empty_list, gameState = :waiting"
+        # --- Update DynamoDB (one round trip) ---
+        # Simply clear the leaving player's slot. The result does not depend on the rest of the lobby, so
+        # the only condition is that the player is in it; the failed write's item tells 404 from 400.
+        update_expression = f"SET {player_role} = :empty, picks = :empty_list, bans = :empty_list, gameState = :waiting REMOVE turnDeadline, deadlineShard ADD version :one"
         expression_attribute_values = {
             ':empty': '',
             ':empty_list': [],
-            ':waiting': 'waiting'
+            ':waiting': 'waiting',
+            ':one': 1
         }
 
         try:
-            table.update_item(
+            update_response = get_table(lobby_code).update_item(
                 Key={'lobbyCode': lobby_code},
                 UpdateExpression=update_expression,
                 ExpressionAttributeValues=expression_attribute_values,
-                ReturnValues="UPDATED_NEW",
-                ConditionExpression="attribute_exists(lobbyCode)"
+                ReturnValues="ALL_NEW",
+                ConditionExpression=f"{player_role} <> :empty", # player_role is validated above
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+            if get_conflicting_item(e) is None:
+                return {
+                    'statusCode': 404,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'error': 'Lobby not found'})
+                }
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': f'Player {player_role} is not in the lobby'})
+            }
         except Exception as e:
             print(f"Error updating DynamoDB: {str(e)}")
             return {
@@ -86,9 +74,10 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Failed to update lobby state'})
             }
 
-        # Get the updated item to return
-        updated_response = table.get_item(Key={'lobbyCode': lobby_code})
-        updated_item = updated_response.get('Item', {})
+        # The update already returned the full new item, no need to read it again
+        updated_item = update_response.get('Attributes', {})
+        publish_snapshot(updated_item)
+        append_event(updated_item, 'leave', player=player_role)
 
         # Ensure we're not returning empty player slots
         if 'player1' in updated_item:
@@ -101,16 +90,10 @@ def lambda_handler(event, context):
             'headers': get_cors_headers(),
             'body': json.dumps({
                 'message': f'Successfully removed {player_role} and reset lobby state',
-                'lobbyData': updated_item
+                'lobbyData': public_lobby(updated_item)
             }, default=decimal_to_int)
         }
 
-    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
-        return {
-            'statusCode': 404,
-            'headers': get_cors_headers(),
-            'body': json.dumps({'error': 'Lobby not found'})
-        }
     except Exception as e:
         print(f"Error leaving lobby: {e}")  # Log the error
         return {
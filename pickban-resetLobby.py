@@ -2,18 +2,9 @@
 
 import json
 import boto3
-import os
-from decimal import Decimal # Import Decimal if needed for response serialization
+from lobby_common import append_event, decimal_to_int, get_conflicting_item, get_table, public_lobby, publish_snapshot
 
 dynamodb = boto3.resource('dynamodb')
-# Ensure your environment variable is correctly set in Lambda configuration
-table = dynamodb.Table(os.environ.get('TABLE_NAME', 'YourTableNameDefault')) # Added default for safety
-
-def decimal_to_int(obj):
-    """Helper to convert Decimal for JSON if needed."""
-    if isinstance(obj, Decimal):
-        return int(obj)
-    raise TypeError
 
 def get_cors_headers():
     return {
@@ -38,7 +29,7 @@ def lambda_handler(event, context):
 
         print(f"Processing RESET request for lobby: {lobby_code}")
 
-        # --- Authorization Check (Only Organizer) ---
+        # --- Organizer Name (only the organizer may reset; checked by the write below) ---
         try:
             body = json.loads(event.get('body', '{}'))
             # Assuming frontend sends organizer's name for verification (as done in deleteLobby)
@@ -49,26 +40,7 @@ def lambda_handler(event, context):
             print(f"ERROR: Invalid request body: {e}")
             return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': f'Invalid request body: {str(e)}'})}
 
-        try:
-            # Get the lobby to check the organizer name
-            response = table.get_item(Key={'lobbyCode': lobby_code})
-            if 'Item' not in response:
-                print(f"ERROR: Lobby not found: {lobby_code}")
-                return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'Lobby not found'})}
-            item = response['Item']
-
-            stored_organizer_name = item.get('organizerName')
-            # Perform the check
-            if not stored_organizer_name or requesting_player_name != stored_organizer_name:
-                print(f"AUTH FAIL: Request name '{requesting_player_name}' != Stored organizer '{stored_organizer_name}'")
-                return {'statusCode': 403, 'headers': headers, 'body': json.dumps({'error': 'Only the organizer can reset the lobby'})}
-            print("Authorization successful.")
-
-        except Exception as e:
-            print(f"ERROR: Failed during auth/get item: {e}")
-            return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'error': 'Failed to retrieve lobby data for authorization'})}
-
-        # --- Perform Reset Update (Modified) ---
+        # --- Perform Reset Update (Authorization Check folded into the write: one round trip) ---
         print(f"Attempting full reset for lobby: {lobby_code}")
         update_expression = (
             "SET gameState = :newState, "
@@ -76,43 +48,56 @@ def lambda_handler(event, context):
             "player2Ready = :notReady, "
             "picks = :emptyList, "
             "bans = :emptyList, "
-            "timerState = :emptyTimer"
+            "timerState = :emptyTimer "
+            "REMOVE turnDeadline, deadlineShard " # No turn is running, so no timeout is due
+            "ADD version :one"
         )
         expression_attribute_values = {
             ':newState': 'ready_check',     # Set state to ready_check
             ':notReady': False,             # Reset ready flags
             ':emptyList': [],               # Clear picks and bans
-            ':emptyTimer': {'startTime': None, 'duration': None, 'isActive': False} # Reset timer
+            ':emptyTimer': {'startTime': None, 'duration': None, 'deadline': None, 'isActive': False}, # Reset timer
+            ':one': 1,                       # Bump lobby version
+            ':requester': requesting_player_name
         }
 
+        # The reset overwrites everything it touches, so it needs no version check: only the organizer
+        # check, which also fails for a missing lobby. The failed write's item tells 404 from 403.
         try:
-            response = table.update_item(
+            response = get_table(lobby_code).update_item(
                 Key={'lobbyCode': lobby_code},
                 UpdateExpression=update_expression,
                 ExpressionAttributeValues=expression_attribute_values,
                 ReturnValues="ALL_NEW", # Get the updated item back
-                ConditionExpression="attribute_exists(lobbyCode)" # Make sure lobby exists
+                ConditionExpression='organizerName = :requester',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
-            updated_item = response.get('Attributes', {}) # Get the updated item
-            print(f"Reset successful. New state: {updated_item}")
-
-            return {
-                'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps({
-                    'message': 'Lobby reset successfully to ready_check state.',
-                    # Return the full updated state
-                    'lobbyState': updated_item
-                }, default=decimal_to_int) # Use helper if needed for Decimals
-            }
-
-        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
-            print(f"ERROR: Lobby {lobby_code} not found during reset update.")
-            return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'Lobby not found'})}
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+            item = get_conflicting_item(e)
+            if item is None:
+                print(f"ERROR: Lobby not found: {lobby_code}")
+                return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'Lobby not found'})}
+            print(f"AUTH FAIL: Request name '{requesting_player_name}' != Stored organizer '{item.get('organizerName')}'")
+            return {'statusCode': 403, 'headers': headers, 'body': json.dumps({'error': 'Only the organizer can reset the lobby'})}
         except Exception as e:
             print(f"Error resetting lobby: {e}")  # Log the error
             return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'error': f'Could not reset lobby: {str(e)}'})}
 
+        updated_item = response.get('Attributes', {}) # Get the updated item
+        print(f"Reset successful. New state: {updated_item}")
+        publish_snapshot(updated_item)
+        append_event(updated_item, 'reset')
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'message': 'Lobby reset successfully to ready_check state.',
+                # Return the full updated state
+                'lobbyState': public_lobby(updated_item)
+            }, default=decimal_to_int) # Use helper if needed for Decimals
+        }
+
     except Exception as e:
          # Catch any unexpected errors at the top level
         print(f"FATAL ERROR in resetLobby handler: {str(e)}")
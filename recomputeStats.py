@@ -0,0 +1,146 @@
+# Offline tool: rebuild pick/ban statistics from archived drafts in one streaming pass.
+#
+# Reads newline-delimited JSON lobby records (.ndjson / .jsonl, optionally gzip-compressed,
+# e.g. the files written by the lobby archiver) and counts picks/bans of completed drafts (every pick
+# and ban made, the same rule as aggregateStats.py)
+# with collections.Counter. Drafts are read one line at a time, so memory stays bounded by the
+# number of distinct resonator ids, not the number of drafts.
+#
+# Usage:
+#   python recomputeStats.py archive/ --catalog resonators.json > stats.json
+#   STATS_TABLE_NAME=MyLobbyStats python recomputeStats.py archive/ --write
+#
+# Standard library only; boto3 is only needed with --write.
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+MAX_PICKS = 6       # pick1 x4 + pick2 x2
+MAX_BANS = 4        # ban1 x2 + ban2 x2
+
+def is_full_draft(draft):
+    """Same rule as lobby_common.is_full_draft (not imported: this tool runs without boto3)."""
+    return draft.get('gameState') == 'complete' and len(draft.get('picks') or []) == MAX_PICKS and len(draft.get('bans') or []) == MAX_BANS
+
+def iter_input_files(paths):
+    """Yields every .ndjson/.jsonl(.gz) file under the given files/directories, in sorted order."""
+    suffixes = ('.ndjson', '.jsonl', '.ndjson.gz', '.jsonl.gz')
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                for name in sorted(files):
+                    if name.endswith(suffixes):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def iter_drafts(paths):
+    """Yields full completed drafts (dicts) one at a time from the input files."""
+    for file_path in iter_input_files(paths):
+        opener = gzip.open if file_path.endswith('.gz') else open
+        with opener(file_path, 'rt', encoding='utf-8') as input_file:
+            for line in input_file:
+                if not line.strip():
+                    continue
+                draft = json.loads(line)
+                if is_full_draft(draft):
+                    yield draft
+
+def count_drafts(draft_iter):
+    """Returns (drafts, pick_counts, ban_counts), the counts being Counters keyed by resonator id."""
+    pick_counts = Counter()
+    ban_counts = Counter()
+    drafts = 0
+    for draft in draft_iter:
+        pick_counts.update(draft.get('picks', [])[:MAX_PICKS])
+        ban_counts.update(draft.get('bans', [])[:MAX_BANS])
+        drafts += 1
+    return drafts, pick_counts, ban_counts
+
+def compute_stats(catalog, drafts, pick_counts, ban_counts):
+    """Computes every rate from the counts. Output matches getStats.py."""
+    known_ids = {resonator['id'] for resonator in catalog}
+    total_picks = sum(pick_counts.values())
+    total_bans = sum(ban_counts.values())
+
+    element_picks = Counter()
+    element_bans = Counter()
+    for resonator in catalog:
+        for element in set(resonator.get('element', [])):
+            element_picks[element] += pick_counts[resonator['id']]
+            element_bans[element] += ban_counts[resonator['id']]
+    elements = sorted({element for resonator in catalog for element in resonator.get('element', [])})
+
+    # Most banned first, then most picked; ties keep catalog order (sorted is stable)
+    order = sorted(catalog, key=lambda resonator: (-ban_counts[resonator['id']], -pick_counts[resonator['id']]))
+    resonators = [
+        {
+            'id': resonator['id'],
+            'name': resonator['name'],
+            'picks': pick_counts[resonator['id']],
+            'bans': ban_counts[resonator['id']],
+            'pickRate': round(pick_counts[resonator['id']] / drafts, 4) if drafts else 0.0,
+            'banRate': round(ban_counts[resonator['id']] / drafts, 4) if drafts else 0.0
+        }
+        for resonator in order
+    ]
+    return {
+        'totals': {'drafts': drafts, 'picks': total_picks, 'bans': total_bans},
+        'unknownIds': {
+            'picks': sum(count for resonator_id, count in pick_counts.items() if resonator_id not in known_ids),
+            'bans': sum(count for resonator_id, count in ban_counts.items() if resonator_id not in known_ids)
+        },
+        'resonators': resonators,
+        'elements': [
+            {
+                'element': element,
+                'picks': element_picks[element],
+                'bans': element_bans[element],
+                'pickRate': round(element_picks[element] / total_picks, 4) if total_picks else 0.0
+            }
+            for element in elements
+        ]
+    }
+
+def write_counters(stats):
+    """Overwrites the live counters used by aggregateStats.py/getStats.py with the recomputed values."""
+    import boto3
+    stats_table = boto3.resource('dynamodb').Table(os.environ['STATS_TABLE_NAME'])
+    with stats_table.batch_writer() as batch:
+        batch.put_item(Item={'scope': 'global', 'statKey': 'totals', **stats['totals']})
+        for resonator in stats['resonators']:
+            batch.put_item(Item={
+                'scope': 'global',
+                'statKey': f"resonator#{resonator['id']}",
+                'picks': resonator['picks'],
+                'bans': resonator['bans']
+            })
+    print(f"Wrote {len(stats['resonators']) + 1} counter items to {stats_table.name}", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recompute pick/ban statistics from archived drafts.')
+    parser.add_argument('paths', nargs='+', help='NDJSON files or directories (gzip supported)')
+    parser.add_argument('--catalog', default='resonators.json', help='Path to resonators.json')
+    parser.add_argument('--write', action='store_true', help='Overwrite the counters in STATS_TABLE_NAME')
+    args = parser.parse_args(argv)
+
+    with open(args.catalog, encoding='utf-8') as catalog_file:
+        catalog = json.load(catalog_file)
+
+    started = time.perf_counter()
+    drafts, pick_counts, ban_counts = count_drafts(iter_drafts(args.paths))
+    stats = compute_stats(catalog, drafts, pick_counts, ban_counts)
+    print(f"Processed {drafts} drafts in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+    if args.write:
+        write_counters(stats)
+    json.dump(stats, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -3,14 +3,23 @@
 const apiBaseUrl = "https://ilzcew85i3.execute-api.us-east-1.amazonaws.com/dev"; // Your API URL
 const ICON_BASE_URL = "https://pick-ban-test-2023-10-27.s3.us-east-1.amazonaws.com/images/icons/";
 let updateInterval; // Store the interval ID globally
+let pollingResumeTimeout = null; // Set while polling is paused after a 429
+let actionsPausedUntil = 0; // Set while pick/ban and ready controls wait out an action 429
 let resonators = []; // Initialize as empty array
 let timerInterval;
 let readyCheckInterval;
-let clientSideTimerInterval = null; // Variable to hold the interval ID for client-side timers
+let countdownState = null; // { endTime, selector, shownSecond } while a turn countdown is running
+let countdownWakeTimeout = null; // Wakes the render loop when the displayed second changes
 const READY_CHECK_INTERVAL = 3000; // Check ready status every 3 seconds
 const GAME_START_COUNTDOWN = 5; // 5 second countdown before game starts
 let isCurrentTurnTimedOut = false; // Flag to track local timeout state
 let previousLobbyState = null; // Track previous lobby state for notifications
+let knownLobbyVersion = 0; // Highest lobby version seen (polls and action responses), sent with GETs
+// Per-tab id sent as X-Client-Id, so the server rate-limits each tab rather than everyone behind one IP
+const clientId = sessionStorage.getItem("clientId") || (crypto.randomUUID ? crypto.randomUUID() : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`);
+sessionStorage.setItem("clientId", clientId);
+let serverClockOffsetMs = 0; // Server clock minus local clock (from X-Server-Time), applied to turn deadlines
+let serverClockSamples = 0;
 
 // --- Filter Functions ---
 
@@ -197,6 +206,8 @@ function updateButtonVisibility() {
 
 // --- Helper function to clear local state and UI ---
 function clearLocalLobbyState() {
+    knownLobbyVersion = 0;
+    pendingRenders.clear(); // A queued render of the old lobby must not run after this
     localStorage.removeItem("lobbyCode");
     localStorage.removeItem("role");
     localStorage.removeItem("playerName");
@@ -277,9 +288,7 @@ createLobbyBtn.addEventListener("click", async () => {
             localStorage.setItem("playerName", playerName);
             showLobbyView(true);
             updateButtonVisibility();
-            stopPolling();
-            startPolling();
-            updateLobbyData();
+            startPolling(); // Polls right away, the create response has no lobby state
 
             // Add highlight effect to lobby info
             const lobbyInfo = document.querySelector('.lobby-info');
@@ -322,60 +331,24 @@ joinLobbyBtn.addEventListener("click", async () => {
     }
 
     try {
-        // First get the current lobby state to check available slots
-        const lobbyResponse = await fetch(`${apiBaseUrl}/lobbies/${lobbyCode}`, {
-            method: "GET",
-            headers: { "Content-Type": "application/json" },
-        });
-
-        if (!lobbyResponse.ok) {
-            const errorData = await lobbyResponse.json();
-            if (errorData.error === "Lobby not found") {
-                alert("Cannot join: This lobby code does not exist");
-            } else {
-                alert(`Error checking lobby: ${errorData.error || lobbyResponse.statusText}`);
-            }
-            return;
-        }
-
-        const lobbyData = await lobbyResponse.json();
-        
-        // Determine which slot to join
-        let playerRole;
-        
-        // If player1 slot is empty, any player (including returning player1) takes it
-        if (lobbyData.player1 === '') {
-            playerRole = 'player1';
-        } else if (lobbyData.player2 === '') {
-            playerRole = 'player2';
-        } else {
-            alert("Cannot join: This lobby is already full");
-            return;
-        }
-
-        // Now join the lobby with the determined role
+        // joinLobby.py picks the slot (pre-assigned, first empty, or full) against the lobby it reads
         const response = await fetch(`${apiBaseUrl}/lobbies/${lobbyCode}/join`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ 
-                [playerRole]: playerName,
-                playerName: playerName // Include both for backwards compatibility
-            })
+            body: JSON.stringify({ playerName: playerName })
         });
 
         if (response.ok) {
             const data = await response.json();
             console.log("Join lobby response:", data);
-            
+
             localStorage.setItem("lobbyCode", lobbyCode);
-            localStorage.setItem("role", playerRole);
+            localStorage.setItem("role", data.role); // Backend decides the slot
             localStorage.setItem("playerName", playerName);
             
             showLobbyView(true);
             updateButtonVisibility();
-            stopPolling();
-            startPolling();
-            updateLobbyData();
+            applyActionResult(data.lobbyData);
         } else {
             const errorData = await response.json();
             console.error("Error joining lobby:", errorData);
@@ -385,6 +358,8 @@ joinLobbyBtn.addEventListener("click", async () => {
                 alert("Cannot join: This lobby is already full");
             } else if (errorData.error === "Lobby not found") {
                 alert("Cannot join: This lobby code does not exist");
+            } else if (errorData.error === "Player is already in this lobby") {
+                alert("Cannot join: Someone with this name is already in the lobby");
             } else {
                 alert(`Error joining lobby: ${errorData.error || response.statusText}`);
             }
@@ -427,8 +402,8 @@ resetLobbyBtn.addEventListener("click", async () => {
         const data = await response.json();
         if (response.ok) {
             console.log("resetLobby response:", data);
+            applyActionResult(data.lobbyState); // Refresh UI
             alert("Lobby reset successfully.");
-            updateLobbyData(); // Refresh UI
         } else {
             console.error("Reset lobby failed with status:", response.status, "Data:", data);
             alert(`Error resetting lobby: ${data.error || response.statusText}`);
@@ -584,7 +559,7 @@ organizerJoinBtn.addEventListener("click", async () => {
 
                 // Refresh UI immediately
                 updateButtonVisibility();
-                updateLobbyData(); // Fetch latest lobby state to show the user in player slot
+                applyActionResult(data.lobbyState); // Shows the user in their player slot
 
                 // Optional: Provide feedback
                 // outputDiv.innerHTML = "<p>Successfully joined as player.</p>"; // Might be overwritten by updateLobbyData
@@ -620,6 +595,84 @@ organizerJoinBtn.addEventListener("click", async () => {
     }
 });
 
+// Remembers the newest lobby version this client has seen, so the next GET can ask for a
+// strongly consistent read if an eventually consistent one comes back older.
+function rememberLobbyVersion(lobbyState) {
+    if (lobbyState && typeof lobbyState.version === "number" && lobbyState.version > knownLobbyVersion) {
+        knownLobbyVersion = lobbyState.version;
+    }
+}
+
+// Expands the positional ?format=compact lobby state (see encode_compact in getLobby.py)
+// into the same object the plain JSON format returns.
+function decodeCompactLobbyState(state) {
+    if (!Array.isArray(state)) return state; // Already a plain lobby object
+    const [formatVersion, lobbyCode, version, gameState, player1, player2, readyBits, picks, bans, timer, organizerName, eventId] = state;
+    if (formatVersion !== 1) throw new Error(`Unsupported compact lobby format: ${formatVersion}`);
+    return {
+        lobbyCode, version, gameState, player1, player2,
+        player1Ready: (readyBits & 1) !== 0,
+        player2Ready: (readyBits & 2) !== 0,
+        picks, bans,
+        timerState: { startTime: timer[0], duration: timer[1], deadline: timer[2], isActive: timer[3] === 1 },
+        organizerName,
+        eventId: eventId || undefined
+    };
+}
+
+// Estimates the server clock from the X-Server-Time response header, assuming the server
+// answered halfway through the round trip. Countdowns use it to end exactly at the server's deadline.
+function rememberServerTime(response, requestStartedAt) {
+    const serverTime = Number(response.headers.get("X-Server-Time"));
+    if (!serverTime) return;
+    const sample = serverTime - (requestStartedAt + Date.now()) / 2;
+    // Smooth out network jitter once a first estimate exists
+    serverClockOffsetMs = serverClockSamples === 0 ? sample : serverClockOffsetMs * 0.8 + sample * 0.2;
+    serverClockSamples++;
+}
+
+// --- Idempotent Actions ---
+// The key is built from the lobby version this client acted on, so a double click or a
+// retried request carries the same key and the server replays the first result instead
+// of applying the action twice.
+function buildIdempotencyKey(lobbyCode, role, action, value) {
+    const version = previousLobbyState && previousLobbyState.version !== undefined ? previousLobbyState.version : 'na';
+    return [lobbyCode, role, version, action, value].join('-');
+}
+
+async function postAction(url, payload, idempotencyKey) {
+    const options = {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey, "X-Client-Id": clientId },
+        body: JSON.stringify(payload),
+    };
+    let response;
+    try {
+        response = await fetch(url, options);
+    } catch (error) {
+        // Safe to resend once: the key makes the server apply the action at most once
+        console.warn("Action request failed, retrying once with the same Idempotency-Key:", error);
+        return fetch(url, options);
+    }
+    if (response.status !== 429) return response;
+
+    // Rate limited: wait out Retry-After with the controls disabled, then resend once. If that
+    // is limited too, the caller shows the server's "please retry in Ns" error.
+    await pauseActions(Number(response.headers.get("Retry-After")) || 1);
+    return fetch(url, options);
+}
+
+// Disables the pick/ban and ready controls for Retry-After seconds. Renders during the pause
+// keep them disabled (see updateCharacterButtonStyles); the next render after it re-enables them.
+function pauseActions(retryAfterSeconds) {
+    const delayMs = retryAfterSeconds * 1000;
+    console.warn(`Action rate limited by the server, retrying in ${delayMs} ms`);
+    actionsPausedUntil = Date.now() + delayMs;
+    document.querySelectorAll('.character-button').forEach(button => { button.disabled = true; });
+    if (readyButton) readyButton.disabled = true;
+    return new Promise(resolve => setTimeout(resolve, delayMs));
+}
+
 // --- Pick Functionality ---
 async function makePick(pickId) {
     console.log("makePick called with:", pickId);
@@ -644,15 +697,20 @@ async function makePick(pickId) {
     console.log("Sending pick/ban request with payload:", JSON.stringify(payload));
 
     try {
-        const response = await fetch(`${apiBaseUrl}/lobbies/${lobbyCode}/action`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify(payload),
-        });
+        const requestStartedAt = Date.now();
+        const response = await postAction(
+            `${apiBaseUrl}/lobbies/${lobbyCode}/action`,
+            payload,
+            buildIdempotencyKey(lobbyCode, player, "pick", pickId)
+        );
+        rememberServerTime(response, requestStartedAt);
         const data = await response.json(); // Attempt to parse JSON regardless of status
-        if (response.ok) {
+        if (response.status === 409) {
+            console.log("Pick/ban already in progress, refreshing lobby state.");
+            updateLobbyData();
+        } else if (response.ok) {
             console.log("makePick response:", data);
-            updateLobbyData(); // Refresh data after pick/ban
+            applyActionResult(data.lobbyState);
         } else {
             console.error("Error making pick/ban:", response.status, data);
              alert(`Error making pick/ban: ${data.error || response.statusText}`);
@@ -676,10 +734,18 @@ async function updateLobbyData() {
     }
 
     try {
-        const response = await fetch(`${apiBaseUrl}/lobbies/${lobbyCode}`, {
+        const requestStartedAt = Date.now();
+        const response = await fetch(`${apiBaseUrl}/lobbies/${lobbyCode}?knownVersion=${knownLobbyVersion}&format=compact`, {
             method: "GET",
-            headers: { "Content-Type": "application/json" },
+            headers: { "Content-Type": "application/json", "X-Client-Id": clientId },
         });
+        rememberServerTime(response, requestStartedAt);
+
+        if (response.status === 429) {
+            // Rate limited: keep the lobby, just back off for as long as the server asks
+            pausePolling(Number(response.headers.get("Retry-After")) || 1);
+            return;
+        }
 
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({ error: response.statusText }));
@@ -696,141 +762,98 @@ async function updateLobbyData() {
             return;
         }
 
-        const newLobbyState = await response.json(); // <<< Assign fetched data
+        const newLobbyState = decodeCompactLobbyState(await response.json()); // <<< Assign fetched data
         console.log("   Lobby Data:", newLobbyState);
+        applyLobbyState(newLobbyState, lobbyCode, currentRole, currentName);
 
-        // Check if a player slot became empty compared to the previous state
-        if (previousLobbyState && 
-            previousLobbyState.player1 && previousLobbyState.player2 && // BOTH slots were filled previously
-           (!newLobbyState.player1 || !newLobbyState.player2) && // AND at least one slot is empty NOW
-           (previousLobbyState.player1 !== newLobbyState.player1 || previousLobbyState.player2 !== newLobbyState.player2) // AND a name actually changed (ensures it wasn't just a gameState change)
-           ) { 
-
-            let leavingPlayerName = null;
-            let remainingPlayerName = null;
-            let leftPlayerSlotId = null; 
-
-            // Determine who left and who remains
-            if (previousLobbyState.player1 && !newLobbyState.player1) { // P1 left
-                leavingPlayerName = previousLobbyState.player1;
-                remainingPlayerName = newLobbyState.player2; // P2 might remain
-                leftPlayerSlotId = 'player1Name'; 
-            } else if (previousLobbyState.player2 && !newLobbyState.player2) { // P2 left
-                leavingPlayerName = previousLobbyState.player2;
-                remainingPlayerName = newLobbyState.player1; // P1 might remain
-                leftPlayerSlotId = 'player2Name'; 
-            }
+    } catch (error) {
+        console.error("Error in updateLobbyData:", error);
+        // Don't update previous state if an error occurred during processing
+    }
+}
 
-            // If we identified someone left...
-            if (leavingPlayerName) {
-                // Show notification to the remaining player or the non-playing organizer
-                const currentRole = localStorage.getItem("role");
-                const currentName = localStorage.getItem("playerName");
-                const isOrganizer = (currentRole === 'organizer'); // Non-playing organizer
-                const isRemainingPlayer = (currentName && currentName === remainingPlayerName);
-
-                // Show if you are the remaining player OR the non-playing organizer viewing the lobby
-                if (isRemainingPlayer || isOrganizer) { 
-                   showNotification(`${leavingPlayerName} left the lobby. Lobby reset.`);
-                }
+// Takes a lobby state from any source (poll, bootstrap or an action's response): notifies about
+// players who left, schedules the render and remembers the state for the next comparison.
+// Returns false if the state was dropped because it is older than the one already shown.
+function applyLobbyState(newLobbyState, lobbyCode, currentRole, currentName) {
+    if (localStorage.getItem("lobbyCode") !== lobbyCode) {
+        return false; // Answer to a request made before we left or switched lobbies
+    }
+    // A poll that was in flight while our own action committed must not roll the view back
+    if (previousLobbyState && previousLobbyState.lobbyCode === newLobbyState.lobbyCode &&
+        typeof newLobbyState.version === "number" && newLobbyState.version < previousLobbyState.version) {
+        console.log(`Ignoring lobby version ${newLobbyState.version}, already showing ${previousLobbyState.version}`);
+        return false;
+    }
 
-                // Always force the UI update for the cleared slot visually
-                const leftPlayerNameDiv = document.getElementById(leftPlayerSlotId);
-                if (leftPlayerNameDiv) {
-                    console.log(`Forcing UI update: Clearing ${leftPlayerSlotId}`);
-                    leftPlayerNameDiv.textContent = 'None'; 
-                }
-            }
+    // Check if a player slot became empty compared to the previous state
+    if (previousLobbyState && 
+        previousLobbyState.player1 && previousLobbyState.player2 && // BOTH slots were filled previously
+       (!newLobbyState.player1 || !newLobbyState.player2) && // AND at least one slot is empty NOW
+       (previousLobbyState.player1 !== newLobbyState.player1 || previousLobbyState.player2 !== newLobbyState.player2) // AND a name actually changed (ensures it wasn't just a gameState change)
+       ) { 
+
+        let leavingPlayerName = null;
+        let remainingPlayerName = null;
+        let leftPlayerSlotId = null; 
+
+        // Determine who left and who remains
+        if (previousLobbyState.player1 && !newLobbyState.player1) { // P1 left
+            leavingPlayerName = previousLobbyState.player1;
+            remainingPlayerName = newLobbyState.player2; // P2 might remain
+            leftPlayerSlotId = 'player1Name'; 
+        } else if (previousLobbyState.player2 && !newLobbyState.player2) { // P2 left
+            leavingPlayerName = previousLobbyState.player2;
+            remainingPlayerName = newLobbyState.player1; // P1 might remain
+            leftPlayerSlotId = 'player2Name'; 
         }
 
-        // Update lobby info display
-        if (lobbyCodeDisplay) lobbyCodeDisplay.textContent = lobbyCode;
-        
-        // Update game state display
-        if (currentGameState) {
-            currentGameState.textContent = newLobbyState.gameState || 'waiting';
-        }
+        // If we identified someone left...
+        if (leavingPlayerName) {
+            // Show notification to the remaining player or the non-playing organizer
+            const currentRole = localStorage.getItem("role");
+            const currentName = localStorage.getItem("playerName");
+            const isOrganizer = (currentRole === 'organizer'); // Non-playing organizer
+            const isRemainingPlayer = (currentName && currentName === remainingPlayerName);
+
+            // Show if you are the remaining player OR the non-playing organizer viewing the lobby
+            if (isRemainingPlayer || isOrganizer) { 
+               showNotification(`${leavingPlayerName} left the lobby. Lobby reset.`);
+            }
 
-        // Update player names
-        const player1NameDiv = document.getElementById('player1Name');
-        const player2NameDiv = document.getElementById('player2Name');
-        if (player1NameDiv) player1NameDiv.textContent = newLobbyState.player1 || 'None';
-        if (player2NameDiv) player2NameDiv.textContent = newLobbyState.player2 || 'None';
-
-        // Handle ready check UI
-        const readyCheckContainer = document.getElementById('readyCheckContainer');
-        const player1Status = document.getElementById('player1Status');
-        const player2Status = document.getElementById('player2Status');
-        const readyButton = document.getElementById('readyButton');
-
-        // Show ready check UI if both players are present and game state is ready_check
-        if (newLobbyState.player1 && newLobbyState.player2 && newLobbyState.gameState === 'ready_check') {
-            // Show ready check UI
-            if (readyCheckContainer) readyCheckContainer.classList.remove('hidden');
-
-            // Update player status displays
-            if (player1Status) player1Status.textContent = `Player 1: ${newLobbyState.player1Ready ? 'Ready' : 'Not Ready'}`;
-            if (player2Status) player2Status.textContent = `Player 2: ${newLobbyState.player2Ready ? 'Ready' : 'Not Ready'}`;
-
-            // Update ready button state based on player role
-            if (readyButton) {
-                // Check if current user is organizer_player and match to player1 or player2
-                if (currentRole === 'organizer_player') {
-                    const organizerName = currentName;
-                    if (organizerName === newLobbyState.player1) {
-                        // Organizer is player1
-                        readyButton.disabled = newLobbyState.player1Ready;
-                        readyButton.textContent = newLobbyState.player1Ready ? 'Waiting...' : 'Ready';
-                        readyButton.style.display = '';
-                    } else if (organizerName === newLobbyState.player2) {
-                        // Organizer is player2
-                        readyButton.disabled = newLobbyState.player2Ready;
-                        readyButton.textContent = newLobbyState.player2Ready ? 'Waiting...' : 'Ready';
-                        readyButton.style.display = '';
-                    } else {
-                        // Hide ready button if organizer is not a player
-                                    // Organizer name doesn't match P1 or P2 - Hide button
-                        console.error("Organizer_player role mismatch: Name from localStorage doesn't match player slots from backend.", { organizerName, player1: newLobbyState.player1, player2: newLobbyState.player2 });
-                        readyButton.disabled = true;
-                        readyButton.style.display = 'none';
-                    }
-                } else if (currentRole === 'player1') {
-                    readyButton.disabled = newLobbyState.player1Ready;
-                    readyButton.textContent = newLobbyState.player1Ready ? 'Waiting...' : 'Ready';
-                    readyButton.style.display = '';
-                } else if (currentRole === 'player2') {
-                    readyButton.disabled = newLobbyState.player2Ready;
-                    readyButton.textContent = newLobbyState.player2Ready ? 'Waiting...' : 'Ready';
-                    readyButton.style.display = '';
-                } else {
-                    // Organizer (not player) or unknown role - Hide button
-                    readyButton.disabled = true;
-                    readyButton.style.display = 'none';
-                }
+            // Always force the UI update for the cleared slot visually
+            const leftPlayerNameDiv = document.getElementById(leftPlayerSlotId);
+            if (leftPlayerNameDiv) {
+                console.log(`Forcing UI update: Clearing ${leftPlayerSlotId}`);
+                leftPlayerNameDiv.textContent = 'None'; 
             }
-        } else {
-            // Hide ready check UI
-            if (readyCheckContainer) readyCheckContainer.classList.add('hidden');
         }
+    }
 
-        // Update game phase UI
-        updateGamePhaseUI(newLobbyState);
-
-        // Update picks and bans
-        displayPicks('player1', newLobbyState.player1, newLobbyState.picks || [], newLobbyState.gameState);
-        displayPicks('player2', newLobbyState.player2, newLobbyState.picks || [], newLobbyState.gameState);
-        displayBans(newLobbyState.bans || []);
-
-        // Update character button styles
-        updateCharacterButtonStyles(newLobbyState.picks || [], newLobbyState.bans || [], newLobbyState.gameState);
+    // An unchanged lobby needs no DOM work at all (the countdown runs on its own)
+    const unchanged = previousLobbyState && previousLobbyState.lobbyCode === newLobbyState.lobbyCode &&
+        typeof newLobbyState.version === "number" && previousLobbyState.version === newLobbyState.version;
+    if (!unchanged) {
+        // Written in the next animation frame, together with any countdown update
+        scheduleRender('lobby', () => renderLobbyState(newLobbyState, lobbyCode, currentRole, currentName));
+    }
 
-        // Update previous state at the very end of successful processing
-        previousLobbyState = newLobbyState; 
+    // Update previous state at the very end of successful processing
+    previousLobbyState = newLobbyState;
+    rememberLobbyVersion(newLobbyState);
+    return true;
+}
 
-    } catch (error) {
-        console.error("Error in updateLobbyData:", error);
-        // Don't update previous state if an error occurred during processing
+// Renders the lobby state returned by one of our own actions right away, instead of waiting for
+// the next poll, and restarts the poll interval from now so no poll lands right after the action.
+function applyActionResult(lobbyState) {
+    const lobbyCode = localStorage.getItem("lobbyCode");
+    if (!lobbyState || !lobbyCode) {
+        updateLobbyData(); // Nothing to render from, fetch it
+        return;
     }
+    applyLobbyState(lobbyState, lobbyCode, localStorage.getItem("role"), localStorage.getItem("playerName"));
+    if (!pollingResumeTimeout) startPolling(false); // A rate-limit pause still runs its course
 }
 
 async function copyLobbyCode(code) {
@@ -1044,14 +1067,14 @@ function updateCharacterButtonStyles(picks, bans, gameState) {
         return; // Exit early, don't apply pick/ban styles
     }
     
-    // Only re-enable buttons if the current turn hasn't locally timed out
-    if (!isCurrentTurnTimedOut) {
+    // Only re-enable buttons if the current turn hasn't locally timed out and no action 429 is being waited out
+    if (!isCurrentTurnTimedOut && Date.now() >= actionsPausedUntil) {
         console.log("DEBUG: Re-enabling buttons in updateCharacterButtonStyles");
         buttons.forEach(button => {
             button.disabled = false;
         });
     } else {
-        console.log("DEBUG: Skipping button re-enable because isCurrentTurnTimedOut is true");
+        console.log("DEBUG: Skipping button re-enable (turn timed out or actions rate limited)");
     }
 
     buttons.forEach(button => {
@@ -1097,15 +1120,100 @@ function createCharacterButtons() {
     });
 }
 
+// Writes a lobby state into the page. Runs inside the render loop, never directly from a fetch.
+function renderLobbyState(newLobbyState, lobbyCode, currentRole, currentName) {
+    // Update lobby info display
+    if (lobbyCodeDisplay) lobbyCodeDisplay.textContent = lobbyCode;
+    
+    // Update game state display
+    if (currentGameState) {
+        currentGameState.textContent = newLobbyState.gameState || 'waiting';
+    }
+
+    // Update player names
+    const player1NameDiv = document.getElementById('player1Name');
+    const player2NameDiv = document.getElementById('player2Name');
+    if (player1NameDiv) player1NameDiv.textContent = newLobbyState.player1 || 'None';
+    if (player2NameDiv) player2NameDiv.textContent = newLobbyState.player2 || 'None';
+
+    // Handle ready check UI
+    const readyCheckContainer = document.getElementById('readyCheckContainer');
+    const player1Status = document.getElementById('player1Status');
+    const player2Status = document.getElementById('player2Status');
+    const readyButton = document.getElementById('readyButton');
+
+    // Show ready check UI if both players are present and game state is ready_check
+    if (newLobbyState.player1 && newLobbyState.player2 && newLobbyState.gameState === 'ready_check') {
+        // Show ready check UI
+        if (readyCheckContainer) readyCheckContainer.classList.remove('hidden');
+
+        // Update player status displays
+        if (player1Status) player1Status.textContent = `Player 1: ${newLobbyState.player1Ready ? 'Ready' : 'Not Ready'}`;
+        if (player2Status) player2Status.textContent = `Player 2: ${newLobbyState.player2Ready ? 'Ready' : 'Not Ready'}`;
+
+        // Update ready button state based on player role
+        if (readyButton) {
+            // Check if current user is organizer_player and match to player1 or player2
+            if (currentRole === 'organizer_player') {
+                const organizerName = currentName;
+                if (organizerName === newLobbyState.player1) {
+                    // Organizer is player1
+                    readyButton.disabled = newLobbyState.player1Ready;
+                    readyButton.textContent = newLobbyState.player1Ready ? 'Waiting...' : 'Ready';
+                    readyButton.style.display = '';
+                } else if (organizerName === newLobbyState.player2) {
+                    // Organizer is player2
+                    readyButton.disabled = newLobbyState.player2Ready;
+                    readyButton.textContent = newLobbyState.player2Ready ? 'Waiting...' : 'Ready';
+                    readyButton.style.display = '';
+                } else {
+                    // Hide ready button if organizer is not a player
+                                // Organizer name doesn't match P1 or P2 - Hide button
+                    console.error("Organizer_player role mismatch: Name from localStorage doesn't match player slots from backend.", { organizerName, player1: newLobbyState.player1, player2: newLobbyState.player2 });
+                    readyButton.disabled = true;
+                    readyButton.style.display = 'none';
+                }
+            } else if (currentRole === 'player1') {
+                readyButton.disabled = newLobbyState.player1Ready;
+                readyButton.textContent = newLobbyState.player1Ready ? 'Waiting...' : 'Ready';
+                readyButton.style.display = '';
+            } else if (currentRole === 'player2') {
+                readyButton.disabled = newLobbyState.player2Ready;
+                readyButton.textContent = newLobbyState.player2Ready ? 'Waiting...' : 'Ready';
+                readyButton.style.display = '';
+            } else {
+                // Organizer (not player) or unknown role - Hide button
+                readyButton.disabled = true;
+                readyButton.style.display = 'none';
+            }
+            if (Date.now() < actionsPausedUntil) readyButton.disabled = true; // Waiting out an action 429
+        }
+    } else {
+        // Hide ready check UI
+        if (readyCheckContainer) readyCheckContainer.classList.add('hidden');
+    }
+
+    // Update game phase UI
+    updateGamePhaseUI(newLobbyState);
+
+    // Update picks and bans
+    displayPicks('player1', newLobbyState.player1, newLobbyState.picks || [], newLobbyState.gameState);
+    displayPicks('player2', newLobbyState.player2, newLobbyState.picks || [], newLobbyState.gameState);
+    displayBans(newLobbyState.bans || []);
+
+    // Update character button styles
+    updateCharacterButtonStyles(newLobbyState.picks || [], newLobbyState.bans || [], newLobbyState.gameState);
+}
+
 // --- Polling Functions ---
-function startPolling() {
+function startPolling(pollNow = true) {
     console.log("startPolling called");
     // Always stop any existing polling first
     stopPolling();
     
     try {
-        // Update immediately when starting polling
-        updateLobbyData();
+        // Update immediately when starting polling (unless the caller has just loaded the lobby)
+        if (pollNow) updateLobbyData();
         
         // Set up new polling interval
         updateInterval = setInterval(() => {
@@ -1132,47 +1240,144 @@ function stopPolling() {
         clearInterval(updateInterval);
         updateInterval = null; // Clear the reference
     }
+    if (pollingResumeTimeout) {
+        clearTimeout(pollingResumeTimeout);
+        pollingResumeTimeout = null;
+    }
+}
+
+// Stops polling for Retry-After seconds, then resumes if still in a lobby. The random extra
+// delay keeps many restored tabs from all coming back in the same second.
+function pausePolling(retryAfterSeconds) {
+    stopPolling();
+    const delayMs = retryAfterSeconds * 1000 + Math.random() * 1000;
+    console.warn(`Rate limited by the server, pausing polling for ${Math.round(delayMs)} ms`);
+    pollingResumeTimeout = setTimeout(() => {
+        pollingResumeTimeout = null;
+        if (localStorage.getItem("lobbyCode")) startPolling();
+    }, delayMs);
 }
 
 // --- Initial Page Load Setup ---
-async function initializePage() {
+
+// The catalog as the service worker last cached it (see sw.js), without touching the network.
+// Returns { version, resonators } or null on a first visit or without service worker support.
+async function readCachedCatalog() {
+    if (!('caches' in window)) return null;
     try {
-        // Load resonators data
-        const response = await fetch('resonators.json');
-        if (!response.ok) {
-            throw new Error(`Failed to load resonators.json: ${response.status}`);
+        const cache = await caches.open('pickban-catalog');
+        const [catalogResponse, versionResponse] = await Promise.all([
+            cache.match(new URL('resonators.json', location.href).href),
+            cache.match(new URL('__catalog-version', location.href).href)
+        ]);
+        if (!catalogResponse || !versionResponse) return null;
+        return { version: await versionResponse.text(), resonators: await catalogResponse.json() };
+    } catch (error) {
+        console.warn("Could not read the cached catalog:", error);
+        return null;
+    }
+}
+
+// One request for everything a page load needs (see bootstrap.py): the catalog version (and the
+// catalog itself if ours is stale), the saved lobby's state and our resolved role in it.
+async function fetchBootstrap(catalogVersion, lobbyCode, playerName) {
+    const params = new URLSearchParams();
+    if (catalogVersion) params.set("catalogVersion", catalogVersion);
+    if (lobbyCode) params.set("lobbyCode", lobbyCode);
+    if (playerName) params.set("playerName", playerName);
+    const requestStartedAt = Date.now();
+    const response = await fetch(`${apiBaseUrl}/bootstrap?${params}`, { method: "GET" });
+    if (!response.ok) throw new Error(`Bootstrap failed: ${response.status}`);
+    rememberServerTime(response, requestStartedAt);
+    return response.json();
+}
+
+// Fallback when the bootstrap request fails (e.g. offline): load the catalog on its own and let
+// polling restore the saved lobby, as the service worker can answer both from its caches.
+async function loadPageSequentially(savedLobbyCode, savedPlayerName, savedRole) {
+    const response = await fetch('resonators.json');
+    if (!response.ok) {
+        throw new Error(`Failed to load resonators.json: ${response.status}`);
+    }
+    resonators = await response.json();
+    createFilterControls();
+    createCharacterButtons();
+
+    if (savedLobbyCode) {
+        console.log("Restoring saved lobby from polling:", savedLobbyCode, savedRole, savedPlayerName);
+        showLobbyView(true);
+        updateButtonVisibility();
+        startPolling();
+    }
+}
+
+// Builds the page from a bootstrap response: catalog first, then the saved lobby if we still belong to it.
+function applyBootstrap(bootstrap, cachedCatalog, savedLobbyCode, savedPlayerName, savedRole) {
+    if (bootstrap.catalog) {
+        resonators = bootstrap.catalog;
+        // Lets the service worker pick up the new catalog (and its images) in the background
+        if (cachedCatalog) fetch('resonators.json').catch(() => {});
+    } else {
+        resonators = cachedCatalog.resonators;
+    }
+
+    // Create filter controls and character buttons
+    createFilterControls();
+    createCharacterButtons();
+
+    if (!savedLobbyCode) return;
+    if (!bootstrap.lobby) {
+        console.log("Saved lobby no longer exists, clearing local state.");
+        clearLocalLobbyState();
+        showNotification("Your previous lobby was closed.");
+    } else if (!bootstrap.role) {
+        console.log("Saved player no longer has a place in the lobby, clearing local state.");
+        clearLocalLobbyState();
+        showNotification(`You are no longer in lobby ${savedLobbyCode}.`);
+    } else {
+        console.log("Restoring saved lobby from bootstrap:", savedLobbyCode, bootstrap.role, savedPlayerName);
+        if (bootstrap.role !== savedRole) {
+            console.log(`Role changed while away: ${savedRole} -> ${bootstrap.role}`);
+            localStorage.setItem("role", bootstrap.role);
         }
-        resonators = await response.json();
-        
-        // Create filter controls and character buttons
-        createFilterControls();
-        createCharacterButtons();
+        showLobbyView(true);
+        updateButtonVisibility(); // Update buttons based on the resolved role
+        applyLobbyState(bootstrap.lobby, savedLobbyCode, bootstrap.role, savedPlayerName);
+        startPolling(false); // The bootstrap state is current, the first poll can wait
+    }
+}
 
+async function initializePage() {
+    try {
         // Check for existing lobby code in localStorage
-        const savedLobbyCode = localStorage.getItem("lobbyCode");
+        let savedLobbyCode = localStorage.getItem("lobbyCode");
+        const savedPlayerName = localStorage.getItem("playerName");
+        const savedRole = localStorage.getItem("role");
+        if (savedLobbyCode && !(savedPlayerName && savedRole)) {
+            // If lobby code exists but name/role doesn't, clear inconsistent state
+            console.warn("Inconsistent saved state found (code without name/role). Clearing.");
+            clearLocalLobbyState();
+            savedLobbyCode = null;
+        }
         if (savedLobbyCode) {
-            // If there's saved lobby info, restore the UI state
-            const savedPlayerName = localStorage.getItem("playerName");
-            const savedRole = localStorage.getItem("role"); // Get role too
-
-            if (savedPlayerName && savedRole) {
-                console.log("Found saved lobby state, restoring UI:", savedLobbyCode, savedRole, savedPlayerName);
-                // Populate inputs (optional, good for display)
-                playerNameInput.value = savedPlayerName;
-                lobbyCodeInput.value = savedLobbyCode;
-
-                // Show the lobby view immediately
-                showLobbyView(true);
-                updateButtonVisibility(); // Update buttons based on saved role
+            // Populate inputs (optional, good for display)
+            playerNameInput.value = savedPlayerName;
+            lobbyCodeInput.value = savedLobbyCode;
+        }
 
-                // Start polling to get the latest data for the restored lobby
-                startPolling();
+        // The bootstrap request goes out while images and styles are still loading
+        const cachedCatalog = await readCachedCatalog();
+        let bootstrap = null;
+        try {
+            bootstrap = await fetchBootstrap(cachedCatalog && cachedCatalog.version, savedLobbyCode, savedPlayerName);
+        } catch (error) {
+            console.warn("Bootstrap request failed, loading the page step by step:", error);
+        }
 
-            } else {
-                // If lobby code exists but name/role doesn't, clear inconsistent state
-                console.warn("Inconsistent saved state found (code without name/role). Clearing.");
-                clearLocalLobbyState();
-            }
+        if (!bootstrap) {
+            await loadPageSequentially(savedLobbyCode, savedPlayerName, savedRole);
+        } else {
+            applyBootstrap(bootstrap, cachedCatalog, savedLobbyCode, savedPlayerName, savedRole);
         }
 
         // Add event listeners
@@ -1254,31 +1459,93 @@ async function initializePage() {
 
 } // Closing brace for initializePage function
 
-// --- Timer Management Functions ---
-function startClientSideTimer(startTime, duration, selector) {
-    const timerElement = document.getElementById('timer');
-    if (!timerElement) return;
+// --- Render Loop ---
+// Everything that changes the lobby view (state from polls and action responses, the turn countdown)
+// is queued here and written in one animation frame, so DOM reads and writes from different sources
+// never interleave. Nothing runs while the tab is hidden; becoming visible renders the latest state.
+const pendingRenders = new Map(); // key -> render function; a newer render with the same key replaces the older
+let renderFrameId = null;
+let isRendering = false;
+
+function scheduleRender(key, render) {
+    pendingRenders.set(key, render);
+    requestRenderFrame();
+}
 
-    stopClientSideTimer(); // Clear existing timer
+function requestRenderFrame() {
+    if (renderFrameId !== null || isRendering || document.hidden) return;
+    renderFrameId = requestAnimationFrame(renderFrame);
+}
 
-    const endTime = startTime + duration;
+function renderFrame() {
+    renderFrameId = null;
+    isRendering = true;
+    const renders = [...pendingRenders.values()];
+    pendingRenders.clear();
+    try {
+        renders.forEach(render => {
+            try {
+                render();
+            } catch (error) {
+                console.error("Error while rendering:", error);
+            }
+        });
+        renderCountdown(); // After the lobby render, which may have started or stopped the countdown
+    } finally {
+        isRendering = false;
+    }
+    if (pendingRenders.size > 0) requestRenderFrame(); // Queued by a render in this frame
+}
 
-    // Update immediately and store selector for the interval
-    updateTimerDisplay(endTime, selector);
+document.addEventListener('visibilitychange', () => {
+    if (document.hidden) {
+        if (renderFrameId !== null) cancelAnimationFrame(renderFrameId);
+        renderFrameId = null;
+        clearTimeout(countdownWakeTimeout);
+        countdownWakeTimeout = null;
+    } else {
+        if (countdownState) countdownState.shownSecond = null; // Redraw the current second
+        requestRenderFrame();
+    }
+});
 
-    clientSideTimerInterval = setInterval(() => {
-        // Pass selector on subsequent interval calls
-        updateTimerDisplay(endTime, selector);
-    }, 1000);
+// --- Timer Management Functions ---
+// endTime is the server's turn deadline (server clock, ms)
+function startClientSideTimer(endTime, selector) {
+    stopClientSideTimer(); // Clear existing timer
+    countdownState = { endTime, selector, shownSecond: null };
+    requestRenderFrame();
 }
 
-function updateTimerDisplay(endTime, selector) {
-    const timerElement = document.getElementById('timer');
-    if (!timerElement) return;
+function stopClientSideTimer() {
+    countdownState = null;
+    clearTimeout(countdownWakeTimeout);
+    countdownWakeTimeout = null;
+}
 
-    const now = Date.now();
-    const remaining = Math.max(0, endTime - now);
+// Called from the render loop: redraws only when the displayed second changes, then sleeps until
+// the next change, so the countdown costs one wake-up per second instead of one per frame.
+function renderCountdown() {
+    if (!countdownState) return;
+    const now = Date.now() + serverClockOffsetMs; // Local time on the server's clock
+    const remaining = Math.max(0, countdownState.endTime - now);
     const seconds = Math.ceil(remaining / 1000);
+    if (seconds !== countdownState.shownSecond) {
+        countdownState.shownSecond = seconds;
+        updateTimerDisplay(remaining, seconds, countdownState.selector); // Stops the countdown on expiry
+    }
+    if (countdownState) {
+        clearTimeout(countdownWakeTimeout);
+        countdownWakeTimeout = setTimeout(() => {
+            countdownWakeTimeout = null;
+            requestRenderFrame();
+        }, remaining % 1000 || 1000);
+    }
+}
+
+function updateTimerDisplay(remaining, seconds, selector) {
+    const timerElement = document.getElementById('timer');
+    if (!timerElement) return;
 
     if (remaining <= 0) {
         timerElement.textContent = "Time expired! Waiting for random Resonator...";
@@ -1323,13 +1590,6 @@ function updateTimerDisplay(endTime, selector) {
     }
 }
 
-function stopClientSideTimer() {
-    if (clientSideTimerInterval) {
-        clearInterval(clientSideTimerInterval);
-        clientSideTimerInterval = null;
-    }
-}
-
 // --- Optional: Helper function for cleaner mapping ---
 function getFriendlyPhaseName(gameState) {
     if (!gameState) return 'Unknown';
@@ -1342,6 +1602,7 @@ function getFriendlyPhaseName(gameState) {
         case 'waiting': return 'Waiting';
         case 'ready_check': return 'Ready Check';
         case 'complete': return 'Complete';
+        case 'closed': return 'Closed';
         default: return gameState; // Fallback to internal name if unknown
     }
 }
@@ -1387,9 +1648,10 @@ function updateGamePhaseUI(data) {
     // 2. Determine states and visibility
     const friendlyPhaseName = getFriendlyPhaseName(data.gameState);
     const isComplete = (data.gameState === 'complete');
+    const isClosed = (data.gameState === 'closed'); // Ended early by an organizer, picks/bans may be missing
     const isReadyCheck = (data.gameState === 'ready_check');
     const isWaiting = (data.gameState === 'waiting');
-    const isActivePickBan = !isComplete && !isReadyCheck && !isWaiting;
+    const isActivePickBan = !isComplete && !isClosed && !isReadyCheck && !isWaiting;
     const showInstruction = (isWaiting && data.player2 === ''); // Show only if waiting AND P2 slot empty
 
     let statusMessage = '';
@@ -1398,7 +1660,7 @@ function updateGamePhaseUI(data) {
 
     // Set visibility based on state
     setElementVisibility(gameStatusHeader, !isReadyCheck); // Hide header only during ready check
-    setElementVisibility(pickBanSection, isActivePickBan || isComplete || isWaiting || isReadyCheck); // Show this section if active, complete, waiting, or ready check
+    setElementVisibility(pickBanSection, isActivePickBan || isComplete || isClosed || isWaiting || isReadyCheck); // Show this section if active, finished, waiting, or ready check
     setElementVisibility(readyCheckContainer, isReadyCheck);
     setElementVisibility(globalBansSection, isActivePickBan); // Hide bans when complete or waiting/ready
     setElementVisibility(shareInstructionElement, showInstruction); // Control instruction text visibility
@@ -1424,6 +1686,8 @@ function updateGamePhaseUI(data) {
         statusMessage = "Waiting for players to join...";
     } else if (isComplete) {
         statusMessage = "Pick/Ban Phase Complete!";
+    } else if (isClosed) {
+        statusMessage = "This lobby was closed before the draft finished.";
     } else if (isActivePickBan) {
         switch (data.gameState) {
             // Ban Phase 1
@@ -1467,8 +1731,11 @@ function updateGamePhaseUI(data) {
     }
 
     // 7. Handle Timer
-    if (isActivePickBan && data.timerState && data.timerState.isActive && data.timerState.startTime && data.timerState.duration) {
-        startClientSideTimer(data.timerState.startTime, data.timerState.duration, activePlaceholderSelector);
+    const timerState = data.timerState || {};
+    // Lobbies whose turn started before deadlines were stored fall back to startTime + duration
+    const turnDeadline = timerState.deadline || (timerState.startTime && timerState.duration ? timerState.startTime + timerState.duration : null);
+    if (isActivePickBan && timerState.isActive && turnDeadline) {
+        startClientSideTimer(turnDeadline, activePlaceholderSelector);
     } else {
         stopClientSideTimer();
         if(timer) timer.textContent = "Time remaining: --";
@@ -1576,17 +1843,19 @@ readyButton.addEventListener("click", async () => {
         console.log(`Marking ${actualRole} as ready in lobby ${lobbyCode}`);
         
         // Update ready status through the main lobby endpoint
-        const response = await fetch(`${apiBaseUrl}/lobbies/${lobbyCode}`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                action: 'ready',
-                player: actualRole,
-                ready: true
-            })
-        });
+        const response = await postAction(
+            `${apiBaseUrl}/lobbies/${lobbyCode}`,
+            { action: 'ready', player: actualRole, ready: true },
+            buildIdempotencyKey(lobbyCode, actualRole, 'ready', true)
+        );
 
         console.log("Ready response status:", response.status);
+
+        if (response.status === 409) {
+            // The same ready click is still being processed; polling will show the result
+            startPolling();
+            return;
+        }
         
         if (!response.ok) {
             const errorText = await response.text();
@@ -1602,16 +1871,9 @@ readyButton.addEventListener("click", async () => {
 
         const data = await response.json();
         console.log("Ready response data:", data);
-        
-        // Update UI based on response
-        readyButton.textContent = 'Waiting...';
-        readyButton.disabled = true;
 
-        // Update player status displays
-        const player1Status = document.getElementById('player1Status');
-        const player2Status = document.getElementById('player2Status');
-        if (player1Status) player1Status.textContent = `Player 1: ${data.lobbyState.player1Ready ? 'Ready' : 'Not Ready'}`;
-        if (player2Status) player2Status.textContent = `Player 2: ${data.lobbyState.player2Ready ? 'Ready' : 'Not Ready'}`;
+        // Update UI based on response (button and player statuses render with the rest of the lobby)
+        applyActionResult(data.lobbyState);
 
         // Check if both players are ready
         if (data.lobbyState.player1Ready && data.lobbyState.player2Ready) {
@@ -1619,9 +1881,6 @@ readyButton.addEventListener("click", async () => {
             startGameCountdown();
         }
 
-        // Start polling for updates
-        startPolling();
-
     } catch (error) {
         console.error('Error marking ready:', error);
         alert('Failed to mark ready. Please try again.');
@@ -1631,4 +1890,11 @@ readyButton.addEventListener("click", async () => {
     }
 });
 
+// --- Service Worker (caches the app shell, catalog and images for repeat visits; see sw.js) ---
+if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register('sw.js').catch(error => {
+        console.warn("Service worker registration failed, continuing without offline cache:", error);
+    });
+}
+
 initializePage(); // Run initialization when the script loads
\ No newline at end of file
@@ -0,0 +1,181 @@
+// sw.js - service worker caching layer (registered by script.js)
+//
+// - App shell (index.html, styles.css, script.js): served from cache, refreshed in the background.
+//   Bump SHELL_VERSION when deploying a new frontend to drop the old shell right away.
+// - Catalog (resonators.json): same, and its content hash is the catalog version. Resonator images
+//   are precached per catalog version, so a new catalog brings new images and drops the old ones.
+// - Images: cache-first. Their URLs never change content, so they are never revalidated. They are
+//   fetched with CORS (the image bucket must allow it) and only successful responses are cached:
+//   an opaque no-cors response counts as several MB against the storage quota.
+// - API calls: network-first. Successful lobby GETs are kept, per format, so the last state can be
+//   shown offline; only the MAX_API_ENTRIES most recent are kept. Everything else (POST actions,
+//   4xx/5xx) goes straight to the network.
+
+const SHELL_VERSION = 'v1';
+const SHELL_CACHE = `pickban-shell-${SHELL_VERSION}`;
+const CATALOG_CACHE = 'pickban-catalog';
+const API_CACHE = 'pickban-api-v2'; // v1 kept every lobby ever opened, activate drops it
+const IMAGE_CACHE_PREFIX = 'pickban-cors-images-'; // The old 'pickban-images-' caches held opaque responses
+const CATALOG_URL = new URL('resonators.json', self.location).href;
+const CATALOG_VERSION_KEY = new URL('__catalog-version', self.location).href; // Stored next to the catalog
+const SHELL_URLS = ['./', 'index.html', 'styles.css', 'script.js'].map(path => new URL(path, self.location).href);
+const IMAGE_FIELDS = ['image_button', 'image_pick'];
+const MAX_API_ENTRIES = 10; // Lobbies (and formats) kept for offline use
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const shell = await caches.open(SHELL_CACHE);
+        await shell.addAll(SHELL_URLS);
+        // Also precaches the images of this catalog version; if it fails the catalog is cached on first use
+        await refreshCatalog().catch(error => console.warn('SW: catalog precache failed', error));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const currentImages = IMAGE_CACHE_PREFIX + (await getCatalogVersion());
+        const keep = new Set([SHELL_CACHE, CATALOG_CACHE, API_CACHE, currentImages]);
+        const names = await caches.keys();
+        await Promise.all(names.filter(name => name.startsWith('pickban-') && !keep.has(name)).map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return; // Actions are never cached
+
+    const url = new URL(request.url);
+    if (url.href === CATALOG_URL) {
+        event.respondWith(serveCatalog(event));
+    } else if (SHELL_URLS.includes(url.origin + url.pathname)) {
+        event.respondWith(staleWhileRevalidate(event, SHELL_CACHE));
+    } else if (request.destination === 'image') {
+        event.respondWith(cacheFirstImage(request));
+    } else if (url.pathname.includes('/lobbies') || url.pathname.endsWith('/stats')) {
+        event.respondWith(networkFirst(request));
+    }
+});
+
+// --- Strategies ---
+
+async function staleWhileRevalidate(event, cacheName) {
+    const cache = await caches.open(cacheName);
+    const cached = await cache.match(event.request, { ignoreSearch: true });
+    const refresh = fetch(event.request).then(response => {
+        if (response.ok) cache.put(event.request, response.clone());
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(refresh.catch(() => {})); // Offline: the cached copy is all there is
+        return cached;
+    }
+    return refresh;
+}
+
+async function serveCatalog(event) {
+    const cache = await caches.open(CATALOG_CACHE);
+    const cached = await cache.match(CATALOG_URL);
+    if (cached) {
+        event.waitUntil(refreshCatalog().catch(error => console.warn('SW: catalog refresh failed', error)));
+        return cached;
+    }
+    await refreshCatalog();
+    return (await cache.match(CATALOG_URL)) || fetch(event.request);
+}
+
+async function cacheFirstImage(request) {
+    const cached = await caches.match(request.url); // Any image cache, current or still being filled
+    if (cached) return cached;
+    let response;
+    try {
+        response = await fetch(request.url, { mode: 'cors' });
+    } catch (error) {
+        return fetch(request); // No CORS on the image host: show the image, but do not cache it (opaque)
+    }
+    if (response.ok) {
+        const cache = await caches.open(IMAGE_CACHE_PREFIX + (await getCatalogVersion()));
+        cache.put(request.url, response.clone());
+    }
+    return response;
+}
+
+// knownVersion etc. change on every poll, but format decides how the body must be decoded
+function apiCacheKey(url) {
+    const format = url.searchParams.get('format');
+    return url.origin + url.pathname + (format ? `?format=${encodeURIComponent(format)}` : '');
+}
+
+async function networkFirst(request) {
+    const cache = await caches.open(API_CACHE);
+    const cacheKey = apiCacheKey(new URL(request.url));
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            await cache.delete(cacheKey); // Re-adding moves the entry to the end of the key order
+            await cache.put(cacheKey, response.clone());
+            await trimCache(cache, MAX_API_ENTRIES);
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(cacheKey);
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+// Drops the oldest entries (Cache keys are in insertion order) beyond maxEntries
+async function trimCache(cache, maxEntries) {
+    const keys = await cache.keys();
+    await Promise.all(keys.slice(0, Math.max(0, keys.length - maxEntries)).map(key => cache.delete(key)));
+}
+
+// --- Catalog Versioning ---
+
+async function getCatalogVersion() {
+    const cache = await caches.open(CATALOG_CACHE);
+    const stored = await cache.match(CATALOG_VERSION_KEY);
+    return stored ? stored.text() : 'none';
+}
+
+// Downloads the catalog; if its content hash changed, stores it as the new version and
+// precaches its images into a fresh cache, then drops the previous version's images.
+async function refreshCatalog() {
+    const response = await fetch(CATALOG_URL, { cache: 'no-cache' });
+    if (!response.ok) throw new Error(`Catalog fetch failed: ${response.status}`);
+    const text = await response.clone().text();
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    const version = Array.from(new Uint8Array(digest).slice(0, 8), b => b.toString(16).padStart(2, '0')).join('');
+
+    const previousVersion = await getCatalogVersion();
+    const cache = await caches.open(CATALOG_CACHE);
+    if (version === previousVersion) {
+        await cache.put(CATALOG_URL, response);
+        return;
+    }
+
+    const imageUrls = new Set();
+    for (const resonator of JSON.parse(text)) {
+        for (const field of IMAGE_FIELDS) {
+            if (resonator[field]) imageUrls.add(resonator[field]);
+        }
+    }
+    const images = await caches.open(IMAGE_CACHE_PREFIX + version);
+    await Promise.all([...imageUrls].map(async imageUrl => {
+        if (await images.match(imageUrl)) return;
+        try {
+            const imageResponse = await fetch(imageUrl, { mode: 'cors' });
+            if (!imageResponse.ok) throw new Error(`HTTP ${imageResponse.status}`); // Never store opaque/error responses
+            await images.put(imageUrl, imageResponse);
+        } catch (error) {
+            console.warn('SW: could not precache', imageUrl, error); // Cached on first use instead
+        }
+    }));
+
+    // Switch versions only once the new images are in place
+    await cache.put(CATALOG_URL, response);
+    await cache.put(CATALOG_VERSION_KEY, new Response(version));
+    if (previousVersion !== 'none') await caches.delete(IMAGE_CACHE_PREFIX + previousVersion);
+    console.log(`SW: catalog version ${previousVersion} -> ${version}, ${imageUrls.size} images precached`);
+}
@@ -0,0 +1,86 @@
+# Shared fixtures: the handlers read their configuration at import time, so the environment is set
+# here before any test imports them. Tables and AWS clients are replaced by small in-memory stubs;
+# no test talks to AWS.
+
+import importlib.util
+import os
+import sys
+
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'test')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'test')
+os.environ.setdefault('TABLE_NAME', 'lobbies')
+os.environ.setdefault('STATS_TABLE_NAME', 'stats')
+os.environ.setdefault('RATE_LIMIT_BACKEND', 'off')
+os.environ.setdefault('SIDE_EFFECT_WORKERS', '0')
+os.environ.setdefault('HANDLE_TIMEOUT_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:000000000000:function:handleTimeout')
+os.environ.setdefault('LAMBDA_EXECUTION_ROLE_ARN', 'arn:aws:iam::000000000000:role/scheduler')
+# Import-time AWS calls (handleTimeout loads resonators.json) fail at once instead of leaving the machine
+os.environ.setdefault('AWS_ENDPOINT_URL', 'http://127.0.0.1:9')
+os.environ.setdefault('AWS_MAX_ATTEMPTS', '1')
+
+serializer = TypeSerializer()
+
+def load_handler(file_name):
+    """Imports a handler by file name (several contain dashes, e.g. pickban-leaveLobby.py)."""
+    module_name = file_name[:-3].replace('-', '_')
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def client_error(code, operation='UpdateItem', item=None):
+    """A botocore error as DynamoDB/S3 raise it; item is returned like ReturnValuesOnConditionCheckFailure='ALL_OLD'."""
+    response = {'Error': {'Code': code, 'Message': code}}
+    if item is not None:
+        response['Item'] = {key: serializer.serialize(value) for key, value in item.items()}
+    return ClientError(response, operation)
+
+def conditional_check_failed(module, item=None):
+    """The ConditionalCheckFailedException a handler catches, carrying the current item (None = deleted)."""
+    error = client_error('ConditionalCheckFailedException', item=item)
+    exception_class = module.dynamodb.meta.client.exceptions.ConditionalCheckFailedException
+    return exception_class(error.response, 'UpdateItem')
+
+class ScriptedTable:
+    """
+    Records every call. Each method answers from a queue of scripted results (a dict is returned,
+    an exception is raised); with an empty queue it returns an empty response.
+    """
+    def __init__(self):
+        self.calls = []
+        self.results = {}
+
+    def script(self, method, *results):
+        self.results.setdefault(method, []).extend(results)
+        return self
+
+    def answer(self, method, kwargs):
+        self.calls.append((method, kwargs))
+        queue = self.results.get(method) or []
+        result = queue.pop(0) if queue else {}
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def calls_to(self, method):
+        return [kwargs for name, kwargs in self.calls if name == method]
+
+    def __getattr__(self, method):
+        if method.startswith('__'):
+            raise AttributeError(method)
+        return lambda **kwargs: self.answer(method, kwargs)
+
+@pytest.fixture
+def table():
+    return ScriptedTable()
@@ -0,0 +1,54 @@
+import argparse
+import io
+import json
+
+from conftest import client_error, load_handler
+
+admin = load_handler('adminLobbies.py')
+
+def test_listed_version_is_the_condition():
+    write = admin.build_write('force-close', {'lobbyCode': 'a1b2-0001', 'version': 4})
+    assert write['Update']['ConditionExpression'] == 'version = :expectedVersion'
+    assert write['Update']['ExpressionAttributeValues'][':expectedVersion'] == {'N': '4'}
+
+def test_unversioned_lobby_must_still_have_no_version():
+    write = admin.build_write('purge', {'lobbyCode': 'a1b2-0001'})
+    assert write['Delete']['ConditionExpression'] == 'attribute_exists(lobbyCode) AND attribute_not_exists(version)'
+    assert 'ExpressionAttributeValues' not in write['Delete'] # An empty map is rejected by DynamoDB
+    write = admin.build_write('reset', {'lobbyCode': 'a1b2-0001', 'player1': 'A'})
+    assert 'attribute_not_exists(version)' in write['Update']['ConditionExpression']
+    assert ':expectedVersion' not in write['Update']['ExpressionAttributeValues']
+
+def test_lines_that_are_not_lobbies_are_reported_as_skipped(tmp_path):
+    listing = tmp_path / 'listed.ndjson'
+    listing.write_text('\n'.join([
+        '{"table":"lobbies","gameState":"waiting","count":3}',
+        '{"lobbyCode":"a1b2-0001","table":"lobbies"}',
+        'not json',
+        ''
+    ]))
+    args = argparse.Namespace(command='purge', input=str(listing), workers=1, batch_size=25, write_units=0, dry_run=True)
+    out = io.StringIO()
+    admin.run_action(args, admin.NdjsonWriter(out))
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert results == [
+        {'line': 1, 'action': 'purge', 'result': 'skipped', 'reason': 'no lobbyCode'},
+        {'lobbyCode': 'a1b2-0001', 'action': 'purge', 'result': 'dry-run'},
+        {'line': 3, 'action': 'purge', 'result': 'skipped', 'reason': 'invalid JSON'}
+    ]
+
+def test_repeated_lobby_code_is_skipped(tmp_path):
+    listing = tmp_path / 'listed.ndjson'
+    listing.write_text('{"lobbyCode":"a1b2-0001","version":3}\n{"lobbyCode":"a1b2-0001","version":3}\n')
+    args = argparse.Namespace(command='purge', input=str(listing), workers=1, batch_size=25, write_units=0, dry_run=True)
+    out = io.StringIO()
+    admin.run_action(args, admin.NdjsonWriter(out))
+    assert [json.loads(line)['result'] for line in out.getvalue().splitlines()] == ['dry-run', 'skipped']
+
+def test_failing_batch_is_reported_and_the_run_goes_on(monkeypatch):
+    def rejected(**kwargs):
+        raise client_error('ValidationException', 'TransactWriteItems')
+    monkeypatch.setattr(admin.dynamodb_client, 'transact_write_items', rejected)
+    lobbies = [{'lobbyCode': 'a1b2-0001', 'version': 3}, {'lobbyCode': 'a1b2-0002', 'version': 5}]
+    results = admin.write_batch('purge', lobbies, admin.CapacityThrottle(0))
+    assert [result for _, result in results] == ['error', 'error']
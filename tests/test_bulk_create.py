@@ -0,0 +1,31 @@
+import json
+
+from conftest import load_handler
+
+create_bulk = load_handler('createLobbiesBulk.py')
+
+def transaction_canceled(*codes):
+    error = {'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'},
+             'CancellationReasons': [{'Code': code} for code in codes]}
+    return create_bulk.dynamodb_client.exceptions.TransactionCanceledException(error, 'TransactWriteItems')
+
+def test_taken_code_is_regenerated_instead_of_overwritten(monkeypatch):
+    calls = []
+    def transact_write_items(TransactItems):
+        calls.append(TransactItems)
+        if len(calls) == 1:
+            raise transaction_canceled('None', 'ConditionalCheckFailed')
+        return {}
+    monkeypatch.setattr(create_bulk.dynamodb_client, 'transact_write_items', transact_write_items)
+    monkeypatch.setattr(create_bulk, 'BASE_BACKOFF_SECONDS', 0)
+
+    event = {'httpMethod': 'POST', 'body': json.dumps({'playerName': 'Org', 'count': 2})}
+    response = create_bulk.lambda_handler(event, None)
+    assert response['statusCode'] == 200
+
+    first, retry = ([put['Put'] for put in attempt] for attempt in calls)
+    assert all(put['ConditionExpression'] == 'attribute_not_exists(lobbyCode)' for put in first + retry)
+    assert retry[0]['Item']['lobbyCode'] == first[0]['Item']['lobbyCode']
+    assert retry[1]['Item']['lobbyCode'] != first[1]['Item']['lobbyCode']
+    returned = [lobby['lobbyCode'] for lobby in json.loads(response['body'])['lobbies']]
+    assert returned == [put['Item']['lobbyCode']['S'] for put in retry]
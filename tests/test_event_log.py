@@ -0,0 +1,16 @@
+import lobby_common
+from conftest import conditional_check_failed
+
+def test_append_is_conditioned_on_new_seq(table, monkeypatch):
+    monkeypatch.setattr(lobby_common, 'events_table', table)
+    lobby_common.append_event({'lobbyCode': 'a1b2-0001', 'version': 7, 'gameState': 'ban1_p2'}, 'ban', value='r1')
+    put = table.calls_to('put_item')[0]
+    assert put['ConditionExpression'] == 'attribute_not_exists(seq)'
+    assert put['Item']['seq'] == 7 and put['Item']['value'] == 'r1'
+
+def test_duplicate_seq_is_reported_as_already_recorded(table, monkeypatch, capsys):
+    monkeypatch.setattr(lobby_common, 'events_table', table)
+    table.script('put_item', conditional_check_failed(lobby_common))
+    lobby_common.append_event({'lobbyCode': 'a1b2-0001', 'version': 7, 'gameState': 'ban1_p2'}, 'ban')
+    output = capsys.readouterr().out
+    assert 'already recorded' in output and 'ERROR' not in output
@@ -0,0 +1,36 @@
+import pytest
+
+from conftest import load_handler, serializer
+
+aggregate_stats = load_handler('aggregateStats.py')
+archive_lobbies = load_handler('archiveLobbies.py')
+admin = load_handler('adminLobbies.py')
+
+FULL = {'picks': ['a', 'b', 'c', 'd', 'e', 'f'], 'bans': ['g', 'h', 'i', 'j']}
+PARTIAL = {'picks': ['a', 'b'], 'bans': ['g', 'h']}
+
+def modify(old_state, new_state, draft):
+    image = lambda state: {key: serializer.serialize(value) for key, value in {'lobbyCode': 'a1b2-0001', 'version': 9, 'gameState': state, **draft}.items()}
+    return {'eventName': 'MODIFY', 'dynamodb': {'OldImage': image(old_state), 'NewImage': image(new_state)}}
+
+def test_force_close_does_not_complete_the_draft():
+    write = admin.build_write('force-close', {'lobbyCode': 'a1b2-0001', 'version': 4})
+    assert write['Update']['ExpressionAttributeValues'][':state'] == {'S': 'closed'}
+
+@pytest.mark.parametrize('old_state, new_state, draft, counted', [
+    ('pick2_p1', 'complete', FULL, True),
+    ('pick1_p2', 'complete', PARTIAL, False), # Ran out of resonators
+    ('pick1_p2', 'closed', PARTIAL, False),
+    ('complete', 'complete', FULL, False)
+])
+def test_only_full_drafts_are_counted(old_state, new_state, draft, counted):
+    assert (aggregate_stats.get_newly_completed(modify(old_state, new_state, draft)) is not None) == counted
+
+@pytest.mark.parametrize('new_state, draft, reason', [
+    ('complete', FULL, 'complete'),
+    ('complete', PARTIAL, 'closed'),
+    ('closed', PARTIAL, 'closed')
+])
+def test_archive_reason_follows_the_draft(new_state, draft, reason):
+    lobby, archive_reason = archive_lobbies.get_archive_entry(modify('pick1_p2', new_state, draft))
+    assert archive_reason == reason
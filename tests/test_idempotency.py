@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import lobby_common
+from conftest import conditional_check_failed
+
+class IdempotencyTable:
+    """Evaluates the reservation condition the way DynamoDB would for begin_idempotent_request."""
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeValues=None, **kwargs):
+        existing = self.items.get(Item['idempotencyKey'])
+        if ConditionExpression and existing:
+            lease_expired = existing.get('status') == 'pending' and existing.get('leaseUntil', float('inf')) < ExpressionAttributeValues[':now']
+            if not lease_expired:
+                raise conditional_check_failed(lobby_common)
+        self.items[Item['idempotencyKey']] = Item
+
+    def get_item(self, Key, **kwargs):
+        return {'Item': self.items.get(Key['idempotencyKey'])}
+
+    def delete_item(self, Key):
+        self.items.pop(Key['idempotencyKey'], None)
+
+@pytest.fixture
+def store(monkeypatch):
+    fake = IdempotencyTable()
+    monkeypatch.setattr(lobby_common, 'idempotency_table', fake)
+    monkeypatch.setattr(lobby_common, 'IDEMPOTENCY_LEASE_SECONDS', 30)
+    return fake
+
+def at(monkeypatch, seconds):
+    monkeypatch.setattr(lobby_common.time, 'time', lambda: seconds)
+
+def test_duplicate_while_running_gets_409(store, monkeypatch):
+    at(monkeypatch, 1000)
+    assert lobby_common.begin_idempotent_request('k', {}) is None
+    at(monkeypatch, 1010)
+    assert lobby_common.begin_idempotent_request('k', {})['statusCode'] == 409
+
+def test_retry_takes_over_a_pending_key_whose_lease_ran_out(store, monkeypatch):
+    at(monkeypatch, 1000)
+    assert lobby_common.begin_idempotent_request('k', {}) is None # This invocation dies before finishing
+    at(monkeypatch, 1031)
+    assert lobby_common.begin_idempotent_request('k', {}) is None
+    assert store.items['k']['leaseUntil'] == 1061
+
+def test_finished_result_is_replayed_even_after_the_lease(store, monkeypatch):
+    at(monkeypatch, 1000)
+    lobby_common.begin_idempotent_request('k', {})
+    lobby_common.finish_idempotent_request('k', {'statusCode': 200, 'body': json.dumps({'ok': True})})
+    at(monkeypatch, 1100)
+    replay = lobby_common.begin_idempotent_request('k', {})
+    assert replay['statusCode'] == 200 and replay['headers']['Idempotent-Replayed'] == 'true'
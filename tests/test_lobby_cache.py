@@ -0,0 +1,28 @@
+from conftest import load_handler
+
+get_lobby = load_handler('getLobby.py')
+
+def reader(*versions):
+    """A load_item returning the given versions in turn, recording each call."""
+    calls = []
+    def load_item(lobby_code, known_version):
+        calls.append(known_version)
+        return {'lobbyCode': lobby_code, 'version': versions[len(calls) - 1]}
+    return load_item, calls
+
+def test_recent_version_is_served_from_memory():
+    cache = get_lobby.LobbyResponseCache(max_bytes=1 << 20, fresh_ms=60000)
+    load_item, calls = reader(3)
+    assert cache.get('a1b2-0001', 0, load_item)[1] == 'MISS'
+    entry, status = cache.get('a1b2-0001', 3, load_item)
+    assert status == 'HIT' and entry['item']['version'] == 3
+    assert calls == [0]
+
+def test_client_with_a_newer_version_bypasses_the_cache():
+    cache = get_lobby.LobbyResponseCache(max_bytes=1 << 20, fresh_ms=60000)
+    load_item, calls = reader(3, 4)
+    cache.get('a1b2-0001', 0, load_item)
+    entry, status = cache.get('a1b2-0001', 4, load_item)
+    assert status == 'MISS' and entry['item']['version'] == 4
+    assert calls == [0, 4]
+    assert cache.get('a1b2-0001', 4, load_item)[1] == 'HIT' # The newer version is now the cached one
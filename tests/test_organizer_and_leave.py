@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import lobby_common
+from conftest import conditional_check_failed, load_handler
+
+organizer_join = load_handler('organizerJoin.py')
+leave_lobby = load_handler('pickban-leaveLobby.py')
+
+@pytest.fixture
+def lobbies(table, monkeypatch):
+    monkeypatch.setitem(lobby_common.shard_tables, lobby_common.default_table_name, table)
+    return table
+
+def request(body):
+    return {'httpMethod': 'POST', 'pathParameters': {'lobbyCode': 'a1b2-0001'}, 'body': json.dumps(body)}
+
+def test_organizer_joins_an_empty_lobby_in_one_write(lobbies):
+    lobbies.script('update_item', {'Attributes': {'lobbyCode': 'a1b2-0001', 'player1': 'Org', 'version': 2}})
+    response = organizer_join.lambda_handler(request({'playerName': 'Org'}), None)
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['assignedSlot'] == 'player1'
+    update, = lobbies.calls_to('update_item')
+    assert update['ConditionExpression'] == 'organizerName = :playerName AND player1 = :empty AND player2 = :empty'
+
+def test_organizer_takes_the_free_slot_at_the_returned_version(lobbies):
+    current = {'lobbyCode': 'a1b2-0001', 'organizerName': 'Org', 'player1': 'A', 'player2': '', 'gameState': 'waiting', 'version': 4}
+    lobbies.script('update_item', conditional_check_failed(organizer_join, current), {'Attributes': {**current, 'player2': 'Org', 'version': 5}})
+    response = organizer_join.lambda_handler(request({'playerName': 'Org'}), None)
+    assert json.loads(response['body'])['assignedSlot'] == 'player2'
+    retry = lobbies.calls_to('update_item')[1]
+    assert retry['ConditionExpression'] == 'version = :expectedVersion'
+    assert retry['ExpressionAttributeValues'][':expectedVersion'] == 4
+    assert retry['ExpressionAttributeValues'][':readyCheck'] == 'ready_check'
+
+def test_failed_write_tells_a_wrong_organizer_from_a_missing_lobby(lobbies):
+    lobbies.script('update_item', conditional_check_failed(organizer_join, {'lobbyCode': 'a1b2-0001', 'organizerName': 'Org'}))
+    assert organizer_join.lambda_handler(request({'playerName': 'Mallory'}), None)['statusCode'] == 403
+    lobbies.script('update_item', conditional_check_failed(organizer_join, None))
+    assert organizer_join.lambda_handler(request({'playerName': 'Org'}), None)['statusCode'] == 404
+
+def test_leave_is_conditioned_on_the_player_being_in_the_lobby(lobbies):
+    lobbies.script('update_item', {'Attributes': {'lobbyCode': 'a1b2-0001', 'player1': '', 'player2': 'B', 'version': 3}})
+    assert leave_lobby.lambda_handler(request({'player': 'player1'}), None)['statusCode'] == 200
+    update, = lobbies.calls_to('update_item')
+    assert update['ConditionExpression'] == 'player1 <> :empty'
+
+@pytest.mark.parametrize('current, status', [(None, 404), ({'lobbyCode': 'a1b2-0001', 'player1': ''}, 400)])
+def test_failed_leave_tells_a_missing_lobby_from_an_empty_slot(lobbies, current, status):
+    lobbies.script('update_item', conditional_check_failed(leave_lobby, current))
+    assert leave_lobby.lambda_handler(request({'player': 'player1'}), None)['statusCode'] == status
@@ -0,0 +1,70 @@
+import pytest
+
+import lobby_common
+from conftest import load_handler, serializer
+
+dispatch_outbox = load_handler('dispatchOutbox.py')
+make_pick = load_handler('makePick.py')
+
+@pytest.fixture
+def lobbies(table, monkeypatch):
+    monkeypatch.setitem(lobby_common.shard_tables, lobby_common.default_table_name, table)
+    return table
+
+@pytest.fixture
+def side_effects(monkeypatch):
+    """Records the Scheduler and snapshot calls the dispatcher makes."""
+    performed = []
+    monkeypatch.setattr(dispatch_outbox, 'create_schedule', lambda code, state, deadline: performed.append(('create', state)))
+    monkeypatch.setattr(dispatch_outbox, 'delete_schedule', lambda code, state: performed.append(('delete', state)))
+    monkeypatch.setattr(dispatch_outbox, 'publish_snapshot', lambda lobby, raise_errors: performed.append(('snapshot', lobby['version'])))
+    return performed
+
+def stream_record(outbox, game_state='ban1_p2', version=6, event_name='MODIFY'):
+    image = {'lobbyCode': 'a1b2-0001', 'version': version, 'gameState': game_state, 'outbox': outbox}
+    return {'eventName': event_name, 'dynamodb': {'NewImage': {key: serializer.serialize(value) for key, value in image.items()}}}
+
+def test_entries_run_in_version_order_and_are_cleared(lobbies, side_effects):
+    outbox = {
+        '6-createSchedule': {'type': 'createSchedule', 'gameState': 'ban1_p2', 'deadline': 99000},
+        '6-publishSnapshot': {'type': 'publishSnapshot'},
+        '5-deleteSchedule': {'type': 'deleteSchedule', 'gameState': 'ban1_p1'}
+    }
+    dispatch_outbox.lambda_handler({'Records': [stream_record(outbox)]}, None)
+    assert side_effects[0] == ('delete', 'ban1_p1')
+    assert sorted(side_effects[1:]) == [('create', 'ban1_p2'), ('snapshot', 6)]
+    clear, = lobbies.calls_to('update_item')
+    assert sorted(clear['ExpressionAttributeNames'].values()) == sorted(outbox)
+    assert 'version' not in clear['UpdateExpression'] # Clients see no change
+
+def test_schedule_for_a_turn_that_already_ended_is_skipped(lobbies, side_effects):
+    outbox = {'6-createSchedule': {'type': 'createSchedule', 'gameState': 'ban1_p2', 'deadline': 99000}}
+    dispatch_outbox.lambda_handler({'Records': [stream_record(outbox, game_state='pick1_p1')]}, None)
+    assert side_effects == []
+    assert len(lobbies.calls_to('update_item')) == 1 # Still cleared
+
+def test_failure_leaves_the_entries_for_the_retry(lobbies, side_effects, monkeypatch):
+    def failing_publish(lobby, raise_errors):
+        raise RuntimeError('S3 unavailable')
+    monkeypatch.setattr(dispatch_outbox, 'publish_snapshot', failing_publish)
+    with pytest.raises(RuntimeError):
+        dispatch_outbox.lambda_handler({'Records': [stream_record({'6-publishSnapshot': {'type': 'publishSnapshot'}})]}, None)
+    assert lobbies.calls_to('update_item') == []
+
+def test_past_deadline_invokes_handle_timeout_directly(monkeypatch):
+    invoked = []
+    monkeypatch.setattr(dispatch_outbox.lambda_client, 'invoke', lambda **kwargs: invoked.append(kwargs))
+    dispatch_outbox.create_schedule('a1b2-0001', 'ban1_p2', 0)
+    assert len(invoked) == 1 and invoked[0]['InvocationType'] == 'Event'
+
+def test_pick_records_its_side_effects_in_the_same_write(lobbies, monkeypatch):
+    monkeypatch.setattr(make_pick, 'TIMER_MODE', 'outbox')
+    monkeypatch.setattr(make_pick, 'create_schedule', lambda *args: pytest.fail('schedule created inline'))
+    lobbies.script('get_item', {'Item': {
+        'lobbyCode': 'a1b2-0001', 'version': 5, 'gameState': 'ban1_p1', 'player1': 'A', 'player2': 'B', 'picks': [], 'bans': []
+    }})
+    lobbies.script('update_item', {'Attributes': {'lobbyCode': 'a1b2-0001', 'version': 6, 'gameState': 'ban1_p2'}})
+    event = {'httpMethod': 'POST', 'pathParameters': {'lobbyCode': 'a1b2-0001'}, 'body': '{"player": "player1", "pick": "alpha"}'}
+    assert make_pick.lambda_handler(event, None)['statusCode'] == 200
+    update, = lobbies.calls_to('update_item')
+    assert sorted(update['ExpressionAttributeValues'][':outbox']) == ['6-createSchedule', '6-deleteSchedule', '6-publishSnapshot']
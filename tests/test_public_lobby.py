@@ -0,0 +1,18 @@
+import json
+
+from conftest import load_handler
+
+get_lobby = load_handler('getLobby.py')
+
+ITEM = {
+    'lobbyCode': 'a1b2-0001', 'version': 5, 'gameState': 'ban1_p2', 'organizerName': 'Org',
+    'player1': 'A', 'player2': 'B', 'picks': [], 'bans': ['alpha'], 'ttl': 1700000000,
+    'outbox': {'x': {'type': 'publishSnapshot'}}, 'turnDeadline': 1000, 'deadlineShard': '1',
+    'timerDurations': {'ban': 20000}
+}
+
+def test_lobby_body_leaves_out_server_attributes():
+    body = json.loads(get_lobby.encode_lobby(ITEM, 'json'))
+    assert body['bans'] == ['alpha'] and body['organizerName'] == 'Org'
+    for private in ('outbox', 'turnDeadline', 'deadlineShard', 'timerDurations', 'ttl'):
+        assert private not in body
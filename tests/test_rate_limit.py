@@ -0,0 +1,40 @@
+import pytest
+
+import lobby_common
+
+@pytest.fixture(autouse=True)
+def memory_limiter(monkeypatch):
+    monkeypatch.setattr(lobby_common, 'RATE_LIMIT_BACKEND', 'memory')
+    monkeypatch.setattr(lobby_common, 'rate_limiter', lobby_common.TokenBucketLimiter('memory'))
+    monkeypatch.setattr(lobby_common.time, 'time', lambda: 1000.0) # No refill during a test
+
+def request(client_id=None, ip='203.0.113.7', lobby_code='a1b2-0001'):
+    return {
+        'headers': {'X-Client-Id': client_id} if client_id else {},
+        'requestContext': {'identity': {'sourceIp': ip}},
+        'pathParameters': {'lobbyCode': lobby_code}
+    }
+
+def allowed(event, kind='poll', times=1):
+    return [lobby_common.check_rate_limit(event, {}, kind) is None for _ in range(times)]
+
+def test_tabs_behind_one_ip_have_their_own_poll_budget():
+    assert all(allowed(request('tab-a'), times=lobby_common.CLIENT_BURST))
+    assert allowed(request('tab-a')) == [False]
+    assert allowed(request('tab-b')) == [True]
+
+def test_ip_bucket_caps_invented_client_ids(monkeypatch):
+    monkeypatch.setattr(lobby_common, 'IP_BURST', 3)
+    results = [allowed(request(f'tab-{n}', lobby_code=f'a1b2-{n:04d}'))[0] for n in range(4)]
+    assert results == [True, True, True, False]
+
+def test_polls_never_use_up_the_action_budget():
+    spectators = [request(f'spectator-{n}') for n in range(lobby_common.LOBBY_BURST + 5)]
+    assert not all(allowed(event)[0] for event in spectators) # The lobby's poll bucket ran dry
+    assert allowed(request('player-1'), kind='action') == [True]
+
+def test_limited_response_names_retry_after():
+    event = request()
+    allowed(event, kind='action', times=lobby_common.ACTION_CLIENT_BURST)
+    response = lobby_common.check_rate_limit(event, {}, 'action')
+    assert response['statusCode'] == 429 and int(response['headers']['Retry-After']) >= 1
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+import lobby_common
+from conftest import conditional_check_failed, load_handler
+
+get_lobby = load_handler('getLobby.py')
+
+@pytest.fixture
+def lobbies(table, monkeypatch):
+    monkeypatch.setitem(lobby_common.shard_tables, lobby_common.default_table_name, table)
+    monkeypatch.setattr(get_lobby, 'TIMER_MODE', 'scheduler')
+    return table
+
+@pytest.fixture
+def schedules(monkeypatch):
+    created = []
+    monkeypatch.setattr(get_lobby, 'create_schedule', lambda lobby_code, game_state, deadline: created.append(game_state))
+    return created
+
+def lobby(version, player1_ready=False, game_state='ready_check'):
+    return {
+        'lobbyCode': 'a1b2-0001', 'version': version, 'gameState': game_state, 'organizerName': 'Org',
+        'player1': 'A', 'player2': 'B', 'player1Ready': player1_ready, 'player2Ready': False, 'picks': [], 'bans': []
+    }
+
+def ready(player='player2'):
+    body = json.dumps({'action': 'ready', 'player': player, 'ready': True})
+    return {'httpMethod': 'POST', 'pathParameters': {'lobbyCode': 'a1b2-0001'}, 'body': body}
+
+def test_last_ready_starts_the_draft_in_the_same_write(lobbies, schedules):
+    lobbies.script('get_item', {'Item': lobby(5, player1_ready=True)})
+    lobbies.script('update_item', {'Attributes': {**lobby(6, player1_ready=True, game_state='ban1_p1'), 'player2Ready': True}})
+    assert get_lobby.lambda_handler(ready(), None)['statusCode'] == 200
+    update, = lobbies.calls_to('update_item')
+    assert update['ExpressionAttributeValues'][':state'] == 'ban1_p1'
+    assert 'turnDeadline = :deadline' in update['UpdateExpression']
+    assert update['ExpressionAttributeValues'][':expectedVersion'] == 5
+    assert schedules == ['ban1_p1']
+
+def test_first_ready_only_sets_the_flag(lobbies, schedules):
+    lobbies.script('get_item', {'Item': lobby(5)})
+    lobbies.script('update_item', {'Attributes': {**lobby(6), 'player2Ready': True}})
+    assert get_lobby.lambda_handler(ready(), None)['statusCode'] == 200
+    update, = lobbies.calls_to('update_item')
+    assert update['UpdateExpression'] == 'SET player2Ready = :ready ADD version :one'
+    assert schedules == []
+
+def test_ready_racing_the_other_ready_starts_the_draft_on_retry(lobbies, schedules):
+    lobbies.script('get_item', {'Item': lobby(5)})
+    lobbies.script('update_item',
+        conditional_check_failed(get_lobby, lobby(6, player1_ready=True)), # The other player readied first
+        {'Attributes': {**lobby(7, player1_ready=True, game_state='ban1_p1'), 'player2Ready': True}})
+    assert get_lobby.lambda_handler(ready(), None)['statusCode'] == 200
+    first, retry = lobbies.calls_to('update_item')
+    assert ':state' not in first['ExpressionAttributeValues']
+    assert retry['ExpressionAttributeValues'][':state'] == 'ban1_p1'
+    assert retry['ExpressionAttributeValues'][':expectedVersion'] == 6
+    assert schedules == ['ban1_p1']
+
+def test_ready_after_the_draft_started_creates_no_schedule(lobbies, schedules):
+    lobbies.script('get_item', {'Item': {**lobby(8, player1_ready=True, game_state='ban1_p1'), 'player2Ready': True}})
+    lobbies.script('update_item', {'Attributes': {**lobby(9, player1_ready=True, game_state='ban1_p1'), 'player2Ready': True}})
+    assert get_lobby.lambda_handler(ready(), None)['statusCode'] == 200
+    assert ':state' not in lobbies.calls_to('update_item')[0]['ExpressionAttributeValues']
+    assert schedules == []
@@ -0,0 +1,22 @@
+import recomputeStats
+
+CATALOG = [
+    {'id': 'alpha', 'name': 'Alpha', 'element': ['fire']},
+    {'id': 'beta', 'name': 'Beta', 'element': ['ice']},
+    {'id': 'gamma', 'name': 'Gamma', 'element': ['fire', 'ice']}
+]
+
+def test_counts_and_rates_from_drafts():
+    drafts = [
+        {'picks': ['alpha', 'gamma'], 'bans': ['beta', 'retired']},
+        {'picks': ['gamma'], 'bans': ['beta']}
+    ]
+    stats = recomputeStats.compute_stats(CATALOG, *recomputeStats.count_drafts(iter(drafts)))
+    assert stats['totals'] == {'drafts': 2, 'picks': 3, 'bans': 3}
+    assert stats['unknownIds'] == {'picks': 0, 'bans': 1}
+    assert [r['id'] for r in stats['resonators']] == ['beta', 'gamma', 'alpha'] # Most banned, then most picked
+    assert stats['resonators'][0]['banRate'] == 1.0
+    assert stats['elements'] == [
+        {'element': 'fire', 'picks': 3, 'bans': 0, 'pickRate': 1.0},
+        {'element': 'ice', 'picks': 2, 'bans': 2, 'pickRate': 0.6667}
+    ]
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+import lobby_common
+from conftest import ScriptedTable, load_handler
+
+create_lobby = load_handler('createLobby.py')
+make_pick = load_handler('makePick.py')
+
+@pytest.fixture
+def shards(monkeypatch):
+    """TABLE_NAME plus shards g and h, each backed by its own stubbed table."""
+    tables = {lobby_common.default_table_name: ScriptedTable(), 'lobbies-g': ScriptedTable(), 'lobbies-h': ScriptedTable()}
+    monkeypatch.setattr(lobby_common, 'SHARD_MAP', {'g': 'lobbies-g', 'h': 'lobbies-h'})
+    monkeypatch.setattr(lobby_common, 'shard_tables', dict(tables))
+    return tables
+
+def test_code_prefix_picks_the_table(shards):
+    assert lobby_common.get_table_name('g1a2-0001') == 'lobbies-g'
+    assert lobby_common.get_table_name('h1a2-0001') == 'lobbies-h'
+    assert lobby_common.get_table_name('a1b2-0001') == lobby_common.default_table_name # Created before sharding
+    assert lobby_common.get_table_name('') == lobby_common.default_table_name
+
+def test_work_across_lobbies_covers_every_table(shards):
+    assert lobby_common.lobby_table_names() == [lobby_common.default_table_name, 'lobbies-g', 'lobbies-h']
+    assert lobby_common.all_lobby_tables() == list(shards.values())
+
+def test_new_codes_carry_a_new_lobby_shard(monkeypatch):
+    monkeypatch.setattr(create_lobby, 'NEW_LOBBY_SHARDS', ['h'])
+    assert create_lobby.generate_lobby_code()[0] == 'h'
+    monkeypatch.setattr(create_lobby, 'NEW_LOBBY_SHARDS', [])
+    assert create_lobby.generate_lobby_code()[0] in '0123456789abcdef'
+
+def test_pick_reads_and_writes_only_its_shard(shards, monkeypatch):
+    monkeypatch.setattr(make_pick, 'TIMER_MODE', 'sweeper')
+    shards['lobbies-g'].script('get_item', {'Item': {
+        'lobbyCode': 'g1a2-0001', 'version': 5, 'gameState': 'ban1_p1', 'player1': 'A', 'player2': 'B', 'picks': [], 'bans': []
+    }})
+    shards['lobbies-g'].script('update_item', {'Attributes': {'lobbyCode': 'g1a2-0001', 'version': 6, 'gameState': 'ban1_p2'}})
+    event = {'httpMethod': 'POST', 'pathParameters': {'lobbyCode': 'g1a2-0001'}, 'body': json.dumps({'player': 'player1', 'pick': 'alpha'})}
+    assert make_pick.lambda_handler(event, None)['statusCode'] == 200
+    assert [name for name, _ in shards['lobbies-g'].calls] == ['get_item', 'update_item']
+    assert shards[lobby_common.default_table_name].calls == [] and shards['lobbies-h'].calls == []
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+import lobby_common
+from conftest import client_error
+
+class FakeS3:
+    """Objects with metadata and ETags; honours IfMatch / IfNoneMatch like S3 conditional writes."""
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+        self.before_put = None # Lets a test change the object between the check and the put
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise client_error('404', 'HeadObject')
+        stored = self.objects[Key]
+        return {'Metadata': stored['Metadata'], 'ETag': stored['ETag']}
+
+    def put_object(self, Bucket, Key, Body, Metadata, IfMatch=None, IfNoneMatch=None, **kwargs):
+        if self.before_put:
+            hook, self.before_put = self.before_put, None
+            hook(self)
+        stored = self.objects.get(Key)
+        if (IfNoneMatch == '*' and stored) or (IfMatch and (not stored or stored['ETag'] != IfMatch)):
+            raise client_error('PreconditionFailed', 'PutObject')
+        self.puts += 1
+        self.objects[Key] = {'Body': Body, 'Metadata': Metadata, 'ETag': f'"{self.puts}"'}
+
+    def version_of(self, lobby_code):
+        return json.loads(self.objects[f'snapshots/{lobby_code}.json']['Body'])['version']
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(lobby_common, 's3', fake)
+    monkeypatch.setattr(lobby_common, 'snapshot_bucket_name', 'snapshots-bucket')
+    monkeypatch.setattr(lobby_common, 'snapshot_dir', '')
+    return fake
+
+def lobby(version):
+    return {'lobbyCode': 'a1b2-0001', 'version': version, 'gameState': 'ban1_p1', 'outbox': {'x': 1}}
+
+def test_newer_version_replaces_snapshot(s3):
+    lobby_common.publish_snapshot(lobby(6))
+    lobby_common.publish_snapshot(lobby(7))
+    assert s3.version_of('a1b2-0001') == 7
+    assert 'outbox' not in json.loads(s3.objects['snapshots/a1b2-0001.json']['Body'])
+
+def test_late_older_version_is_skipped(s3):
+    lobby_common.publish_snapshot(lobby(7))
+    lobby_common.publish_snapshot(lobby(6)) # e.g. the outbox dispatcher, after a synchronous publish of v7
+    assert s3.version_of('a1b2-0001') == 7
+    assert s3.puts == 1
+
+def test_newer_put_racing_between_check_and_put_wins(s3):
+    lobby_common.publish_snapshot(lobby(5))
+    s3.before_put = lambda fake: lobby_common.publish_snapshot(lobby(8))
+    lobby_common.publish_snapshot(lobby(6))
+    assert s3.version_of('a1b2-0001') == 8
+
+def test_errors_are_logged_unless_asked_to_raise(s3, monkeypatch):
+    def failing_head(**kwargs):
+        raise client_error('AccessDenied', 'HeadObject')
+    monkeypatch.setattr(s3, 'head_object', failing_head)
+    lobby_common.publish_snapshot(lobby(1))
+    with pytest.raises(Exception):
+        lobby_common.publish_snapshot(lobby(1), raise_errors=True)
+
+def test_snapshot_dir_keeps_newest_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(lobby_common, 'snapshot_bucket_name', '')
+    monkeypatch.setattr(lobby_common, 'snapshot_dir', str(tmp_path))
+    lobby_common.publish_snapshot(lobby(3))
+    lobby_common.publish_snapshot(lobby(2))
+    assert json.loads((tmp_path / 'snapshots' / 'a1b2-0001.json').read_text())['version'] == 3
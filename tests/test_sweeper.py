@@ -0,0 +1,55 @@
+import pytest
+
+import lobby_common
+from conftest import conditional_check_failed, load_handler
+
+handle_timeout = load_handler('handleTimeout.py')
+
+@pytest.fixture
+def lobbies(table, monkeypatch):
+    monkeypatch.setitem(lobby_common.shard_tables, lobby_common.default_table_name, table)
+    monkeypatch.setattr(handle_timeout, 'TIMER_MODE', 'sweeper')
+    monkeypatch.setattr(handle_timeout, 'resonators_data', [{'id': 'alpha'}, {'id': 'beta'}, {'id': 'gamma'}])
+    return table
+
+def expired(**fields):
+    return {'Items': [{'lobbyCode': 'a1b2-0001', 'deadlineShard': '0', 'turnDeadline': 1000, **fields}]}
+
+def test_expired_turn_is_applied_against_the_indexed_version(lobbies):
+    lobbies.script('query', expired(gameState='pick1_p1', version=7, picks=['alpha'], bans=[]))
+    assert handle_timeout.sweep_expired_turns() == 1
+    update = lobbies.calls_to('update_item')[0]
+    assert update['ConditionExpression'] == 'version = :expectedVersion'
+    assert update['ExpressionAttributeValues'][':expectedVersion'] == 7
+    assert update['ExpressionAttributeValues'][':state'] == 'pick1_p2'
+    assert len(lobbies.calls_to('query')) == lobby_common.DEADLINE_SHARDS
+
+def test_entry_outside_a_turn_has_its_deadline_removed(lobbies):
+    lobbies.script('query', expired(gameState='complete', version=9))
+    assert handle_timeout.sweep_expired_turns() == 0
+    update = lobbies.calls_to('update_item')[0]
+    assert update['UpdateExpression'] == 'REMOVE turnDeadline, deadlineShard'
+    assert update['ConditionExpression'] == 'gameState = :state'
+    assert update['ExpressionAttributeValues'] == {':state': 'complete'}
+
+def test_deadline_is_kept_if_a_turn_started_meanwhile(lobbies):
+    lobbies.script('query', expired(gameState='ready'))
+    lobbies.script('update_item', conditional_check_failed(handle_timeout, {'lobbyCode': 'a1b2-0001', 'gameState': 'ban1_p1'}))
+    assert handle_timeout.sweep_expired_turns() == 0
+    assert len(lobbies.calls_to('update_item')) == 1
+
+def test_restarted_turn_with_a_fresh_deadline_is_left_alone(lobbies, monkeypatch):
+    monkeypatch.setattr(handle_timeout.time, 'time', lambda: 100.0)
+    fresh_timer = {'deadline': 130000, 'isActive': True} # 30 s left
+    lobbies.script('query', expired(gameState='ban1_p1', version=7, picks=[], bans=[], timerState=fresh_timer))
+    assert handle_timeout.sweep_expired_turns() == 0
+    assert lobbies.calls_to('update_item') == []
+
+def test_conflict_retry_rechecks_the_deadline(lobbies, monkeypatch):
+    monkeypatch.setattr(handle_timeout.time, 'time', lambda: 100.0)
+    restarted = {'lobbyCode': 'a1b2-0001', 'gameState': 'ban1_p1', 'version': 9, 'picks': [], 'bans': [],
+                 'timerState': {'deadline': 130000, 'isActive': True}} # Reset and restarted since the index read
+    lobbies.script('query', expired(gameState='ban1_p1', version=7, picks=[], bans=[], timerState={'deadline': 90000}))
+    lobbies.script('update_item', conditional_check_failed(handle_timeout, restarted))
+    assert handle_timeout.sweep_expired_turns() == 0
+    assert len(lobbies.calls_to('update_item')) == 1
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import lobby_common
+from conftest import conditional_check_failed, load_handler
+
+make_pick = load_handler('makePick.py')
+
+@pytest.fixture
+def lobbies(table, monkeypatch):
+    monkeypatch.setitem(lobby_common.shard_tables, lobby_common.default_table_name, table)
+    monkeypatch.setattr(make_pick, 'TIMER_MODE', 'sweeper') # No schedules to create
+    return table
+
+def lobby(version, game_state='ban1_p1', bans=()):
+    return {
+        'lobbyCode': 'a1b2-0001', 'version': version, 'gameState': game_state, 'organizerName': 'Org',
+        'player1': 'A', 'player2': 'B', 'picks': [], 'bans': list(bans)
+    }
+
+def ban(value, player='player1'):
+    return {'httpMethod': 'POST', 'pathParameters': {'lobbyCode': 'a1b2-0001'}, 'body': json.dumps({'player': player, 'pick': value})}
+
+def test_write_is_conditioned_on_the_version_read(lobbies):
+    lobbies.script('get_item', {'Item': lobby(5)})
+    lobbies.script('update_item', {'Attributes': lobby(6, 'ban1_p2', ['alpha'])})
+    assert make_pick.lambda_handler(ban('alpha'), None)['statusCode'] == 200
+    update, = lobbies.calls_to('update_item')
+    assert update['ConditionExpression'] == 'version = :expectedVersion'
+    assert update['ExpressionAttributeValues'][':expectedVersion'] == 5
+
+def test_conflict_is_retried_against_the_returned_lobby(lobbies):
+    lobbies.script('get_item', {'Item': lobby(5)})
+    lobbies.script('update_item', conditional_check_failed(make_pick, lobby(6)), {'Attributes': lobby(7, 'ban1_p2', ['alpha'])})
+    assert make_pick.lambda_handler(ban('alpha'), None)['statusCode'] == 200
+    assert [call['ExpressionAttributeValues'][':expectedVersion'] for call in lobbies.calls_to('update_item')] == [5, 6]
+    assert len(lobbies.calls_to('get_item')) == 1 # The failed write returned the lobby, no second read
+
+def test_conflict_revalidates_the_turn(lobbies):
+    lobbies.script('get_item', {'Item': lobby(5)})
+    lobbies.script('update_item', conditional_check_failed(make_pick, lobby(6, 'ban1_p2', ['beta'])))
+    response = make_pick.lambda_handler(ban('alpha'), None)
+    assert response['statusCode'] == 400 # A timeout took the turn meanwhile
+    assert len(lobbies.calls_to('update_item')) == 1
+
+def test_lobby_deleted_during_the_write_is_404(lobbies):
+    lobbies.script('get_item', {'Item': lobby(5)})
+    lobbies.script('update_item', conditional_check_failed(make_pick, None))
+    assert make_pick.lambda_handler(ban('alpha'), None)['statusCode'] == 404
+
+def test_gives_up_after_repeated_conflicts(lobbies):
+    lobbies.script('get_item', {'Item': lobby(5)})
+    lobbies.script('update_item', *[conditional_check_failed(make_pick, lobby(6 + i)) for i in range(lobby_common.MAX_WRITE_ATTEMPTS)])
+    assert make_pick.lambda_handler(ban('alpha'), None)['statusCode'] == 409